@@ -2,12 +2,75 @@
 KasirAI - Fintech-Grade POS API
 FastAPI Application Entry Point
 """
+from src import startup  # First: starts the cold-start clock
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from src.cfg import get_settings
-from src.api import health, transactions, products, customers, discounts
 
-settings = get_settings()
+with startup.phase("import:settings"):
+    settings = get_settings()
+
+# Router imports timed one by one (the first also pays for supabase/postgrest)
+with startup.phase("import:transactions"):
+    from src.api import transactions
+with startup.phase("import:routers"):
+    from src.api import health, products, customers, discounts, promotions, loyalty, payments, events, insights, shifts, receipts
+
+from src.db import warm_up
+from src.jobs.payments import start_payment_pipeline, stop_payment_pipeline
+from src.core.pubsub import get_broker
+from src.core.responses import FastJSONResponse
+from src.jobs.carts import start_cart_sweeper, stop_cart_sweeper
+from src.jobs.notifications import start_notification_dispatcher, stop_notification_dispatcher
+from src.jobs.outbox import start_outbox_relay, stop_outbox_relay
+from src.jobs.partitions import ensure_partitions
+from src.core.admission import AdmissionMiddleware, start_load_monitor, stop_load_monitor
+from src.core.consistency import ReadYourWritesMiddleware
+from src.core.profiling import ProfilingMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: warm DB connection and caches before taking traffic
+    with startup.phase("warmup:db"):
+        try:
+            warm_up()
+        except Exception:
+            logger.exception("Database warmup failed; first request will connect")
+    with startup.phase("warmup:partitions"):
+        try:
+            ensure_partitions()
+        except Exception:
+            logger.exception("Partition check failed; run python -m src.jobs.partitions ensure")
+    with startup.phase("warmup:promotions"):
+        for tenant_id in filter(None, settings.warmup_tenant_ids.split(",")):
+            try:
+                promotions.get_promotion_index(tenant_id.strip())
+            except Exception:
+                logger.exception("Promotion warmup failed for tenant %s", tenant_id)
+    
+    # Background workers
+    with startup.phase("start:workers"):
+        await start_payment_pipeline()
+        await start_notification_dispatcher()
+        await start_outbox_relay()
+        await start_load_monitor()
+        start_cart_sweeper(transactions.cart_store)
+    startup.mark_ready()
+    yield
+    # Shutdown: background writers drain side by side, each within shutdown_drain_timeout
+    await stop_cart_sweeper()
+    await transactions.cart_store.close()
+    await asyncio.gather(stop_payment_pipeline(), stop_notification_dispatcher(), stop_outbox_relay())
+    await stop_load_monitor()
+    await get_broker().close()
+
 
 app = FastAPI(
     title="KasirAI API",
@@ -15,8 +78,23 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+# Request profiling (innermost: times the handler, not admission or compression)
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+# Session read-your-writes for replica reads (only needed with a replica)
+if settings.supabase_read_url:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Rate limiting / load shedding (outside profiling and read-your-writes, inside
+# CORS so 429s still get CORS headers)
+if settings.ratelimit_enabled:
+    app.add_middleware(AdmissionMiddleware, cart_owner=transactions.cart_owner)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,14 +102,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Last-Write"],
 )
 
+# Compress listings / exports (SSE streams are left alone)
+if settings.gzip_minimum_size:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.gzip_minimum_size,
+        compresslevel=settings.gzip_compresslevel,
+    )
+
 # Include routers
 app.include_router(health.router, tags=["Health"])
 app.include_router(transactions.router, prefix="/api/transactions", tags=["Transactions"])
 app.include_router(products.router, prefix="/api/products", tags=["Products"])
 app.include_router(customers.router, prefix="/api/customers", tags=["Customers"])
 app.include_router(discounts.router, prefix="/api/discounts", tags=["Discounts"])
+app.include_router(promotions.router, prefix="/api/promotions", tags=["Promotions"])
+app.include_router(loyalty.router, prefix="/api/loyalty", tags=["Loyalty"])
+app.include_router(payments.router, prefix="/api/payments", tags=["Payments"])
+app.include_router(events.router, prefix="/api/events", tags=["Events"])
+app.include_router(insights.router, prefix="/api/insights", tags=["Insights"])
+app.include_router(shifts.router, prefix="/api/shifts", tags=["Shifts"])
+app.include_router(receipts.router, prefix="/api/receipts", tags=["Receipts"])
 
 
 @app.get("/")
@@ -43,6 +137,7 @@ async def root():
     }
 
 
+# Development server (production: python serve.py)
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
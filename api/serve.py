@@ -0,0 +1,105 @@
+"""
+KasirAI - Production Server
+
+    python serve.py
+
+Runs several workers (web_concurrency, default: available CPUs). With
+gunicorn installed the app is preloaded once in the master and forked,
+so workers share its memory pages; otherwise uvicorn's own supervisor
+spawns the workers. uvloop / httptools are used when installed.
+
+On SIGTERM workers stop accepting connections, finish in-flight requests
+(graceful_timeout), then the lifespan shutdown flushes queued background
+writes (shutdown_drain_timeout).
+
+Multiple workers need redis_url: without it open carts live in process
+memory and the server falls back to a single worker.
+
+debug is always off here (no /docs, /redoc or auto-reload), whatever .env
+says; use `python main.py` for a development server.
+"""
+import logging
+import os
+from src.cfg import Settings, get_settings
+
+logger = logging.getLogger("kasirai.serve")
+
+
+def cpu_count() -> int:
+    """CPUs available to this process (respects container CPU affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count(settings: Settings) -> int:
+    workers = settings.web_concurrency or cpu_count()
+    if workers > 1 and not settings.redis_url:
+        logger.warning("redis_url not set: carts are per-process, running a single worker")
+        return 1
+    return workers
+
+
+def run_gunicorn(settings: Settings, workers: int) -> None:
+    from gunicorn.app.base import BaseApplication
+    
+    options = {
+        "bind": f"{settings.host}:{settings.port}",
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "keepalive": settings.keep_alive_timeout,
+        "backlog": settings.backlog,
+        "graceful_timeout": settings.graceful_timeout + settings.shutdown_drain_timeout,
+        "timeout": 60,
+    }
+    
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            from main import app
+            return app
+    
+    Application().run()
+
+
+def run_uvicorn(settings: Settings, workers: int) -> None:
+    import uvicorn
+    
+    uvicorn.run(
+        "main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        timeout_keep_alive=settings.keep_alive_timeout,
+        backlog=settings.backlog,
+        timeout_graceful_shutdown=settings.graceful_timeout,
+    )
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    # Set in the environment so uvicorn's spawned workers see it too
+    os.environ["DEBUG"] = "false"
+    get_settings.cache_clear()
+    settings = get_settings()
+    workers = worker_count(settings)
+    
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        logger.info("Starting %d uvicorn worker(s)", workers)
+        run_uvicorn(settings, workers)
+    else:
+        logger.info("Starting %d preloaded gunicorn worker(s)", workers)
+        run_gunicorn(settings, workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,139 @@ Customers API Endpoints
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 import uuid
-from src.dto import CustomerCreate, CustomerResponse, MemberType
-from src.db import get_supabase
+from src.dto import CustomerCreate, CustomerResponse, CustomerProfile, MemberType
+from src.core.cache import TTLCache
+from src.core.customer_index import CustomerIndex, normalize_phone
+from src.core.responses import FastJSONResponse
+from src.cfg import get_settings
+from src.db import get_supabase, get_supabase_read
 
 router = APIRouter()
 
+PROFILE_COLUMNS = "id, tenant_id, name, phone, member_code, member_type, points"
+
+# Hot till lookups: id / (tenant, phone) / (tenant, member_code) -> profile
+_profile_cache = TTLCache(maxsize=10000, ttl=get_settings().customer_profile_ttl)
+
+# Per-tenant prefix index for as-you-type member search
+_customer_indexes = TTLCache(maxsize=256, ttl=get_settings().customer_index_ttl)
+_INDEX_PAGE_SIZE = 1000
+
+
+def get_customer_index(tenant_id: str) -> Optional[CustomerIndex]:
+    """Load tenant index on first use; None if tenant is too large to hold in memory"""
+    index = _customer_indexes.get(tenant_id)
+    if index is False:
+        return None
+    if index is not None:
+        return index
+    
+    settings = get_settings()
+    supabase = get_supabase()
+    profiles: list[CustomerProfile] = []
+    offset = 0
+    while True:
+        result = supabase.table("customers").select(PROFILE_COLUMNS).eq(
+            "tenant_id", tenant_id
+        ).order("id").range(offset, offset + _INDEX_PAGE_SIZE - 1).execute()
+        profiles.extend(CustomerProfile(**row) for row in result.data)
+        if len(profiles) > settings.customer_index_max_size:
+            # Remember the decision so we don't re-scan on every keystroke
+            _customer_indexes.set(tenant_id, False)
+            return None
+        if len(result.data) < _INDEX_PAGE_SIZE:
+            break
+        offset += _INDEX_PAGE_SIZE
+    
+    index = CustomerIndex(profiles)
+    _customer_indexes.set(tenant_id, index)
+    return index
+
+
+def _index_upsert(profile: CustomerProfile) -> None:
+    index = _customer_indexes.get(profile.tenant_id)
+    if isinstance(index, CustomerIndex):
+        index.upsert(profile)
+
+
+def _row_to_profile(row: dict) -> CustomerProfile:
+    return CustomerProfile(**{k: row[k] for k in CustomerProfile.model_fields if k in row})
+
+
+def _profile_keys(profile: CustomerProfile) -> list[tuple]:
+    return [
+        ("id", profile.id),
+        ("phone", profile.tenant_id, normalize_phone(profile.phone)),
+        ("code", profile.tenant_id, profile.member_code),
+    ]
+
+
+def cache_customer_profile(profile: CustomerProfile) -> None:
+    for key in _profile_keys(profile):
+        _profile_cache.set(key, profile)
+
+
+def invalidate_customer_profile(customer_id: str) -> None:
+    profile = _profile_cache.pop(("id", customer_id))
+    if profile is not None:
+        for key in _profile_keys(profile):
+            _profile_cache.pop(key)
+
+
+def clear_customer_profiles() -> None:
+    """Drop all cached profiles and lookup indexes (after batch tier/balance jobs)"""
+    _profile_cache.clear()
+    _customer_indexes.clear()
+
+
+def update_cached_points(customer_id: str, points: int) -> None:
+    """Refresh cached balance after a sale (DB is authoritative on redeem)"""
+    profile = _profile_cache.get(("id", customer_id))
+    if profile is not None:
+        profile = profile.model_copy(update={"points": points})
+        cache_customer_profile(profile)
+        _index_upsert(profile)
+
+
+def get_customer_profile(
+    customer_id: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    phone: Optional[str] = None,
+    member_code: Optional[str] = None,
+) -> Optional[CustomerProfile]:
+    """Cached customer profile by id, or by phone / member code within tenant"""
+    if phone:
+        phone = normalize_phone(phone)
+    
+    if customer_id:
+        key = ("id", customer_id)
+    elif tenant_id and phone:
+        key = ("phone", tenant_id, phone)
+    elif tenant_id and member_code:
+        key = ("code", tenant_id, member_code)
+    else:
+        return None
+    
+    profile = _profile_cache.get(key)
+    if profile is not None:
+        return profile
+    
+    supabase = get_supabase()
+    query = supabase.table("customers").select(PROFILE_COLUMNS)
+    if customer_id:
+        query = query.eq("id", customer_id)
+    else:
+        query = query.eq("tenant_id", tenant_id)
+        query = query.eq("phone_e164", phone) if phone else query.eq("member_code", member_code)
+    
+    result = query.limit(1).execute()
+    if not result.data:
+        return None
+    
+    profile = CustomerProfile(**result.data[0])
+    cache_customer_profile(profile)
+    return profile
+
 
 def generate_member_code() -> str:
     """Generate unique member code"""
@@ -23,17 +151,59 @@ async def list_customers(
     offset: int = 0,
 ):
     """List customers with search"""
-    supabase = get_supabase()
-    
-    query = supabase.table("customers").select("*").eq("tenant_id", tenant_id)
+    supabase = get_supabase_read()
     
     if search:
-        # Search by name or phone
-        query = query.or_(f"name.ilike.%{search}%,phone.ilike.%{search}%")
+        # Prefix search by phone, member code or name (index-backed)
+        result = supabase.rpc("search_customers", {
+            "p_tenant_id": tenant_id,
+            "p_query": search,
+            "p_limit": limit,
+            "p_offset": offset,
+        }).execute()
+    else:
+        result = supabase.table("customers").select("*").eq(
+            "tenant_id", tenant_id
+        ).order("name").range(offset, offset + limit - 1).execute()
+    
+    return FastJSONResponse({"data": result.data, "count": len(result.data)})
+
+
+@router.get("/lookup")
+async def lookup_customers(
+    tenant_id: str,
+    q: str,
+    limit: int = Query(default=10, le=50),
+) -> list[CustomerProfile]:
+    """As-you-type member identification by phone prefix, member code or name"""
+    index = get_customer_index(tenant_id)
+    if index is not None:
+        return FastJSONResponse(index.search(q, limit))
     
-    result = query.order("name").range(offset, offset + limit - 1).execute()
+    # Tenant too large for memory: DB prefix search
+    supabase = get_supabase_read()
+    result = supabase.rpc("search_customers", {
+        "p_tenant_id": tenant_id,
+        "p_query": q,
+        "p_limit": limit,
+    }).execute()
+    return FastJSONResponse([_row_to_profile(row) for row in result.data])
+
+
+@router.get("/profile")
+async def lookup_customer_profile(
+    tenant_id: str,
+    customer_id: Optional[str] = None,
+    phone: Optional[str] = None,
+    member_code: Optional[str] = None,
+) -> CustomerProfile:
+    """Fast member lookup for the till (tier and points)"""
+    profile = get_customer_profile(customer_id, tenant_id, phone, member_code)
     
-    return {"data": result.data, "count": len(result.data)}
+    if profile is None or profile.tenant_id != tenant_id:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    return FastJSONResponse(profile)
 
 
 @router.get("/{customer_id}")
@@ -50,16 +220,16 @@ async def get_customer(customer_id: str):
 
 @router.get("/by-phone/{phone}")
 async def get_customer_by_phone(phone: str, tenant_id: str):
-    """Get customer by phone number"""
+    """Get customer by phone number (any format: 0812..., +62812..., 62812...)"""
     supabase = get_supabase()
     result = supabase.table("customers").select("*").eq(
         "tenant_id", tenant_id
-    ).eq("phone", phone).single().execute()
+    ).eq("phone_e164", normalize_phone(phone)).order("joined_at").limit(1).execute()
     
     if not result.data:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    return result.data
+    return result.data[0]
 
 
 @router.get("/by-code/{member_code}")
@@ -84,7 +254,7 @@ async def create_customer(customer: CustomerCreate):
     # Check if phone already exists
     existing = supabase.table("customers").select("id").eq(
         "tenant_id", customer.tenant_id
-    ).eq("phone", customer.phone).execute()
+    ).eq("phone_e164", normalize_phone(customer.phone)).limit(1).execute()
     
     if existing.data:
         raise HTTPException(status_code=400, detail="Phone number already registered")
@@ -98,6 +268,7 @@ async def create_customer(customer: CustomerCreate):
     data["lifetime_points"] = 0
     
     result = supabase.table("customers").insert(data).execute()
+    _index_upsert(_row_to_profile(result.data[0]))
     return result.data[0]
 
 
@@ -114,6 +285,8 @@ async def update_customer(customer_id: str, customer: CustomerCreate):
     if not result.data:
         raise HTTPException(status_code=404, detail="Customer not found")
     
+    invalidate_customer_profile(customer_id)
+    _index_upsert(_row_to_profile(result.data[0]))
     return result.data[0]
 
 
@@ -123,7 +296,7 @@ async def get_points_history(
     limit: int = Query(default=20, le=100),
 ):
     """Get customer point transaction history"""
-    supabase = get_supabase()
+    supabase = get_supabase_read()
     
     result = supabase.table("point_ledger").select("*").eq(
         "customer_id", customer_id
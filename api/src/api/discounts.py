@@ -6,10 +6,26 @@ from typing import Optional
 from datetime import datetime
 import uuid
 from src.dto import DiscountCreate, DiscountResponse
-from src.db import get_supabase
+from src.db import get_supabase, get_supabase_read
+from src.core.responses import FastJSONResponse
+from src.core.singleflight import SingleFlight
 
 router = APIRouter()
 
+_discount_flights = SingleFlight("discounts")
+
+
+def _fetch_active_discount(tenant_id: str, code: str) -> dict:
+    supabase = get_supabase()
+    return supabase.table("discounts").select("*").eq(
+        "tenant_id", tenant_id
+    ).eq("code", code).eq("is_active", True).single().execute().data
+
+
+async def fetch_active_discount(tenant_id: str, code: str) -> dict:
+    """Active discount row by code (coalesced per tenant + code)"""
+    return await _discount_flights.do((tenant_id, code), _fetch_active_discount, tenant_id, code)
+
 
 @router.get("")
 async def list_discounts(
@@ -18,7 +34,7 @@ async def list_discounts(
     limit: int = Query(default=50, le=100),
 ):
     """List discounts"""
-    supabase = get_supabase()
+    supabase = get_supabase_read()
     
     query = supabase.table("discounts").select("*").eq("tenant_id", tenant_id)
     
@@ -27,7 +43,7 @@ async def list_discounts(
     
     result = query.order("created_at", desc=True).limit(limit).execute()
     
-    return {"data": result.data}
+    return FastJSONResponse({"data": result.data})
 
 
 @router.get("/{discount_id}")
@@ -45,17 +61,11 @@ async def get_discount(discount_id: str):
 @router.get("/validate/{code}")
 async def validate_discount(code: str, tenant_id: str, subtotal: float):
     """Validate discount code and return applicable value"""
-    supabase = get_supabase()
-    
-    result = supabase.table("discounts").select("*").eq(
-        "tenant_id", tenant_id
-    ).eq("code", code).eq("is_active", True).single().execute()
+    discount = await fetch_active_discount(tenant_id, code)
     
-    if not result.data:
+    if not discount:
         raise HTTPException(status_code=404, detail="Discount code not found")
     
-    discount = result.data
-    
     # Check validity period
     now = datetime.now().isoformat()
     if discount.get("valid_from") and discount["valid_from"] > now:
@@ -0,0 +1,86 @@
+"""
+Real-Time Event Endpoints (SSE / WebSocket)
+
+Channels:
+- cart/{cart_id}: breakdown after every cart mutation, finalized
+- terminal/{tenant_id}/{terminal_id}: all carts of a terminal + payment status
+- invoice/{invoice_no}: payment status of one sale
+"""
+import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from src.core.pubsub import get_broker, cart_channel, terminal_channel, invoice_channel
+from src.dto import PaymentStatus
+from src.jobs.payments import add_settlement_listener
+
+router = APIRouter()
+
+HEARTBEAT_SECONDS = 15
+
+
+async def push_payment_status(row: dict, status: PaymentStatus) -> None:
+    """Settlement listener: notify terminal and invoice subscribers"""
+    event = {
+        "type": "payment",
+        "invoice_no": row["invoice_no"],
+        "transaction_id": row["id"],
+        "payment_status": status.value,
+        "paid_at": row.get("paid_at"),
+    }
+    
+    broker = get_broker()
+    await broker.publish(invoice_channel(row["invoice_no"]), event)
+    if row.get("terminal_id"):
+        await broker.publish(terminal_channel(row["tenant_id"], row["terminal_id"]), event)
+
+
+add_settlement_listener(push_payment_status)
+
+
+def _sse(*channels: str) -> StreamingResponse:
+    async def stream():
+        async with get_broker().subscribe(*channels) as subscription:
+            yield ": connected\n\n"
+            while True:
+                message = await subscription.get(timeout=HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message, default=str)}\n\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cart/{cart_id}")
+async def cart_events(cart_id: str):
+    """SSE stream of breakdown updates for one cart"""
+    return _sse(cart_channel(cart_id))
+
+
+@router.get("/terminal/{tenant_id}/{terminal_id}")
+async def terminal_events(tenant_id: str, terminal_id: str):
+    """SSE stream for a terminal / customer-facing display"""
+    return _sse(terminal_channel(tenant_id, terminal_id))
+
+
+@router.get("/invoice/{invoice_no}")
+async def invoice_events(invoice_no: str):
+    """SSE stream of payment status for one sale"""
+    return _sse(invoice_channel(invoice_no))
+
+
+@router.websocket("/terminal/{tenant_id}/{terminal_id}/ws")
+async def terminal_websocket(websocket: WebSocket, tenant_id: str, terminal_id: str):
+    """WebSocket variant of the terminal stream"""
+    await websocket.accept()
+    try:
+        async with get_broker().subscribe(terminal_channel(tenant_id, terminal_id)) as subscription:
+            while True:
+                message = await subscription.get(timeout=HEARTBEAT_SECONDS)
+                await websocket.send_json(message or {"type": "ping"})
+    except WebSocketDisconnect:
+        pass
@@ -1,7 +1,15 @@
 """
 Health Check Endpoints
 """
-from fastapi import APIRouter
+import hmac
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from src import startup
+from src.cfg import get_settings
+from src.core.metrics import registry
+from src.core.profiling import get_profile_buffer
+from src.core.responses import FastJSONResponse
 
 router = APIRouter()
 
@@ -9,3 +17,44 @@ router = APIRouter()
 @router.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "kasirai-api"}
+
+
+@router.get("/health/startup")
+async def startup_profile():
+    """Cold-start timing: import and warmup phases, time to ready"""
+    return startup.report()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this worker"""
+    return registry.render()
+
+
+def _require_admin(token: Optional[str]) -> None:
+    settings = get_settings()
+    if not settings.profiling_enabled or not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Profiling not enabled")
+    if not token or not hmac.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/health/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(default=None)):
+    """Slow and sampled request profiles kept by this worker, newest first"""
+    _require_admin(x_admin_token)
+    return get_profile_buffer().summaries()
+
+
+@router.get("/health/profiles/{profile_id}")
+async def download_profile(profile_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """Span timings and call profile of one request"""
+    _require_admin(x_admin_token)
+    profile = get_profile_buffer().get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (evicted or on another worker)")
+    
+    return FastJSONResponse(
+        profile.to_dict(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.json"'},
+    )
@@ -0,0 +1,32 @@
+"""
+Insights Endpoints (demand forecast / reorder suggestions)
+"""
+from fastapi import APIRouter, BackgroundTasks, Query
+from typing import Optional
+from src.db import get_supabase_read
+from src.core.responses import FastJSONResponse
+
+router = APIRouter()
+
+
+@router.get("/reorder")
+async def list_reorder_suggestions(
+    tenant_id: str,
+    limit: int = Query(default=50, le=500),
+):
+    """Products to reorder, most urgent (fewest days of cover) first"""
+    supabase = get_supabase_read()
+    result = supabase.table("reorder_suggestions").select(
+        "*, products(name, sku, category)"
+    ).eq("tenant_id", tenant_id).gt("suggested_quantity", 0).order("days_of_cover").limit(limit).execute()
+    
+    return FastJSONResponse({"data": result.data, "count": len(result.data)})
+
+
+@router.post("/forecast", status_code=202)
+async def run_forecast(background_tasks: BackgroundTasks, tenant_id: Optional[str] = None):
+    """Refresh reorder suggestions (runs after the response is sent)"""
+    from src.jobs import forecast as forecast_jobs  # NumPy only loaded when used
+    
+    background_tasks.add_task(forecast_jobs.run_forecast, tenant_id)
+    return {"message": "Forecast started", "tenant_id": tenant_id}
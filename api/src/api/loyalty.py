@@ -0,0 +1,34 @@
+"""
+Loyalty Admin Endpoints
+"""
+from fastapi import APIRouter, BackgroundTasks
+from typing import Optional
+from src.jobs import loyalty as loyalty_jobs
+from src.api.customers import clear_customer_profiles
+
+router = APIRouter()
+
+
+@router.post("/reconcile")
+async def reconcile_points(tenant_id: Optional[str] = None, apply: bool = True):
+    """Rebuild customer point balances from the ledger"""
+    drift = loyalty_jobs.reconcile_points(tenant_id, apply)
+    if apply and drift:
+        clear_customer_profiles()
+    return {"count": len(drift), "applied": apply, "data": drift}
+
+
+@router.post("/tiers/recompute")
+async def recompute_tiers(tenant_id: Optional[str] = None):
+    """Reclassify member tiers from lifetime spend"""
+    changed = loyalty_jobs.recompute_tiers(tenant_id)
+    clear_customer_profiles()
+    return {"count": sum(changed.values()), "data": changed}
+
+
+@router.post("/expire", status_code=202)
+async def expire_points(background_tasks: BackgroundTasks, tenant_id: Optional[str] = None):
+    """Start chunked point expiry (runs after the response is sent)"""
+    background_tasks.add_task(loyalty_jobs.expire_points, tenant_id)
+    background_tasks.add_task(clear_customer_profiles)
+    return {"message": "Point expiry started", "tenant_id": tenant_id}
@@ -0,0 +1,41 @@
+"""
+Payment API Endpoints (Midtrans)
+"""
+from fastapi import APIRouter, HTTPException, Request
+from src.db import get_supabase
+from src.ext.midtrans import verify_signature
+from src.jobs.payments import apply_gateway_status
+
+router = APIRouter()
+
+
+@router.post("/midtrans/notification")
+async def midtrans_notification(request: Request):
+    """Midtrans HTTP notification (webhook); safe to receive more than once"""
+    payload = await request.json()
+    
+    if not verify_signature(
+        str(payload.get("order_id", "")),
+        str(payload.get("status_code", "")),
+        str(payload.get("gross_amount", "")),
+        str(payload.get("signature_key", "")),
+    ):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    
+    status = await apply_gateway_status(payload["order_id"], payload)
+    
+    return {"status": "ok", "applied": status.value if status else None}
+
+
+@router.get("/{invoice_no}")
+async def get_payment_status(invoice_no: str):
+    """Payment status and QR payload for the terminal"""
+    supabase = get_supabase()
+    result = supabase.table("transactions").select(
+        "id, invoice_no, payment_type, payment_status, net_sales, qris_ref, qris_string, qris_url, paid_at"
+    ).eq("invoice_no", invoice_no).limit(1).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    return result.data[0]
@@ -4,10 +4,43 @@ Products API Endpoints
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 from src.dto import ProductCreate, ProductResponse
-from src.db import get_supabase
+from src.cfg import get_settings
+from src.db import get_supabase, get_supabase_read
+from src.core.cache import TTLCache
+from src.core.responses import FastJSONResponse
+from src.core.singleflight import SingleFlight
 
 router = APIRouter()
 
+# Concurrent identical reads (e.g. every terminal at store opening) share one query
+_product_flights = SingleFlight("products")
+_category_flights = SingleFlight("categories")
+
+# Per-tenant category bar, dropped on product writes (TTL bounds other workers)
+_category_cache = TTLCache(maxsize=1024, ttl=get_settings().category_cache_ttl)
+_category_versions: dict[str, int] = {}
+
+
+def _fetch_product(product_id: str) -> dict:
+    supabase = get_supabase()
+    return supabase.table("products").select("*").eq("id", product_id).single().execute().data
+
+
+async def fetch_product(product_id: str) -> dict:
+    """Product row by ID (coalesced)"""
+    return await _product_flights.do(product_id, _fetch_product, product_id)
+
+
+def _fetch_categories(tenant_id: str) -> list[dict]:
+    supabase = get_supabase()
+    result = supabase.rpc("product_categories", {"p_tenant_id": tenant_id}).execute()
+    return result.data or []
+
+
+def invalidate_categories(tenant_id: str) -> None:
+    _category_cache.pop(tenant_id)
+    _category_versions[tenant_id] = _category_versions.get(tenant_id, 0) + 1
+
 
 @router.get("")
 async def list_products(
@@ -18,7 +51,7 @@ async def list_products(
     offset: int = 0,
 ):
     """List products with optional filtering"""
-    supabase = get_supabase()
+    supabase = get_supabase_read()
     
     query = supabase.table("products").select("*").eq("tenant_id", tenant_id)
     
@@ -30,19 +63,18 @@ async def list_products(
     
     result = query.range(offset, offset + limit - 1).execute()
     
-    return {"data": result.data, "count": len(result.data)}
+    return FastJSONResponse({"data": result.data, "count": len(result.data)})
 
 
 @router.get("/{product_id}")
 async def get_product(product_id: str):
     """Get single product by ID"""
-    supabase = get_supabase()
-    result = supabase.table("products").select("*").eq("id", product_id).single().execute()
+    product = await fetch_product(product_id)
     
-    if not result.data:
+    if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return result.data
+    return product
 
 
 @router.post("")
@@ -56,6 +88,7 @@ async def create_product(product: ProductCreate):
         data["cost"] = float(data["cost"])
     
     result = supabase.table("products").insert(data).execute()
+    invalidate_categories(product.tenant_id)
     return result.data[0]
 
 
@@ -74,6 +107,7 @@ async def update_product(product_id: str, product: ProductCreate):
     if not result.data:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    invalidate_categories(result.data[0]["tenant_id"])
     return result.data[0]
 
 
@@ -81,17 +115,25 @@ async def update_product(product_id: str, product: ProductCreate):
 async def delete_product(product_id: str):
     """Delete product"""
     supabase = get_supabase()
-    supabase.table("products").delete().eq("id", product_id).execute()
+    result = supabase.table("products").delete().eq("id", product_id).execute()
+    
+    for row in result.data or []:
+        invalidate_categories(row["tenant_id"])
     return {"message": "Product deleted"}
 
 
 @router.get("/categories/list")
 async def list_categories(tenant_id: str):
-    """List unique categories"""
-    supabase = get_supabase()
-    result = supabase.table("products").select("category").eq(
-        "tenant_id", tenant_id
-    ).not_.is_("category", "null").execute()
+    """List unique categories (sorted) with product counts"""
+    rows = _category_cache.get(tenant_id)
+    if rows is None:
+        version = _category_versions.get(tenant_id, 0)
+        rows = await _category_flights.do(tenant_id, _fetch_categories, tenant_id)
+        # Skip caching if a product write landed while we were loading
+        if _category_versions.get(tenant_id, 0) == version:
+            _category_cache.set(tenant_id, rows)
     
-    categories = list(set(p["category"] for p in result.data if p.get("category")))
-    return {"categories": categories}
+    return {
+        "categories": [row["category"] for row in rows],
+        "product_counts": {row["category"]: row["product_count"] for row in rows},
+    }
@@ -0,0 +1,128 @@
+"""
+Promotions API Endpoints
+"""
+from fastapi import APIRouter, HTTPException, Query
+import uuid
+from src.dto import PromotionCreate, PromotionResponse
+from src.core import PromotionIndex
+from src.cfg import get_settings
+from src.db import get_supabase, get_supabase_read
+from src.core.cache import TTLCache
+from src.core.singleflight import SingleFlight
+
+router = APIRouter()
+
+# Compiled promotion index per tenant, dropped after promotion writes (TTL bounds other workers)
+_promotion_indexes = TTLCache(maxsize=1024, ttl=get_settings().promotion_cache_ttl)
+_promotion_versions: dict[str, int] = {}
+_index_flights = SingleFlight("promotions")
+
+
+def _fetch_promotion_index(tenant_id: str) -> PromotionIndex:
+    supabase = get_supabase()
+    result = supabase.table("promotions").select("*").eq(
+        "tenant_id", tenant_id
+    ).eq("is_active", True).execute()
+    return PromotionIndex(PromotionResponse(**row) for row in result.data)
+
+
+def get_promotion_index(tenant_id: str) -> PromotionIndex:
+    """Get compiled index of active promotions for tenant (blocking; startup warmup)"""
+    index = _promotion_indexes.get(tenant_id)
+    if index is None:
+        index = _fetch_promotion_index(tenant_id)
+        _promotion_indexes.set(tenant_id, index)
+    return index
+
+
+async def load_promotion_index(tenant_id: str) -> PromotionIndex:
+    """Cached index, or one shared load for all concurrent callers"""
+    index = _promotion_indexes.get(tenant_id)
+    if index is None:
+        version = _promotion_versions.get(tenant_id, 0)
+        index = await _index_flights.do(tenant_id, _fetch_promotion_index, tenant_id)
+        # Skip caching if a promotion write landed while we were loading
+        if _promotion_versions.get(tenant_id, 0) == version:
+            _promotion_indexes.set(tenant_id, index)
+    return index
+
+
+def invalidate_promotion_index(tenant_id: str) -> None:
+    _promotion_indexes.pop(tenant_id)
+    _promotion_versions[tenant_id] = _promotion_versions.get(tenant_id, 0) + 1
+
+
+def _to_row(promotion: PromotionCreate) -> dict:
+    data = promotion.model_dump(mode="json")
+    for field in ("value", "bundle_price"):
+        if data.get(field) is not None:
+            data[field] = float(data[field])
+    for tier in data["tiers"]:
+        tier["value"] = float(tier["value"])
+    return data
+
+
+@router.get("")
+async def list_promotions(
+    tenant_id: str,
+    active_only: bool = True,
+    limit: int = Query(default=50, le=100),
+):
+    """List promotions"""
+    supabase = get_supabase_read()
+    
+    query = supabase.table("promotions").select("*").eq("tenant_id", tenant_id)
+    
+    if active_only:
+        query = query.eq("is_active", True)
+    
+    result = query.order("priority", desc=True).limit(limit).execute()
+    
+    return {"data": result.data}
+
+
+@router.post("")
+async def create_promotion(promotion: PromotionCreate):
+    """Create new automatic promotion"""
+    supabase = get_supabase()
+    
+    data = _to_row(promotion)
+    data["id"] = str(uuid.uuid4())
+    data["is_active"] = True
+    
+    result = supabase.table("promotions").insert(data).execute()
+    invalidate_promotion_index(promotion.tenant_id)
+    return result.data[0]
+
+
+@router.put("/{promotion_id}")
+async def update_promotion(promotion_id: str, promotion: PromotionCreate):
+    """Update promotion"""
+    supabase = get_supabase()
+    
+    data = _to_row(promotion)
+    del data["tenant_id"]
+    
+    result = supabase.table("promotions").update(data).eq("id", promotion_id).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Promotion not found")
+    
+    invalidate_promotion_index(promotion.tenant_id)
+    return result.data[0]
+
+
+@router.delete("/{promotion_id}")
+async def deactivate_promotion(promotion_id: str):
+    """Deactivate promotion (soft delete)"""
+    supabase = get_supabase()
+    
+    result = supabase.table("promotions").update(
+        {"is_active": False}
+    ).eq("id", promotion_id).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Promotion not found")
+    
+    invalidate_promotion_index(result.data[0]["tenant_id"])
+    return {"message": "Promotion deactivated"}
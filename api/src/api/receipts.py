@@ -0,0 +1,162 @@
+"""
+Receipts API Endpoints - Print & Reprint
+
+finalize_transaction hands the sale it just wrote to remember_receipt(),
+so printing right after checkout renders from memory: the tenant's
+compiled template and the receipt snapshot are both cached, and rendered
+bytes are cached per invoice and format. Cache misses (another worker, an
+evicted or older sale) read the primary, so a sale finalized a moment ago
+is found even while the replica lags.
+
+Reprints (copy=true) always read the sale, since by then it may have been
+voided or refunded, which the receipt marks (BATAL / RETUR). Credit notes
+and payment settlements also evict this worker's cached receipt.
+"""
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+from typing import Optional
+from src.cfg import get_settings
+from src.core.cache import TTLCache
+from src.core.receipt import Receipt, ReceiptTemplate, render
+from src.core.singleflight import SingleFlight
+from src.db import get_supabase, get_supabase_read
+from src.dto import PaymentStatus, ReceiptFormat
+from src.jobs.payments import add_settlement_listener
+
+router = APIRouter()
+
+TEMPLATE_COLUMNS = "name, npwp, receipt_header, receipt_footer, receipt_width, timezone"
+
+MEDIA_TYPES = {
+    ReceiptFormat.TEXT: "text/plain; charset=utf-8",
+    ReceiptFormat.ESCPOS: "application/octet-stream",
+    ReceiptFormat.PDF: "application/pdf",
+}
+
+_settings = get_settings()
+
+# tenant -> compiled template
+_templates = TTLCache(maxsize=1024, ttl=_settings.receipt_template_ttl)
+_template_flights = SingleFlight("receipt_templates")
+
+# invoice -> Receipt, and (invoice, format, copy) -> (template, receipt, rendered bytes)
+_receipts = TTLCache(maxsize=_settings.receipt_cache_size, ttl=_settings.receipt_cache_ttl)
+_rendered = TTLCache(maxsize=_settings.receipt_cache_size, ttl=_settings.receipt_cache_ttl)
+
+
+def remember_receipt(receipt: Receipt) -> None:
+    """Cache a just-finalized sale so its receipt prints without a DB read"""
+    _receipts.set(receipt.invoice_no, receipt)
+
+
+def forget_receipt(invoice_no: str) -> None:
+    """Drop a sale whose status changed (credit note, settlement) from this worker's caches"""
+    _receipts.pop(invoice_no)
+    for fmt in ReceiptFormat:
+        for copy in (False, True):
+            _rendered.pop((invoice_no, fmt, copy))
+
+
+async def _forget_settled(row: dict, status: PaymentStatus) -> None:
+    """Settlement listener"""
+    forget_receipt(row["invoice_no"])
+
+
+add_settlement_listener(_forget_settled)
+
+
+def _load_template(tenant_id: str) -> ReceiptTemplate:
+    supabase = get_supabase_read()
+    result = supabase.table("tenants").select(TEMPLATE_COLUMNS).eq("id", tenant_id).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    
+    template = ReceiptTemplate.from_tenant(result.data[0])
+    _templates.set(tenant_id, template)
+    return template
+
+
+async def get_receipt_template(tenant_id: str) -> ReceiptTemplate:
+    template = _templates.get(tenant_id)
+    if template is None:
+        template = await _template_flights.do(tenant_id, _load_template, tenant_id)
+    return template
+
+
+def _fetch_receipt(invoice_no: str) -> Receipt:
+    supabase = get_supabase()
+    result = supabase.table("transactions").select(
+        "*, transaction_items(*)"
+    ).eq("invoice_no", invoice_no).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    receipt = Receipt.from_sale(result.data[0])
+    _receipts.set(invoice_no, receipt)
+    return receipt
+
+
+def _document(content: bytes, fmt: ReceiptFormat, name: str) -> Response:
+    headers = {}
+    if fmt != ReceiptFormat.TEXT:
+        extension = "pdf" if fmt == ReceiptFormat.PDF else "bin"
+        headers["Content-Disposition"] = f'inline; filename="{name}.{extension}"'
+    return Response(content=content, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get("")
+async def reprint_receipts(
+    tenant_id: str,
+    start_date: str,
+    end_date: str,
+    fmt: ReceiptFormat = Query(default=ReceiptFormat.PDF, alias="format"),
+    terminal_id: Optional[str] = None,
+):
+    """Batch reprint of a date range as one document (marked SALINAN; voids and refunds marked BATAL / RETUR)"""
+    supabase = get_supabase_read()
+    
+    query = supabase.table("transactions").select("*, transaction_items(*)").eq(
+        "tenant_id", tenant_id
+    ).gte("created_at", start_date).lte("created_at", end_date).neq(
+        "payment_status", PaymentStatus.FAILED.value
+    )
+    if terminal_id:
+        query = query.eq("terminal_id", terminal_id)
+    
+    result = query.order("created_at").limit(_settings.receipt_batch_limit).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="No transactions in range")
+    
+    receipts = [Receipt.from_sale(sale) for sale in result.data]
+    for receipt in receipts:
+        _receipts.set(receipt.invoice_no, receipt)
+    
+    template = await get_receipt_template(tenant_id)
+    content = render(receipts, template, fmt, copy=True)
+    return _document(content, fmt, f"receipts-{start_date[:10]}-{end_date[:10]}")
+
+
+@router.get("/{invoice_no}")
+async def get_receipt(
+    invoice_no: str,
+    fmt: ReceiptFormat = Query(default=ReceiptFormat.ESCPOS, alias="format"),
+    copy: bool = Query(default=False, description="Reprint: mark the receipt SALINAN"),
+):
+    """Receipt of one sale; served from cache after checkout"""
+    if copy:
+        receipt = _fetch_receipt(invoice_no)
+    else:
+        receipt = _receipts.get(invoice_no) or _fetch_receipt(invoice_no)
+    template = await get_receipt_template(receipt.tenant_id)
+    
+    # Rendered from the current template and snapshot only; a reloaded one re-renders
+    key = (invoice_no, fmt, copy)
+    entry = _rendered.get(key)
+    if entry is None or entry[0] is not template or entry[1] is not receipt:
+        entry = (template, receipt, render([receipt], template, fmt, copy))
+        _rendered.set(key, entry)
+    
+    return _document(entry[2], fmt, invoice_no)
@@ -0,0 +1,183 @@
+"""
+Shifts API Endpoints - Cashier Sessions & Z-Report
+
+Sales and credit notes are attached to the cashier's open shift by
+trigger, and per-payment-type totals are kept current in shift_totals in
+the same DB transaction (db/014_shifts.sql). Reports read those few rows
+instead of scanning the day's transactions.
+"""
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from decimal import Decimal
+import uuid
+from postgrest.exceptions import APIError
+from src.dto import (
+    PaymentType,
+    ShiftStatus,
+    ShiftOpenRequest,
+    ShiftCloseRequest,
+    ShiftPaymentTotals,
+    ShiftReport,
+)
+from src.db import get_supabase, get_supabase_read
+
+router = APIRouter()
+
+SHIFT_SELECT = "*, shift_totals(*)"
+
+
+def _dec(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+def build_report(shift: dict) -> ShiftReport:
+    """Shift row (with embedded shift_totals) -> X/Z report"""
+    payments = [
+        ShiftPaymentTotals(**row)
+        for row in sorted(shift.get("shift_totals") or [], key=lambda row: row["payment_type"])
+    ]
+    
+    cash = next((p for p in payments if p.payment_type == PaymentType.CASH), None)
+    opening_cash = _dec(shift["opening_cash"])
+    if shift["expected_cash"] is not None:
+        expected_cash = _dec(shift["expected_cash"])  # Frozen at close
+    else:
+        expected_cash = opening_cash + (cash.net_sales - cash.refund_amount if cash else Decimal("0"))
+    
+    return ShiftReport(
+        id=shift["id"],
+        tenant_id=shift["tenant_id"],
+        user_id=shift["user_id"],
+        terminal_id=shift.get("terminal_id"),
+        status=shift["status"],
+        opened_at=shift["opened_at"],
+        closed_at=shift.get("closed_at"),
+        payments=payments,
+        sales_count=sum(p.sales_count for p in payments),
+        gross_sales=sum((p.gross_sales for p in payments), Decimal("0")),
+        discount_amount=sum((p.discount_amount for p in payments), Decimal("0")),
+        points_redeemed=sum(p.points_redeemed for p in payments),
+        points_value=sum((p.points_value for p in payments), Decimal("0")),
+        tax_amount=sum((p.tax_amount for p in payments), Decimal("0")),
+        net_sales=sum((p.net_sales for p in payments), Decimal("0")),
+        refund_amount=sum((p.refund_amount for p in payments), Decimal("0")),
+        opening_cash=opening_cash,
+        expected_cash=expected_cash,
+        counted_cash=shift.get("counted_cash"),
+        cash_difference=shift.get("cash_difference"),
+        notes=shift.get("notes"),
+    )
+
+
+def _fetch_shift(shift_id: str) -> dict:
+    supabase = get_supabase()
+    result = supabase.table("shifts").select(SHIFT_SELECT).eq("id", shift_id).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Shift not found")
+    
+    return result.data[0]
+
+
+@router.post("", response_model=ShiftReport)
+async def open_shift(request: ShiftOpenRequest):
+    """Open a shift for a cashier (one open shift per user)"""
+    supabase = get_supabase()
+    
+    data = request.model_dump()
+    data["id"] = str(uuid.uuid4())
+    data["opening_cash"] = float(data["opening_cash"])
+    data["status"] = ShiftStatus.OPEN.value
+    
+    try:
+        result = supabase.table("shifts").insert(data).execute()
+    except APIError as e:
+        if e.code == "23505":  # uq_shifts_open_user
+            raise HTTPException(status_code=409, detail="User already has an open shift")
+        raise
+    
+    return build_report(result.data[0])
+
+
+@router.get("")
+async def list_shifts(
+    tenant_id: str,
+    user_id: Optional[str] = None,
+    status: Optional[ShiftStatus] = None,
+    limit: int = Query(default=50, le=100),
+):
+    """List shifts, newest first"""
+    supabase = get_supabase_read()
+    
+    query = supabase.table("shifts").select("*").eq("tenant_id", tenant_id)
+    
+    if user_id:
+        query = query.eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status.value)
+    
+    result = query.order("opened_at", desc=True).limit(limit).execute()
+    
+    return {"data": result.data}
+
+
+@router.get("/current", response_model=ShiftReport)
+async def get_current_shift(tenant_id: str, user_id: str):
+    """Open shift of a cashier with its running totals (X-report)"""
+    supabase = get_supabase()
+    result = supabase.table("shifts").select(SHIFT_SELECT).eq(
+        "tenant_id", tenant_id
+    ).eq("user_id", user_id).eq("status", ShiftStatus.OPEN.value).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="No open shift")
+    
+    return build_report(result.data[0])
+
+
+@router.get("/{shift_id}", response_model=ShiftReport)
+async def get_shift_report(shift_id: str):
+    """X-report (open) or Z-report (closed)"""
+    return build_report(_fetch_shift(shift_id))
+
+
+@router.post("/{shift_id}/close", response_model=ShiftReport)
+async def close_shift(shift_id: str, request: ShiftCloseRequest):
+    """
+    Close a shift against the counted drawer and return the Z-report.
+    Expected cash = opening cash + cash sales - cash refunds, taken from
+    the running totals at the moment of closing.
+    """
+    supabase = get_supabase()
+    try:
+        supabase.rpc("close_shift", {
+            "p_shift_id": shift_id,
+            "p_counted_cash": float(request.counted_cash),
+            "p_notes": request.notes,
+        }).execute()
+    except APIError as e:
+        if "not found" in str(e.message):
+            raise HTTPException(status_code=404, detail="Shift not found")
+        if "already closed" in str(e.message):
+            raise HTTPException(status_code=409, detail="Shift already closed")
+        raise
+    
+    return build_report(_fetch_shift(shift_id))
+
+
+@router.post("/{shift_id}/reconcile")
+async def reconcile_shift(shift_id: str, apply: bool = False):
+    """
+    Compare running totals with the transactions table.
+    Returns payment types whose totals drifted; with apply=true they are
+    rebuilt from transactions and credit notes.
+    """
+    _fetch_shift(shift_id)
+    
+    supabase = get_supabase()
+    result = supabase.rpc("rebuild_shift_totals", {
+        "p_shift_id": shift_id,
+        "p_apply": apply,
+    }).execute()
+    
+    return {"shift_id": shift_id, "drift": result.data, "applied": apply}
@@ -6,9 +6,9 @@ from decimal import Decimal
 from datetime import datetime
 from typing import Optional
 import uuid
+from postgrest.exceptions import APIError
 
 from src.dto import (
-    CartItem,
     CartRequest,
     AddItemRequest,
     ApplyDiscountRequest,
@@ -16,18 +16,47 @@ from src.dto import (
     FinancialBreakdown,
     FinalizeTransactionRequest,
     TransactionResponse,
+    RefundRequest,
+    VoidRequest,
+    CreditNoteKind,
+    CreditNoteResponse,
     PaymentType,
     PaymentStatus,
     DiscountType,
-    MemberType,
 )
 from src.core import CalculationEngine, MarginProtectionError
-from src.db import get_supabase
+from src.core.profiling import span
+from src.core.pubsub import get_broker, cart_channel, terminal_channel
+from src.core.cart import Cart, CartLine, to_rupiah
+from src.core.receipt import Receipt, ReceiptLine
+from src.core.cart_store import CartConflictError, CartLimitError, create_cart_store
+from src.core.responses import FastJSONResponse
+from src.db import get_supabase, get_supabase_read
+from src.api.promotions import load_promotion_index
+from src.api.products import fetch_product
+from src.api.discounts import fetch_active_discount
+from src.api.customers import get_customer_profile, update_cached_points
+from src.api.receipts import forget_receipt, remember_receipt
+from src.ext.midtrans import CHARGE_TYPES, MidtransError
+from src.jobs.payments import get_payment_pipeline
 
 router = APIRouter()
 
-# In-memory cart storage (replace with Redis in production)
-_carts: dict[str, dict] = {}
+# Cart storage with idle TTL and caps (in-memory, or Redis when configured)
+cart_store = create_cart_store()
+
+
+async def _get_cart(cart_id: str) -> Cart:
+    cart = await cart_store.get(cart_id)
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Cart not found")
+    return cart
+
+
+async def cart_owner(cart_id: str) -> Optional[tuple[str, Optional[str]]]:
+    """(tenant, terminal) of an open cart: rate-limit keys for cart routes (AdmissionMiddleware)"""
+    cart = await cart_store.get(cart_id)
+    return (cart.tenant_id, cart.terminal_id) if cart is not None else None
 
 
 def generate_invoice_number(tenant_id: str) -> str:
@@ -37,109 +66,139 @@ def generate_invoice_number(tenant_id: str) -> str:
     return f"INV-{timestamp}-{random_suffix}"
 
 
+def generate_credit_note_number() -> str:
+    """Credit note (nota retur) number"""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    random_suffix = uuid.uuid4().hex[:4].upper()
+    return f"CN-{timestamp}-{random_suffix}"
+
+
+async def calculate_cart(cart: Cart) -> FinancialBreakdown:
+    """Run CalculationEngine over a cart (raises MarginProtectionError)"""
+    promotions = await load_promotion_index(cart.tenant_id)
+    engine = CalculationEngine()
+    with span("calc.breakdown"):
+        return engine.calculate_breakdown(
+            items=cart.items,
+            discount_type=cart.discount_type,
+            discount_value=cart.discount_value,
+            max_discount=Decimal(cart.max_discount) if cart.max_discount is not None else None,
+            points_redeemed=cart.points_redeemed,
+            member_type=cart.member_type,
+            promotions=promotions,
+        )
+
+
+def _cart_channels(cart: Cart) -> list[str]:
+    channels = [cart_channel(cart.id)]
+    if cart.terminal_id:
+        channels.append(terminal_channel(cart.tenant_id, cart.terminal_id))
+    return channels
+
+
+async def publish_cart(cart: Cart) -> None:
+    """Persist cart and push updated breakdown to POS / customer display subscribers"""
+    try:
+        await cart_store.save(cart)
+    except CartConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    event = {"type": "breakdown", "cart_id": cart.id, "data": None}
+    if cart.items:
+        try:
+            event["data"] = (await calculate_cart(cart)).model_dump(mode="json")
+        except MarginProtectionError as e:
+            event["error"] = str(e)
+    
+    broker = get_broker()
+    for channel in _cart_channels(cart):
+        await broker.publish(channel, event)
+
+
 @router.post("/cart")
 async def create_cart(request: CartRequest):
     """Initialize a new cart/transaction"""
     cart_id = str(uuid.uuid4())
-    _carts[cart_id] = {
-        "id": cart_id,
-        "tenant_id": request.tenant_id,
-        "user_id": request.user_id,
-        "items": [],
-        "customer_id": None,
-        "discount_code": None,
-        "discount_type": None,
-        "discount_value": None,
-        "max_discount": None,
-        "points_redeemed": 0,
-        "member_type": MemberType.REGULAR,
-        "created_at": datetime.now().isoformat(),
-    }
+    cart = Cart(
+        id=cart_id,
+        tenant_id=request.tenant_id,
+        user_id=request.user_id,
+        terminal_id=request.terminal_id,
+        created_at=datetime.now().isoformat(),
+    )
+    
+    try:
+        await cart_store.create(cart)
+    except CartLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
     return {"cart_id": cart_id}
 
 
 @router.post("/cart/{cart_id}/items")
 async def add_item(cart_id: str, request: AddItemRequest):
     """Add item to cart"""
-    if cart_id not in _carts:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    cart = _carts[cart_id]
-    supabase = get_supabase()
+    cart = await _get_cart(cart_id)
     
     # Fetch product from database
-    result = supabase.table("products").select("*").eq("id", request.product_id).single().execute()
+    product = await fetch_product(request.product_id)
     
-    if not result.data:
+    if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    product = result.data
+    price = to_rupiah(product["price"])
     
     # Check if item already in cart
-    for item in cart["items"]:
-        if item.product_id == request.product_id:
-            item.quantity += request.quantity
-            item.subtotal = Decimal(str(product["price"])) * item.quantity
-            return {"message": "Item quantity updated", "cart_id": cart_id}
+    line = cart.find(request.product_id)
+    if line is not None:
+        line.quantity += request.quantity
+        line.price = price
+        await publish_cart(cart)
+        return {"message": "Item quantity updated", "cart_id": cart_id}
     
     # Add new item
-    engine = CalculationEngine()
-    subtotal = engine.calculate_item_subtotal(
-        Decimal(str(product["price"])),
-        request.quantity
-    )
-    
-    cart["items"].append(CartItem(
+    cart.items.append(CartLine(
         product_id=product["id"],
         product_name=product["name"],
-        product_sku=product.get("sku", ""),
+        product_sku=product.get("sku") or "",
         quantity=request.quantity,
-        unit_price=Decimal(str(product["price"])),
-        unit_cost=Decimal(str(product.get("cost", 0))) if product.get("cost") else None,
-        subtotal=subtotal,
+        price=price,
+        cost=to_rupiah(product["cost"]) if product.get("cost") else None,
+        category=product.get("category"),
     ))
     
+    await publish_cart(cart)
     return {"message": "Item added", "cart_id": cart_id}
 
 
 @router.delete("/cart/{cart_id}/items/{product_id}")
 async def remove_item(cart_id: str, product_id: str):
     """Remove item from cart"""
-    if cart_id not in _carts:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    cart = _carts[cart_id]
-    cart["items"] = [item for item in cart["items"] if item.product_id != product_id]
+    cart = await _get_cart(cart_id)
+    cart.items = [line for line in cart.items if line.product_id != product_id]
     
+    await publish_cart(cart)
     return {"message": "Item removed", "cart_id": cart_id}
 
 
 @router.post("/cart/{cart_id}/discount")
 async def apply_discount(cart_id: str, request: ApplyDiscountRequest):
     """Apply discount code to cart"""
-    if cart_id not in _carts:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    cart = _carts[cart_id]
-    supabase = get_supabase()
+    cart = await _get_cart(cart_id)
     
     # Validate discount code
-    result = supabase.table("discounts").select("*").eq(
-        "tenant_id", cart["tenant_id"]
-    ).eq("code", request.discount_code).eq("is_active", True).single().execute()
+    discount = await fetch_active_discount(cart.tenant_id, request.discount_code)
     
-    if not result.data:
+    if not discount:
         raise HTTPException(status_code=404, detail="Discount code not found or inactive")
     
-    discount = result.data
-    
     # Check usage limit
     if discount.get("usage_limit") and discount["usage_count"] >= discount["usage_limit"]:
         raise HTTPException(status_code=400, detail="Discount usage limit reached")
     
     # Check min purchase
     engine = CalculationEngine()
-    subtotal = engine.calculate_subtotal(cart["items"])
+    subtotal = engine.calculate_subtotal(cart.items)
     
     if subtotal < Decimal(str(discount.get("min_purchase", 0))):
         raise HTTPException(
@@ -147,99 +206,64 @@ async def apply_discount(cart_id: str, request: ApplyDiscountRequest):
             detail=f"Minimum purchase Rp {discount['min_purchase']} required"
         )
     
-    cart["discount_code"] = discount["code"]
-    cart["discount_type"] = DiscountType(discount["type"])
-    cart["discount_value"] = Decimal(str(discount["value"]))
-    cart["max_discount"] = Decimal(str(discount["max_discount"])) if discount.get("max_discount") else None
+    cart.discount_code = discount["code"]
+    cart.discount_type = DiscountType(discount["type"])
+    cart.discount_value = Decimal(str(discount["value"]))
+    cart.max_discount = to_rupiah(discount["max_discount"]) if discount.get("max_discount") else None
     
+    await publish_cart(cart)
     return {"message": "Discount applied", "discount_code": discount["code"]}
 
 
 @router.post("/cart/{cart_id}/loyalty")
 async def apply_loyalty(cart_id: str, request: ApplyLoyaltyRequest):
     """Apply loyalty point redemption"""
-    if cart_id not in _carts:
-        raise HTTPException(status_code=404, detail="Cart not found")
+    cart = await _get_cart(cart_id)
     
-    cart = _carts[cart_id]
-    supabase = get_supabase()
+    # Fetch customer (cached profile: tier + points)
+    customer = get_customer_profile(customer_id=request.customer_id)
     
-    # Fetch customer
-    result = supabase.table("customers").select("*").eq("id", request.customer_id).single().execute()
-    
-    if not result.data:
+    if customer is None or customer.tenant_id != cart.tenant_id:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    customer = result.data
-    
-    # Validate points
-    if request.points_to_redeem > customer["points"]:
+    # Validate points (re-checked atomically by the DB at finalize)
+    if request.points_to_redeem > customer.points:
         raise HTTPException(status_code=400, detail="Insufficient points")
     
-    cart["customer_id"] = customer["id"]
-    cart["points_redeemed"] = request.points_to_redeem
-    cart["member_type"] = MemberType(customer.get("member_type", "REGULAR"))
+    cart.customer_id = customer.id
+    cart.points_redeemed = request.points_to_redeem
+    cart.member_type = customer.member_type
     
+    await publish_cart(cart)
     return {
         "message": "Loyalty applied",
-        "customer_name": customer["name"],
+        "customer_name": customer.name,
         "points_redeemed": request.points_to_redeem,
-        "points_remaining": customer["points"] - request.points_to_redeem,
+        "points_remaining": customer.points - request.points_to_redeem,
     }
 
 
 @router.get("/cart/{cart_id}/breakdown")
 async def get_breakdown(cart_id: str) -> FinancialBreakdown:
     """Calculate and return financial breakdown"""
-    if cart_id not in _carts:
-        raise HTTPException(status_code=404, detail="Cart not found")
+    cart = await _get_cart(cart_id)
     
-    cart = _carts[cart_id]
-    
-    if not cart["items"]:
+    if not cart.items:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
-    engine = CalculationEngine()
-    
     try:
-        breakdown = engine.calculate_breakdown(
-            items=cart["items"],
-            discount_type=cart.get("discount_type"),
-            discount_value=cart.get("discount_value"),
-            max_discount=cart.get("max_discount"),
-            points_redeemed=cart.get("points_redeemed", 0),
-            member_type=cart.get("member_type", MemberType.REGULAR),
-        )
-        return breakdown
+        return FastJSONResponse(await calculate_cart(cart))
     except MarginProtectionError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/cart/{cart_id}/finalize")
-async def finalize_transaction(
-    cart_id: str,
-    request: FinalizeTransactionRequest
-) -> TransactionResponse:
-    """Finalize transaction and persist to database"""
-    if cart_id not in _carts:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    cart = _carts[cart_id]
-    
-    if not cart["items"]:
+async def _checkout_totals(cart: Cart, request: FinalizeTransactionRequest) -> tuple[FinancialBreakdown, Decimal]:
+    """Breakdown and change for a finalize; HTTPException if the cart cannot be sold"""
+    if not cart.items:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
-    engine = CalculationEngine()
-    
     try:
-        breakdown = engine.calculate_breakdown(
-            items=cart["items"],
-            discount_type=cart.get("discount_type"),
-            discount_value=cart.get("discount_value"),
-            max_discount=cart.get("max_discount"),
-            points_redeemed=cart.get("points_redeemed", 0),
-            member_type=cart.get("member_type", MemberType.REGULAR),
-        )
+        breakdown = await calculate_cart(cart)
     except MarginProtectionError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
@@ -250,8 +274,32 @@ async def finalize_transaction(
             raise HTTPException(status_code=400, detail="Insufficient payment amount")
         change_amount = request.amount_received - breakdown.grand_total
     
+    return breakdown, change_amount
+
+
+@router.post("/cart/{cart_id}/finalize")
+async def finalize_transaction(
+    cart_id: str,
+    request: FinalizeTransactionRequest
+) -> TransactionResponse:
+    """Finalize transaction and persist to database"""
+    await _get_cart(cart_id)
+    
+    # One finalize per cart: a double tap or a retry on another worker gets
+    # 409 instead of writing the sale twice. The sale is built from the cart
+    # as read under the claim; edits after it are rejected (409).
+    cart = await cart_store.claim(cart_id)
+    if cart is None:
+        raise HTTPException(status_code=409, detail="Cart is already being finalized")
+    
+    try:
+        breakdown, change_amount = await _checkout_totals(cart, request)
+    except HTTPException:
+        await cart_store.release(cart_id)
+        raise
+    
     # Generate invoice number
-    invoice_no = generate_invoice_number(cart["tenant_id"])
+    invoice_no = generate_invoice_number(cart.tenant_id)
     transaction_id = str(uuid.uuid4())
     
     # Persist to database
@@ -259,14 +307,14 @@ async def finalize_transaction(
     
     transaction_data = {
         "id": transaction_id,
-        "tenant_id": cart["tenant_id"],
+        "tenant_id": cart.tenant_id,
         "invoice_no": invoice_no,
-        "user_id": cart["user_id"],
-        "customer_id": cart.get("customer_id"),
+        "user_id": cart.user_id,
+        "customer_id": cart.customer_id,
         "gross_sales": float(breakdown.gross_sales),
         "discount_amount": float(breakdown.total_discount),
-        "discount_code": cart.get("discount_code"),
-        "points_redeemed": cart.get("points_redeemed", 0),
+        "discount_code": cart.discount_code,
+        "points_redeemed": cart.points_redeemed,
         "points_value": float(breakdown.loyalty_redemption),
         "dpp": float(breakdown.dpp),
         "tax_rate": float(breakdown.tax_rate),
@@ -274,40 +322,77 @@ async def finalize_transaction(
         "net_sales": float(breakdown.grand_total),
         "points_earned": breakdown.points_earned,
         "payment_type": request.payment_type.value,
+        "amount_received": float(request.amount_received) if request.amount_received is not None else None,
+        "terminal_id": cart.terminal_id,
         "payment_status": PaymentStatus.PAID.value if request.payment_type == PaymentType.CASH else PaymentStatus.PENDING.value,
     }
     
-    supabase.table("transactions").insert(transaction_data).execute()
-    
-    # Insert transaction items
-    for item in cart["items"]:
-        item_data = {
+    # Transaction items
+    items_data = [
+        {
             "id": str(uuid.uuid4()),
             "transaction_id": transaction_id,
-            "product_id": item.product_id,
-            "product_name": item.product_name,
-            "product_sku": item.product_sku,
-            "quantity": item.quantity,
-            "unit_price": float(item.unit_price),
-            "unit_cost": float(item.unit_cost) if item.unit_cost else None,
-            "subtotal": float(item.subtotal),
+            "product_id": line.product_id,
+            "product_name": line.product_name,
+            "product_sku": line.product_sku,
+            "quantity": line.quantity,
+            "unit_price": line.price,
+            "unit_cost": line.cost,
+            "subtotal": line.price * line.quantity,
         }
-        supabase.table("transaction_items").insert(item_data).execute()
-    
-    # Update customer points if applicable
-    if cart.get("customer_id"):
-        # Deduct redeemed points, add earned points
-        supabase.rpc("update_customer_points", {
-            "p_customer_id": cart["customer_id"],
-            "p_points_redeemed": cart.get("points_redeemed", 0),
-            "p_points_earned": breakdown.points_earned,
-            "p_amount_spent": float(breakdown.grand_total),
+        for line in cart.items
+    ]
+    
+    # Sale, items, point ledger and customer balance are written atomically
+    # in a single round-trip (see finalize_sale in db/003_loyalty_ledger.sql)
+    try:
+        result = supabase.rpc("finalize_sale", {
+            "p_transaction": transaction_data,
+            "p_items": items_data,
         }).execute()
+    except APIError as e:
+        # Rejected by the database, nothing written: the cart can be finalized
+        # again. Transport errors keep the claim, the sale may have been written.
+        await cart_store.release(cart_id)
+        if "Insufficient points" in str(e.message):
+            raise HTTPException(status_code=400, detail="Insufficient points")
+        raise
+    
+    if cart.customer_id and result.data:
+        update_cached_points(cart.customer_id, result.data["points_balance"])
+    
+    # Gateway charge is created in the background; checkout never waits on it
+    pipeline = get_payment_pipeline()
+    if pipeline is not None and request.payment_type != PaymentType.CASH:
+        pipeline.enqueue_charge(invoice_no, breakdown.grand_total, request.payment_type)
     
     # Clean up cart
-    del _carts[cart_id]
+    await cart_store.delete(cart_id)
     
-    return TransactionResponse(
+    # Receipt printing right after checkout needs no DB read
+    remember_receipt(Receipt(
+        tenant_id=cart.tenant_id,
+        invoice_no=invoice_no,
+        created_at=datetime.fromisoformat(result.data["created_at"]),
+        items=[
+            ReceiptLine(line.product_name, line.quantity, line.price, line.price * line.quantity)
+            for line in cart.items
+        ],
+        gross_sales=to_rupiah(breakdown.gross_sales),
+        discount_amount=to_rupiah(breakdown.total_discount),
+        points_value=to_rupiah(breakdown.loyalty_redemption),
+        dpp=to_rupiah(breakdown.dpp),
+        tax_rate=breakdown.tax_rate,
+        tax_amount=to_rupiah(breakdown.tax_amount),
+        net_sales=to_rupiah(breakdown.grand_total),
+        payment_type=request.payment_type,
+        points_earned=breakdown.points_earned,
+        amount_received=to_rupiah(request.amount_received) if request.amount_received is not None else None,
+        terminal_id=cart.terminal_id,
+        payment_status=PaymentStatus.PAID if request.payment_type == PaymentType.CASH else PaymentStatus.PENDING,
+    ))
+    
+    response = TransactionResponse(
         id=transaction_id,
         invoice_no=invoice_no,
         breakdown=breakdown,
@@ -316,6 +401,203 @@ async def finalize_transaction(
         change_amount=change_amount,
         created_at=datetime.now(),
     )
+    
+    broker = get_broker()
+    event = {"type": "finalized", "cart_id": cart_id, "data": response.model_dump(mode="json")}
+    for channel in _cart_channels(cart):
+        await broker.publish(channel, event)
+    
+    return FastJSONResponse(response)
+
+
+def _fetch_sale(transaction_id: str) -> dict:
+    supabase = get_supabase()
+    result = supabase.table("transactions").select(
+        "*, transaction_items(*)"
+    ).eq("id", transaction_id).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return result.data[0]
+
+
+def _sale_breakdown(sale: dict) -> FinancialBreakdown:
+    """Recorded totals of a finalized sale"""
+    gross_sales = Decimal(str(sale["gross_sales"]))
+    total_discount = Decimal(str(sale["discount_amount"] or 0))
+    return FinancialBreakdown(
+        gross_sales=gross_sales,
+        total_discount=total_discount,
+        subtotal_after_discount=gross_sales - total_discount,
+        loyalty_redemption=Decimal(str(sale["points_value"] or 0)),
+        dpp=Decimal(str(sale["dpp"])),
+        tax_rate=Decimal(str(sale["tax_rate"])),
+        tax_amount=Decimal(str(sale["tax_amount"])),
+        grand_total=Decimal(str(sale["net_sales"])),
+        points_earned=sale["points_earned"] or 0,
+    )
+
+
+def _issue_credit_note(
+    sale: dict,
+    quantities: dict[str, int],
+    kind: CreditNoteKind,
+    user_id: str,
+    reason: Optional[str],
+    restock: bool,
+) -> CreditNoteResponse:
+    """Compute the reversal and apply it atomically (see refund_sale in db/013_refunds.sql)"""
+    items = {item["id"]: item for item in sale["transaction_items"]}
+    already_refunded = sum(
+        (Decimal(str(item["unit_price"])) * (item["refunded_quantity"] or 0) for item in items.values()),
+        Decimal("0"),
+    )
+    refund_gross = sum(
+        (Decimal(str(items[item_id]["unit_price"])) * quantity for item_id, quantity in quantities.items()),
+        Decimal("0"),
+    )
+    
+    engine = CalculationEngine(tax_rate=Decimal(str(sale["tax_rate"])))
+    breakdown = engine.calculate_refund(
+        _sale_breakdown(sale),
+        already_refunded,
+        refund_gross,
+        points_redeemed=sale["points_redeemed"] or 0,
+    )
+    
+    credit_note_id = str(uuid.uuid4())
+    credit_note_no = generate_credit_note_number()
+    credit_note = {
+        "id": credit_note_id,
+        "credit_note_no": credit_note_no,
+        "invoice_no": sale["invoice_no"],
+        "kind": kind.value,
+        "user_id": user_id,
+        "reason": reason,
+        "gross_sales": float(breakdown.gross_sales),
+        "discount_amount": float(breakdown.total_discount),
+        "points_value": float(breakdown.loyalty_redemption),
+        "dpp": float(breakdown.dpp),
+        "tax_rate": float(breakdown.tax_rate),
+        "tax_amount": float(breakdown.tax_amount),
+        "total_amount": float(breakdown.grand_total),
+        "points_restored": breakdown.points_restored,
+        "points_reversed": breakdown.points_reversed,
+        "restocked": restock,
+    }
+    
+    # Lines carry the refunded quantity we computed from, so a concurrent
+    # refund of the same sale is rejected instead of reversed twice
+    items_data = [
+        {
+            "transaction_item_id": item_id,
+            "quantity": quantity,
+            "expected_refunded": items[item_id]["refunded_quantity"] or 0,
+        }
+        for item_id, quantity in quantities.items()
+    ]
+    
+    supabase = get_supabase()
+    try:
+        result = supabase.rpc("refund_sale", {
+            "p_transaction_id": sale["id"],
+            "p_credit_note": credit_note,
+            "p_items": items_data,
+        }).execute()
+    except APIError as e:
+        if "Refund conflict" in str(e.message):
+            raise HTTPException(status_code=409, detail="Sale changed during refund, reload and retry")
+        if "cannot be" in str(e.message):
+            raise HTTPException(status_code=400, detail=str(e.message))
+        raise
+    
+    if sale["customer_id"] and result.data["points_balance"] is not None:
+        update_cached_points(sale["customer_id"], result.data["points_balance"])
+    forget_receipt(sale["invoice_no"])  # Reprints now carry BATAL / RETUR
+    
+    # Earned points already spent are only taken back as far as the balance allows
+    breakdown.points_reversed = result.data["points_reversed"]
+    return CreditNoteResponse(
+        id=credit_note_id,
+        credit_note_no=credit_note_no,
+        transaction_id=sale["id"],
+        invoice_no=sale["invoice_no"],
+        kind=kind,
+        breakdown=breakdown,
+        payment_status=PaymentStatus(result.data["payment_status"]),
+        created_at=result.data["created_at"],
+    )
+
+
+@router.post("/{transaction_id}/refund")
+async def refund_transaction(transaction_id: str, request: RefundRequest) -> CreditNoteResponse:
+    """Refund all or part of a paid sale (tax, discount, points and stock reversed)"""
+    sale = _fetch_sale(transaction_id)
+    
+    if sale["payment_status"] not in (PaymentStatus.PAID.value, PaymentStatus.PARTIALLY_REFUNDED.value):
+        raise HTTPException(status_code=400, detail="Only paid sales can be refunded")
+    
+    remaining = {item["id"]: item["quantity"] - (item["refunded_quantity"] or 0) for item in sale["transaction_items"]}
+    
+    if request.items is None:
+        quantities = {item_id: quantity for item_id, quantity in remaining.items() if quantity > 0}
+    else:
+        quantities = {}
+        for line in request.items:
+            if line.item_id not in remaining:
+                raise HTTPException(status_code=404, detail=f"Item {line.item_id} not in this sale")
+            quantities[line.item_id] = quantities.get(line.item_id, 0) + line.quantity
+        
+        if any(quantity > remaining[item_id] for item_id, quantity in quantities.items()):
+            raise HTTPException(status_code=400, detail="Refund quantity exceeds quantity not yet refunded")
+    
+    if not quantities:
+        raise HTTPException(status_code=400, detail="Nothing left to refund")
+    
+    return FastJSONResponse(_issue_credit_note(
+        sale, quantities, CreditNoteKind.REFUND, request.user_id, request.reason, request.restock
+    ))
+
+
+async def _cancel_gateway_charge(invoice_no: str) -> None:
+    """Cancel the Midtrans charge of a pending sale, so it can no longer be paid after the void"""
+    pipeline = get_payment_pipeline()
+    if pipeline is None:
+        return  # Midtrans not configured: no charge was created
+    
+    try:
+        result = await pipeline.client.cancel(invoice_no)
+    except MidtransError:
+        raise HTTPException(status_code=503, detail="Payment gateway unreachable, try again")
+    
+    status_code = str(result.get("status_code"))
+    if status_code == "404":
+        # Charge still queued (or left to the reconciler): it would be created after the void
+        raise HTTPException(status_code=409, detail="Payment is still being created, try again shortly")
+    if status_code != "200":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Payment can no longer be cancelled ({result.get('status_message')}); refund it once settled",
+        )
+
+
+@router.post("/{transaction_id}/void")
+async def void_transaction(transaction_id: str, request: VoidRequest) -> CreditNoteResponse:
+    """Cancel a whole sale that has not been refunded (pending or paid)"""
+    sale = _fetch_sale(transaction_id)
+    
+    if sale["payment_status"] not in (PaymentStatus.PENDING.value, PaymentStatus.PAID.value) or sale["refunded_amount"]:
+        raise HTTPException(status_code=400, detail="Only pending or paid sales without refunds can be voided")
+    
+    # A pending QRIS / e-wallet sale is voided only once its charge is cancelled;
+    # the gateway's cancel notification then finds the sale no longer PENDING
+    if sale["payment_status"] == PaymentStatus.PENDING.value and PaymentType(sale["payment_type"]) in CHARGE_TYPES:
+        await _cancel_gateway_charge(sale["invoice_no"])
+    
+    quantities = {item["id"]: item["quantity"] for item in sale["transaction_items"]}
+    return FastJSONResponse(_issue_credit_note(
+        sale, quantities, CreditNoteKind.VOID, request.user_id, request.reason, restock=True
+    ))
 
 
 @router.get("/export")
@@ -325,7 +607,7 @@ async def export_coretax(
     end_date: str,
 ):
     """Export transactions for Coretax (Indonesia tax reporting)"""
-    supabase = get_supabase()
+    supabase = get_supabase_read()
     
     result = supabase.table("transactions").select(
         "invoice_no, created_at, dpp, tax_rate, tax_amount, payment_status"
@@ -333,6 +615,12 @@ async def export_coretax(
         "created_at", start_date
     ).lte("created_at", end_date).execute()
     
+    credit_notes = supabase.table("credit_notes").select(
+        "credit_note_no, invoice_no, kind, created_at, dpp, tax_rate, tax_amount"
+    ).eq("tenant_id", tenant_id).gte(
+        "created_at", start_date
+    ).lte("created_at", end_date).execute()
+    
     # Format for Coretax
     export_data = []
     for tx in result.data:
@@ -345,7 +633,19 @@ async def export_coretax(
             "status_pembayaran": tx["payment_status"],
         })
     
-    return {
+    # Returns / voids reported as nota retur against the original invoice
+    for note in credit_notes.data:
+        export_data.append({
+            "tanggal_faktur": note["created_at"][:10],
+            "nomor_faktur": note["credit_note_no"],
+            "nomor_faktur_asal": note["invoice_no"],
+            "jenis": "RETUR" if note["kind"] == CreditNoteKind.REFUND.value else "BATAL",
+            "dpp": note["dpp"],
+            "ppn": note["tax_amount"],
+            "tarif_ppn": note["tax_rate"],
+        })
+    
+    return FastJSONResponse({
         "count": len(export_data),
         "data": export_data,
-    }
+    })
@@ -10,27 +10,144 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_anon_key: str
     
+    # Read replica / secondary PostgREST endpoint (empty = everything on the primary)
+    supabase_read_url: str = ""
+    supabase_read_key: str = ""  # defaults to supabase_anon_key
+    read_your_writes_window: float = 10.0  # seconds a session keeps reading the primary after a write
+    replica_cooldown: float = 30.0  # seconds the replica is skipped after it fails
+    
+    # PostgREST HTTP pool
+    db_pool_max_connections: int = 100
+    db_pool_max_keepalive: int = 20
+    db_keepalive_expiry: float = 30.0  # seconds an idle connection is kept
+    db_http2: bool = True
+    db_connect_timeout: float = 5.0
+    db_read_timeout: float = 15.0
+    db_read_retries: int = 2  # GET only; writes and RPCs are never retried
+    db_retry_backoff: float = 0.1  # seconds, doubled per attempt (full jitter)
+    db_retry_max_backoff: float = 0.5  # cap per sleep; the sleep blocks the calling thread
+    
     # Midtrans
     midtrans_server_key: str = ""
     midtrans_client_key: str = ""
     midtrans_is_production: bool = False
+    midtrans_base_url: str = ""  # Override (e.g. local stand-in)
+    
+    # Payment pipeline
+    payment_queue_size: int = 1000
+    payment_charge_workers: int = 2
+    payment_charge_retries: int = 3
+    payment_reconcile_interval: int = 30  # seconds between reconciler ticks
+    payment_reconcile_batch: int = 50  # max stale sales polled per tick
+    payment_reconcile_concurrency: int = 5
+    payment_stale_after: int = 60  # seconds PENDING before polling the gateway
+    payment_max_age_hours: int = 24
     
     # AI
     groq_api_key: str = ""
     
+    # Demand forecast (nightly reorder suggestions)
+    store_timezone: str = "Asia/Jakarta"
+    forecast_history_days: int = 56
+    forecast_alpha: float = 0.1  # smoothing weight of the most recent day
+    forecast_lead_time_days: int = 3  # supplier lead time
+    forecast_cover_days: int = 7  # days of demand each order should cover
+    forecast_service_z: float = 1.65  # ~95% service level
+    
     # Telegram
     telegram_bot_token: str = ""
+    telegram_api_url: str = "https://api.telegram.org"  # Override (e.g. local stand-in)
+    telegram_rate_per_second: float = 25  # all chats (Bot API allows ~30)
+    telegram_chat_rate_per_minute: float = 20  # per chat (group limit)
+    notify_poll_interval: float = 2.0  # seconds between outbox polls when idle
+    notify_batch_size: int = 100
+    notify_lease_seconds: int = 60
+    notify_max_attempts: int = 5
+    notify_retry_backoff: float = 5.0  # seconds, doubled per attempt
+    
+    # Change-event stream (outbox relay)
+    outbox_relay_enabled: bool = True  # False when `python -m src.jobs.outbox run` runs separately
+    outbox_sinks: str = "listeners"  # comma-separated: listeners, ndjson, redis
+    outbox_ndjson_dir: str = "events"
+    outbox_redis_stream: str = "kasirai:events"
+    outbox_stream_maxlen: int = 100_000  # approximate entries kept in the stream
+    outbox_poll_interval: float = 1.0  # seconds between polls when caught up
+    outbox_batch_size: int = 500
+    outbox_lease_seconds: int = 30
+    outbox_retention_days: int = 7
+    outbox_consumer_inactive_days: int = 3  # unleased this long: stops holding back pruning
+    
+    # Transaction partitions (python -m src.jobs.partitions)
+    partition_months_ahead: int = 3  # months created in advance
+    partition_retention_months: int = 24  # older months are detached and exported
+    archive_dir: str = "archive"  # Parquet export root
+    
+    # Carts
+    cart_idle_ttl: int = 3600  # seconds without activity before eviction
+    cart_sweep_interval: int = 60
+    cart_max_per_tenant: int = 500
+    cart_max_per_terminal: int = 20
+    
+    # Admission control (rate limiting / load shedding)
+    ratelimit_enabled: bool = True
+    ratelimit_terminal_rate: float = 10  # requests/second per terminal
+    ratelimit_terminal_burst: float = 40
+    ratelimit_tenant_rate: float = 50  # requests/second across a tenant's terminals
+    ratelimit_tenant_burst: float = 200
+    ratelimit_max_keys: int = 10_000  # per-worker buckets kept (in-memory backend)
+    shed_lag_threshold: float = 0.25  # seconds of event-loop lag; 0 disables
+    shed_lag_interval: float = 0.1  # seconds between lag samples
+    shed_max_in_flight: int = 200  # per worker; 0 disables
+    shed_retry_after: int = 1  # seconds
+    
+    # Responses
+    gzip_minimum_size: int = 1024  # bytes; 0 disables compression
+    gzip_compresslevel: int = 6
+    
+    # Request profiling (opt-in; download from GET /health/profiles)
+    profiling_enabled: bool = False
+    profiling_slow_threshold: float = 0.5  # seconds; slower requests keep their span timings
+    profiling_sample_rate: float = 0.0  # share of requests given a full call profile
+    profiling_buffer_size: int = 200  # profiles kept per worker
+    admin_token: str = ""  # X-Admin-Token for admin endpoints; empty disables them
+    
+    # Shared store / pub-sub (empty = in-process only)
+    redis_url: str = ""
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
     debug: bool = True
+    warmup_tenant_ids: str = ""  # comma-separated tenants preloaded at startup
+    
+    # Production server (serve.py)
+    web_concurrency: int = 0  # workers; 0 = available CPUs
+    keep_alive_timeout: int = 5  # seconds
+    backlog: int = 2048
+    graceful_timeout: int = 30  # seconds to finish in-flight requests on SIGTERM
+    shutdown_drain_timeout: int = 10  # seconds to flush queued background writes
     
     # Business defaults
     default_tax_rate: float = 11.0  # PPN 11%
     default_points_per_amount: int = 10000  # Rp 10.000 = 1 point
     default_point_value: int = 100  # 1 point = Rp 100
     
+    # Member tiers (lifetime_spent thresholds, overridable per tenant)
+    tier_silver_threshold: int = 1_000_000
+    tier_gold_threshold: int = 5_000_000
+    tier_platinum_threshold: int = 20_000_000
+    point_expiry_days: int = 0  # 0 = points never expire (tenant override)
+    point_expiry_batch_size: int = 5000
+    customer_profile_ttl: int = 300  # seconds
+    customer_index_ttl: int = 900  # seconds before a tenant index is rebuilt
+    customer_index_max_size: int = 50_000  # larger tenants use DB prefix search
+    category_cache_ttl: int = 300  # seconds
+    promotion_cache_ttl: int = 60  # seconds an edit may take to reach other workers
+    receipt_cache_size: int = 5000  # recent sales kept ready to print
+    receipt_cache_ttl: int = 3600  # seconds
+    receipt_template_ttl: int = 300  # seconds before tenant receipt settings are re-read
+    receipt_batch_limit: int = 500  # receipts per batch reprint
+    
     class Config:
         env_file = "../.env"
         env_file_encoding = "utf-8"
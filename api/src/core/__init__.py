@@ -2,5 +2,6 @@
 Domain package - Business Logic
 """
 from src.core.calculation_engine import CalculationEngine, MarginProtectionError
+from src.core.promotion_engine import PromotionIndex
 
-__all__ = ["CalculationEngine", "MarginProtectionError"]
+__all__ = ["CalculationEngine", "MarginProtectionError", "PromotionIndex"]
@@ -0,0 +1,344 @@
+"""
+Admission Control - Rate Limiting & Load Shedding
+
+Every HTTP request is classed by priority and admitted in two steps:
+1. Rate limit: token buckets per terminal and per tenant. Requests of all
+   classes draw from the same buckets, but lower classes must leave a
+   reserve behind (BULK 50%, STANDARD 25% of capacity), so a terminal
+   looping on listings still has tokens left to check out.
+2. Load shedding: when this worker's event-loop lag or in-flight count
+   crosses its threshold, BULK requests are refused; at twice the
+   threshold STANDARD ones too. CHECKOUT is never shed.
+Refusals are 429 with Retry-After.
+
+Keys come from the X-Tenant-Id / X-Terminal-Id headers, falling back to
+the tenant_id / terminal_id query parameters. Cart routes
+(/api/transactions/cart/{id}/...) carry neither, so they are keyed by the
+cart's own tenant and terminal (looked up once per cart, then remembered).
+Anything else falls back to the client address for the terminal, with no
+tenant bucket: POS clients should send both headers, creating a cart
+included (its tenant is only in the body).
+
+Two limiter backends with the same async interface:
+- MemoryRateLimiter: per worker, LRU-bounded number of buckets
+- RedisRateLimiter: shared across workers, one Lua script round trip per
+  request (requires the optional `redis` package); fails open
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Awaitable, Callable, Optional
+from urllib.parse import parse_qs
+from src.core.cache import TTLCache
+from src.cfg import get_settings
+from src.core.metrics import registry
+from src.core.ratelimit import TokenBucket
+from src.core.responses import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+_rejected = registry.counter("kasirai_requests_rejected_total", "Requests refused with 429 by reason and priority")
+
+
+class Priority(str, Enum):
+    CHECKOUT = "checkout"  # Cart mutations, finalize, refunds, shifts
+    STANDARD = "standard"
+    BULK = "bulk"  # Listings, reports, exports
+
+
+# Share of bucket capacity a class must leave for higher classes
+RESERVE = {Priority.CHECKOUT: 0.0, Priority.STANDARD: 0.25, Priority.BULK: 0.5}
+
+# Overload level (lag or in-flight relative to threshold) at which a class is shed
+SHED_LEVEL = {Priority.CHECKOUT: math.inf, Priority.STANDARD: 2.0, Priority.BULK: 1.0}
+
+# Health probes, metrics and signed gateway webhooks are never limited
+EXEMPT_PATHS = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json", "/api/payments/midtrans/")
+
+# Long-lived streams: rate limited on connect, not counted as in flight
+STREAM_PATHS = ("/api/events/",)
+
+CHECKOUT_PATHS = ("/api/transactions/", "/api/shifts")
+
+BULK_PATHS = ("/api/insights/", "/api/transactions/export", "/api/products/categories/")
+BULK_LISTINGS = {"/api/products", "/api/customers", "/api/discounts", "/api/promotions", "/api/shifts", "/api/receipts"}
+
+CART_PATH = re.compile(r"^/api/transactions/cart/([^/]+)")
+
+# cart id -> (tenant, terminal) of the open cart, None if there is no such cart
+CartOwner = Callable[[str], Awaitable[Optional[tuple[str, Optional[str]]]]]
+
+
+def classify(method: str, path: str) -> Priority:
+    if method == "GET":
+        if path.rstrip("/") in BULK_LISTINGS or path.startswith(BULK_PATHS):
+            return Priority.BULK
+        return Priority.STANDARD
+    if path.startswith(CHECKOUT_PATHS):
+        return Priority.CHECKOUT
+    return Priority.STANDARD
+
+
+def client_keys(scope: dict, owner: Optional[tuple[str, Optional[str]]] = None) -> tuple[Optional[str], str]:
+    """(tenant, terminal) identifying the caller; owner fills in what the request lacks"""
+    headers = dict(scope["headers"])
+    tenant = headers.get(b"x-tenant-id", b"").decode("latin-1")
+    terminal = headers.get(b"x-terminal-id", b"").decode("latin-1")
+    
+    if not tenant or not terminal:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        tenant = tenant or query.get("tenant_id", [""])[0]
+        terminal = terminal or query.get("terminal_id", [""])[0]
+    
+    if owner is not None:
+        tenant = tenant or owner[0]
+        terminal = terminal or owner[1] or ""
+    
+    if not terminal:
+        client = scope.get("client")
+        terminal = f"ip:{client[0]}" if client else "unknown"
+    return tenant or None, terminal
+
+
+# (key, rate per second, capacity)
+BucketSpec = tuple[str, float, float]
+
+
+def bucket_specs(tenant: Optional[str], terminal: str) -> list[BucketSpec]:
+    settings = get_settings()
+    specs = [(f"terminal:{tenant or '-'}:{terminal}", settings.ratelimit_terminal_rate, settings.ratelimit_terminal_burst)]
+    if tenant:
+        specs.append((f"tenant:{tenant}", settings.ratelimit_tenant_rate, settings.ratelimit_tenant_burst))
+    return specs
+
+
+class MemoryRateLimiter:
+    """In-process token buckets (per worker), least recently used evicted first"""
+    
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+    
+    def _bucket(self, key: str, rate: float, capacity: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+    
+    async def acquire(self, specs: list[BucketSpec], reserve: float) -> float:
+        """Take a token from every bucket, or none; returns 0 or seconds to wait"""
+        buckets = [(self._bucket(*spec), spec[2] * reserve) for spec in specs]
+        wait = max(bucket.delay(1, held) for bucket, held in buckets)
+        if wait > 0:
+            return wait
+        for bucket, held in buckets:
+            bucket.try_acquire(1, held)
+        return 0.0
+    
+    async def close(self) -> None:
+        pass
+
+
+# KEYS: bucket keys. ARGV: now, then (rate, capacity, reserve) per key.
+# All-or-nothing across keys; returns the wait in seconds as a string.
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 1])
+    local capacity = tonumber(ARGV[3 * i])
+    local reserve = tonumber(ARGV[3 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    current = math.min(capacity, current + elapsed * rate)
+    tokens[i] = current
+    wait = math.max(wait, (1 + reserve - current) / rate)
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 1])
+    local capacity = tonumber(ARGV[3 * i])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+end
+return '0'
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets shared by all workers; allows traffic if Redis is unavailable"""
+    
+    def __init__(self, url: str, prefix: str = "kasirai:rl:"):
+        from redis import asyncio as aioredis  # Optional dependency
+        
+        self._redis = aioredis.from_url(url)
+        self._script = self._redis.register_script(_ACQUIRE_SCRIPT)
+        self.prefix = prefix
+    
+    async def acquire(self, specs: list[BucketSpec], reserve: float) -> float:
+        args: list[float] = [time.time()]
+        for _, rate, capacity in specs:
+            args.extend((rate, capacity, capacity * reserve))
+        try:
+            wait = await self._script(keys=[self.prefix + key for key, _, _ in specs], args=args)
+        except Exception as e:
+            logger.warning("Shared rate limiter unavailable, allowing request: %s", e)
+            return 0.0
+        return float(wait)
+    
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_rate_limiter() -> MemoryRateLimiter | RedisRateLimiter:
+    """Shared Redis buckets when redis_url is set, per-worker buckets otherwise"""
+    settings = get_settings()
+    if settings.redis_url:
+        return RedisRateLimiter(settings.redis_url)
+    return MemoryRateLimiter(settings.ratelimit_max_keys)
+
+
+class LoadMonitor:
+    """Samples event-loop lag; the middleware keeps the in-flight count"""
+    
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.lag = 0.0
+        self.in_flight = 0
+        self._task: Optional[asyncio.Task] = None
+        
+        registry.gauge("kasirai_event_loop_lag_seconds", "Event-loop lag of this worker", lambda: self.lag)
+        registry.gauge("kasirai_requests_in_flight", "Requests being handled by this worker", lambda: float(self.in_flight))
+    
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._sample_loop(), name="load-monitor")
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _sample_loop(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - started - self.interval)
+    
+    def level(self) -> float:
+        """Overload relative to the configured thresholds (>= 1 means overloaded)"""
+        settings = get_settings()
+        level = 0.0
+        if settings.shed_lag_threshold:
+            level = self.lag / settings.shed_lag_threshold
+        if settings.shed_max_in_flight:
+            level = max(level, self.in_flight / settings.shed_max_in_flight)
+        return level
+
+
+_monitor: Optional[LoadMonitor] = None
+
+
+def get_load_monitor() -> LoadMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = LoadMonitor(get_settings().shed_lag_interval)
+    return _monitor
+
+
+async def start_load_monitor() -> LoadMonitor:
+    monitor = get_load_monitor()
+    if monitor._task is None and get_settings().shed_lag_threshold:
+        await monitor.start()
+    return monitor
+
+
+async def stop_load_monitor() -> None:
+    if _monitor is not None:
+        await _monitor.stop()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying rate limits and load shedding to HTTP requests"""
+    
+    def __init__(
+        self,
+        app,
+        limiter: Optional[MemoryRateLimiter | RedisRateLimiter] = None,
+        cart_owner: Optional[CartOwner] = None,
+    ):
+        settings = get_settings()
+        self.app = app
+        self.limiter = limiter or create_rate_limiter()
+        self.monitor = get_load_monitor()
+        self.cart_owner = cart_owner
+        # A cart never changes owner: one store lookup per cart and worker
+        self._cart_owners = TTLCache(maxsize=settings.ratelimit_max_keys, ttl=settings.cart_idle_ttl)
+    
+    async def _client_keys(self, scope) -> tuple[Optional[str], str]:
+        tenant, terminal = client_keys(scope)
+        if tenant is not None or self.cart_owner is None:
+            return tenant, terminal
+        
+        match = CART_PATH.match(scope["path"])
+        if match is None:
+            return tenant, terminal
+        
+        owner = self._cart_owners.get(match[1])
+        if owner is None:
+            owner = await self.cart_owner(match[1])
+            if owner is None:
+                return tenant, terminal
+            self._cart_owners.set(match[1], owner)
+        return client_keys(scope, owner)
+    
+    @staticmethod
+    async def _reject(scope, receive, send, reason: str, priority: Priority, retry_after: float) -> None:
+        _rejected.inc(reason=reason, priority=priority.value)
+        response = FastJSONResponse(
+            {"detail": "Too many requests" if reason == "rate_limit" else "Server busy, retry shortly"},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
+    
+    async def __call__(self, scope, receive, send) -> None:
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+        
+        settings = get_settings()
+        priority = classify(scope["method"], path)
+        
+        if self.monitor.level() >= SHED_LEVEL[priority]:
+            await self._reject(scope, receive, send, "overload", priority, settings.shed_retry_after)
+            return
+        
+        wait = await self.limiter.acquire(bucket_specs(*await self._client_keys(scope)), RESERVE[priority])
+        if wait > 0:
+            await self._reject(scope, receive, send, "rate_limit", priority, wait)
+            return
+        
+        if path.startswith(STREAM_PATHS):
+            await self.app(scope, receive, send)
+            return
+        
+        self.monitor.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.in_flight -= 1
@@ -3,7 +3,7 @@ CalculationEngine - Core Financial Logic
 
 STRICT CALCULATION ORDER:
 1. Subtotal (sum of item price × quantity)
-2. Discount (item & transaction level)
+2. Discount (item-level promotions, then transaction code)
 3. Loyalty point redemption
 4. Tax calculation (DPP + PPN)
 5. Grand total
@@ -14,11 +14,15 @@ All calculations happen SERVER-SIDE ONLY.
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Optional
 from src.dto.schemas import (
+    AppliedPromotion,
     CartItem,
     FinancialBreakdown,
+    RefundBreakdown,
     DiscountType,
     MemberType,
 )
+from src.core.promotion_engine import PromotionIndex
+from src.core.profiling import span
 
 
 class MarginProtectionError(Exception):
@@ -54,6 +58,21 @@ class CalculationEngine:
         """Calculate single item subtotal"""
         return (price * Decimal(quantity)).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
     
+    def apply_item_promotions(
+        self,
+        items: list[CartItem],
+        promotions: Optional[PromotionIndex],
+    ) -> tuple[Decimal, list[AppliedPromotion]]:
+        """
+        Step 2a: Apply automatic item-level promotions
+        Returns: (item_discount_amount, applied_promotions)
+        """
+        if promotions is None:
+            return Decimal("0"), []
+        
+        applied = promotions.evaluate(items)
+        return sum((p.amount for p in applied), Decimal("0")), applied
+    
     def apply_discount(
         self,
         subtotal: Decimal,
@@ -62,7 +81,7 @@ class CalculationEngine:
         max_discount: Optional[Decimal] = None,
     ) -> tuple[Decimal, Decimal]:
         """
-        Step 2: Apply discount
+        Step 2b: Apply transaction discount
         Returns: (discount_amount, subtotal_after_discount)
         """
         if discount_type is None or discount_value is None:
@@ -187,24 +206,38 @@ class CalculationEngine:
         points_redeemed: int = 0,
         member_type: MemberType = MemberType.REGULAR,
         validate_margin: bool = True,
+        promotions: Optional[PromotionIndex] = None,
     ) -> FinancialBreakdown:
         """
         Complete financial breakdown following strict calculation order.
         
         Order:
         1. Subtotal
-        2. Discount
+        2. Discount (item promotions, then transaction code)
         3. Loyalty redemption
         4. Tax
         5. Grand total
         """
         # Step 1: Subtotal
-        gross_sales = self.calculate_subtotal(items)
+        with span("calc.subtotal"):
+            gross_sales = self.calculate_subtotal(items)
         
         # Step 2: Discount
-        total_discount, subtotal_after_discount = self.apply_discount(
-            gross_sales, discount_type, discount_value, max_discount
-        )
+        with span("calc.promotions"):
+            item_discounts, applied_promotions = self.apply_item_promotions(items, promotions)
+        with span("calc.discount"):
+            transaction_discount, subtotal_after_discount = self.apply_discount(
+                gross_sales - item_discounts, discount_type, discount_value, max_discount
+            )
+            # max_discount_pct caps promotions + code together, measured on gross.
+            # Promotions are tenant-set prices and are never cut; the code gets what room is left.
+            max_total = (gross_sales * self.max_discount_pct / Decimal("100")).quantize(
+                Decimal("1"), rounding=ROUND_HALF_UP
+            )
+            if item_discounts + transaction_discount > max_total:
+                transaction_discount = max(max_total - item_discounts, Decimal("0"))
+                subtotal_after_discount = gross_sales - item_discounts - transaction_discount
+        total_discount = item_discounts + transaction_discount
         
         # Step 3: Loyalty redemption
         # Cannot redeem more than subtotal after discount
@@ -220,10 +253,12 @@ class CalculationEngine:
         
         # Margin protection
         if validate_margin:
-            self.validate_margin_protection(items, total_discount, loyalty_value)
+            with span("calc.margin"):
+                self.validate_margin_protection(items, total_discount, loyalty_value)
         
         # Step 4: Tax calculation
-        dpp, tax_rate, tax_amount = self.calculate_tax(amount_before_tax)
+        with span("calc.tax"):
+            dpp, tax_rate, tax_amount = self.calculate_tax(amount_before_tax)
         
         # Step 5: Grand total
         if self.tax_inclusive:
@@ -236,8 +271,8 @@ class CalculationEngine:
         
         return FinancialBreakdown(
             gross_sales=gross_sales,
-            item_discounts=Decimal("0"),  # Item-level discounts not implemented yet
-            transaction_discount=total_discount,
+            item_discounts=item_discounts,
+            transaction_discount=transaction_discount,
             total_discount=total_discount,
             subtotal_after_discount=subtotal_after_discount,
             loyalty_redemption=loyalty_value,
@@ -246,4 +281,93 @@ class CalculationEngine:
             tax_amount=tax_amount,
             grand_total=grand_total,
             points_earned=points_earned,
+            applied_promotions=applied_promotions,
+        )
+    
+    def allocate_refund(
+        self,
+        sale: FinancialBreakdown,
+        refunded_gross: Decimal,
+        points_redeemed: int = 0,
+    ) -> RefundBreakdown:
+        """
+        Cumulative part of a sale reversed once `refunded_gross` of its items
+        has been returned, following the same order as calculate_breakdown.
+        
+        Discount and redeemed points are allocated pro rata to gross (item
+        promotions are not stored per line). Returning everything gives back
+        exactly the recorded totals.
+        """
+        if refunded_gross >= sale.gross_sales:
+            return RefundBreakdown(
+                gross_sales=sale.gross_sales,
+                total_discount=sale.total_discount,
+                loyalty_redemption=sale.loyalty_redemption,
+                dpp=sale.dpp,
+                tax_rate=sale.tax_rate,
+                tax_amount=sale.tax_amount,
+                grand_total=sale.grand_total,
+                points_restored=points_redeemed,
+                points_reversed=sale.points_earned,
+            )
+        
+        # Step 1: Subtotal of returned items, as a share of the sale
+        share = refunded_gross / sale.gross_sales
+        
+        # Step 2: Discount
+        discount = (sale.total_discount * share).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+        
+        # Step 3: Loyalty redemption
+        loyalty_value = (sale.loyalty_redemption * share).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+        points_restored = int((points_redeemed * share).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+        
+        amount_before_tax = max(refunded_gross - discount - loyalty_value, Decimal("0"))
+        
+        # Step 4: Tax calculation
+        dpp, tax_rate, tax_amount = self.calculate_tax(amount_before_tax)
+        
+        # Step 5: Grand total
+        if self.tax_inclusive:
+            grand_total = amount_before_tax
+        else:
+            grand_total = amount_before_tax + tax_amount
+        
+        return RefundBreakdown(
+            gross_sales=refunded_gross,
+            total_discount=discount,
+            loyalty_redemption=loyalty_value,
+            dpp=dpp,
+            tax_rate=tax_rate,
+            tax_amount=tax_amount,
+            grand_total=grand_total,
+            points_restored=points_restored,
+            points_reversed=int((sale.points_earned * share).quantize(Decimal("1"), rounding=ROUND_HALF_UP)),
+        )
+    
+    def calculate_refund(
+        self,
+        sale: FinancialBreakdown,
+        already_refunded_gross: Decimal,
+        refund_gross: Decimal,
+        points_redeemed: int = 0,
+    ) -> RefundBreakdown:
+        """
+        Amounts to give back for returning `refund_gross` more of a sale.
+        
+        Difference of two cumulative allocations, so a sale refunded in
+        several parts never drifts from its recorded totals by rounding.
+        """
+        before = self.allocate_refund(sale, already_refunded_gross, points_redeemed)
+        after = self.allocate_refund(sale, already_refunded_gross + refund_gross, points_redeemed)
+        
+        return RefundBreakdown(
+            gross_sales=after.gross_sales - before.gross_sales,
+            total_discount=after.total_discount - before.total_discount,
+            loyalty_redemption=after.loyalty_redemption - before.loyalty_redemption,
+            dpp=after.dpp - before.dpp,
+            tax_rate=sale.tax_rate,
+            tax_amount=after.tax_amount - before.tax_amount,
+            grand_total=after.grand_total - before.grand_total,
+            points_restored=after.points_restored - before.points_restored,
+            points_reversed=after.points_reversed - before.points_reversed,
         )
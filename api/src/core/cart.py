@@ -0,0 +1,196 @@
+"""
+Compact Cart Model
+
+Internal representation of an open cart. Slotted records with integer
+rupiah amounts: no per-instance __dict__, no pydantic validation on
+every mutation. Pydantic (CartItem, FinancialBreakdown) is only used at
+the API boundary.
+
+CartLine exposes the same attributes CalculationEngine reads from
+CartItem (unit_price, unit_cost, subtotal as Decimal), so the engine
+works on either.
+
+Wire format for the shared cart store is a compact JSON array. Its second
+element is the cart revision, bumped on every save so the store can reject
+a write based on a stale read.
+"""
+import json
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+from src.dto.schemas import CartItem, DiscountType, MemberType
+
+_FORMAT_VERSION = 2
+
+
+def to_rupiah(amount) -> int:
+    """Round a price to whole rupiah"""
+    return int(Decimal(str(amount)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+class CartLine:
+    """One product line; prices in whole rupiah"""
+    
+    __slots__ = ("product_id", "product_name", "product_sku", "category", "quantity", "price", "cost")
+    
+    def __init__(
+        self,
+        product_id: str,
+        product_name: str,
+        product_sku: str,
+        quantity: int,
+        price: int,
+        cost: Optional[int] = None,
+        category: Optional[str] = None,
+    ):
+        self.product_id = product_id
+        self.product_name = product_name
+        self.product_sku = product_sku
+        self.category = category
+        self.quantity = quantity
+        self.price = price
+        self.cost = cost
+    
+    @property
+    def unit_price(self) -> Decimal:
+        return Decimal(self.price)
+    
+    @property
+    def unit_cost(self) -> Optional[Decimal]:
+        return Decimal(self.cost) if self.cost is not None else None
+    
+    @property
+    def subtotal(self) -> Decimal:
+        return Decimal(self.price * self.quantity)
+    
+    def to_item(self) -> CartItem:
+        """Pydantic view for API responses"""
+        return CartItem(
+            product_id=self.product_id,
+            product_name=self.product_name,
+            product_sku=self.product_sku,
+            quantity=self.quantity,
+            unit_price=self.unit_price,
+            unit_cost=self.unit_cost,
+            category=self.category,
+            subtotal=self.subtotal,
+        )
+    
+    def to_list(self) -> list:
+        return [
+            self.product_id,
+            self.product_name,
+            self.product_sku,
+            self.category,
+            self.quantity,
+            self.price,
+            self.cost,
+        ]
+    
+    @classmethod
+    def from_list(cls, data: list) -> "CartLine":
+        product_id, name, sku, category, quantity, price, cost = data
+        return cls(product_id, name, sku, quantity, price, cost, category)
+
+
+class Cart:
+    """Cart header + lines"""
+    
+    __slots__ = (
+        "id",
+        "tenant_id",
+        "user_id",
+        "terminal_id",
+        "items",
+        "customer_id",
+        "discount_code",
+        "discount_type",
+        "discount_value",
+        "max_discount",
+        "points_redeemed",
+        "member_type",
+        "created_at",
+        "revision",
+    )
+    
+    def __init__(
+        self,
+        id: str,
+        tenant_id: str,
+        user_id: str,
+        terminal_id: Optional[str] = None,
+        created_at: str = "",
+    ):
+        self.id = id
+        self.tenant_id = tenant_id
+        self.user_id = user_id
+        self.terminal_id = terminal_id
+        self.items: list[CartLine] = []
+        self.customer_id: Optional[str] = None
+        self.discount_code: Optional[str] = None
+        self.discount_type: Optional[DiscountType] = None
+        self.discount_value: Optional[Decimal] = None
+        self.max_discount: Optional[int] = None
+        self.points_redeemed = 0
+        self.member_type = MemberType.REGULAR
+        self.created_at = created_at
+        self.revision = 0
+    
+    def find(self, product_id: str) -> Optional[CartLine]:
+        for line in self.items:
+            if line.product_id == product_id:
+                return line
+        return None
+    
+    def to_bytes(self) -> bytes:
+        return json.dumps([
+            _FORMAT_VERSION,
+            self.revision,
+            self.id,
+            self.tenant_id,
+            self.user_id,
+            self.terminal_id,
+            self.customer_id,
+            self.discount_code,
+            self.discount_type.value if self.discount_type else None,
+            str(self.discount_value) if self.discount_value is not None else None,
+            self.max_discount,
+            self.points_redeemed,
+            self.member_type.value,
+            self.created_at,
+            [line.to_list() for line in self.items],
+        ], separators=(",", ":")).encode()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Cart":
+        fields = json.loads(data)
+        if fields[0] == 1:  # Written before revisions
+            fields.insert(1, 0)
+        (
+            _version,
+            revision,
+            cart_id,
+            tenant_id,
+            user_id,
+            terminal_id,
+            customer_id,
+            discount_code,
+            discount_type,
+            discount_value,
+            max_discount,
+            points_redeemed,
+            member_type,
+            created_at,
+            lines,
+        ) = fields
+        
+        cart = cls(cart_id, tenant_id, user_id, terminal_id, created_at)
+        cart.customer_id = customer_id
+        cart.discount_code = discount_code
+        cart.discount_type = DiscountType(discount_type) if discount_type else None
+        cart.discount_value = Decimal(discount_value) if discount_value is not None else None
+        cart.max_discount = max_discount
+        cart.points_redeemed = points_redeemed
+        cart.member_type = MemberType(member_type)
+        cart.items = [CartLine.from_list(line) for line in lines]
+        cart.revision = revision
+        return cart
@@ -0,0 +1,362 @@
+"""
+CartStore - Bounded Storage for Open Carts
+
+Carts live until finalized, or until they sit idle longer than the TTL
+(walk-outs, crashed terminals). Hard caps per terminal / tenant keep
+memory flat.
+
+Caps:
+- per terminal: the least recently used cart of that terminal is evicted
+- per tenant: new carts are rejected (CartLimitError)
+
+Two backends with the same async interface:
+- CartStore: in-process, swept by a background task (single worker)
+- RedisCartStore: shared across workers; carts stored as compact bytes,
+  idle expiry handled by Redis key TTL (requires the optional `redis` package)
+
+Mutations are made on the Cart object and persisted with save(). save()
+never recreates a deleted cart and raises CartConflictError when the cart
+was deleted, claimed, or (Redis) saved by someone else since it was read.
+Finalize claims the cart first (claim()): exactly one concurrent finalize
+of a cart wins and gets the cart as of the claim, the others get None,
+also after the winner deleted the cart. release() hands the claim back
+when the sale was not written.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional
+from src.cfg import get_settings
+from src.core.cart import Cart
+from src.core.metrics import registry
+
+
+class CartLimitError(Exception):
+    """Raised when a tenant already has the maximum number of open carts"""
+    pass
+
+
+class CartConflictError(Exception):
+    """Raised when a cart save would overwrite a newer, finalizing or deleted cart"""
+    pass
+
+
+_evicted = registry.counter("kasirai_carts_evicted_total", "Carts evicted before finalize")
+_created = registry.counter("kasirai_carts_created_total", "Carts created")
+
+# Seconds a Redis finalize claim is held: longer than any finalize, short
+# enough to free a cart whose worker died mid-finalize
+CLAIM_TTL = 60
+
+# Redis cart save: KEYS = cart, claim; ARGV = bytes, revision read, TTL.
+# Rejects the write if the cart is being finalized, was deleted (SET XX,
+# never recreated) or was saved since it was read (revision = element 2
+# of the wire format, 0 for format 1).
+_SAVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 'claimed'
+end
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return 'missing'
+end
+local fields = cjson.decode(current)
+local revision = fields[1] == 1 and 0 or fields[2]
+if revision ~= tonumber(ARGV[2]) then
+    return 'stale'
+end
+redis.call('SET', KEYS[1], ARGV[1], 'XX', 'EX', ARGV[3])
+return 'ok'
+"""
+
+_SAVE_CONFLICTS = {
+    b"claimed": "Cart is being finalized",
+    b"missing": "Cart was finalized or expired",
+}
+
+
+class CartStore:
+    """In-memory cart store with idle TTL and per-scope caps"""
+    
+    def __init__(
+        self,
+        idle_ttl: float = 3600,
+        max_per_tenant: int = 500,
+        max_per_terminal: int = 20,
+    ):
+        self.idle_ttl = idle_ttl
+        self.max_per_tenant = max_per_tenant
+        self.max_per_terminal = max_per_terminal
+        # cart_id -> cart, ordered by last access (oldest first)
+        self._carts: OrderedDict[str, Cart] = OrderedDict()
+        self._last_access: dict[str, float] = {}
+        self._by_tenant: dict[str, set[str]] = {}
+        self._by_terminal: dict[tuple[str, str], set[str]] = {}
+        self._claimed: set[str] = set()
+        
+        registry.gauge("kasirai_carts_live", "Open carts in this worker", lambda: float(len(self._carts)))
+    
+    def __len__(self) -> int:
+        return len(self._carts)
+    
+    @staticmethod
+    def _terminal_key(cart: Cart) -> Optional[tuple[str, str]]:
+        if cart.terminal_id:
+            return (cart.tenant_id, cart.terminal_id)
+        return None
+    
+    async def create(self, cart: Cart) -> Cart:
+        tenant_carts = self._by_tenant.get(cart.tenant_id, set())
+        if len(tenant_carts) >= self.max_per_tenant:
+            raise CartLimitError(f"Tenant has {len(tenant_carts)} open carts (max {self.max_per_tenant})")
+        
+        terminal_key = self._terminal_key(cart)
+        if terminal_key is not None:
+            terminal_carts = self._by_terminal.get(terminal_key, set())
+            if len(terminal_carts) >= self.max_per_terminal:
+                oldest = min(terminal_carts, key=self._last_access.__getitem__)
+                self._remove(oldest)
+                _evicted.inc(reason="terminal_cap")
+        
+        self._carts[cart.id] = cart
+        self._last_access[cart.id] = time.monotonic()
+        self._by_tenant.setdefault(cart.tenant_id, set()).add(cart.id)
+        if terminal_key is not None:
+            self._by_terminal.setdefault(terminal_key, set()).add(cart.id)
+        _created.inc()
+        return cart
+    
+    async def get(self, cart_id: str) -> Optional[Cart]:
+        """Get cart and mark it as active"""
+        cart = self._carts.get(cart_id)
+        if cart is not None:
+            self._last_access[cart_id] = time.monotonic()
+            self._carts.move_to_end(cart_id)
+        return cart
+    
+    async def save(self, cart: Cart) -> None:
+        """Carts are mutated in place; only check the cart is still open"""
+        if cart.id not in self._carts:
+            raise CartConflictError("Cart was finalized or expired")
+        if cart.id in self._claimed:
+            raise CartConflictError("Cart is being finalized")
+    
+    async def claim(self, cart_id: str) -> Optional[Cart]:
+        """
+        Mark the cart as finalizing; None if it is missing or already claimed.
+        Returns a copy: edits still landing on the live cart stay out of the sale.
+        """
+        cart = self._carts.get(cart_id)
+        if cart is None or cart_id in self._claimed:
+            return None
+        self._claimed.add(cart_id)
+        return Cart.from_bytes(cart.to_bytes())
+    
+    async def release(self, cart_id: str) -> None:
+        self._claimed.discard(cart_id)
+    
+    async def delete(self, cart_id: str) -> None:
+        self._remove(cart_id)
+    
+    async def close(self) -> None:
+        pass
+    
+    def _remove(self, cart_id: str) -> None:
+        cart = self._carts.pop(cart_id, None)
+        if cart is None:
+            return
+        self._last_access.pop(cart_id, None)
+        self._claimed.discard(cart_id)
+        
+        tenant_carts = self._by_tenant.get(cart.tenant_id)
+        if tenant_carts is not None:
+            tenant_carts.discard(cart_id)
+            if not tenant_carts:
+                del self._by_tenant[cart.tenant_id]
+        
+        terminal_key = self._terminal_key(cart)
+        terminal_carts = self._by_terminal.get(terminal_key) if terminal_key else None
+        if terminal_carts is not None:
+            terminal_carts.discard(cart_id)
+            if not terminal_carts:
+                del self._by_terminal[terminal_key]
+    
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evict carts idle longer than idle_ttl; returns number evicted"""
+        deadline = (now if now is not None else time.monotonic()) - self.idle_ttl
+        expired: list[str] = []
+        # Ordered by last access: stop at the first cart that is still fresh
+        for cart_id in self._carts:
+            if self._last_access[cart_id] > deadline:
+                break
+            expired.append(cart_id)
+        
+        for cart_id in expired:
+            self._remove(cart_id)
+        if expired:
+            _evicted.inc(len(expired), reason="idle")
+        return len(expired)
+
+
+class RedisCartStore:
+    """
+    Shared cart store over Redis.
+    
+    Keys:
+    - cart:{id}                         compact cart bytes with revision, TTL = idle_ttl (refreshed on access)
+    - cart:{id}:claim                   "finalizing" while one worker finalizes it (SET NX, CLAIM_TTL)
+    - carts:tenant:{tenant}             set of cart ids (pruned lazily)
+    - carts:terminal:{tenant}:{term}    zset of cart ids scored by last access
+    """
+    
+    def __init__(
+        self,
+        url: str,
+        idle_ttl: float = 3600,
+        max_per_tenant: int = 500,
+        max_per_terminal: int = 20,
+    ):
+        from redis import asyncio as aioredis  # Optional dependency
+        
+        self._redis = aioredis.from_url(url)
+        self._save = self._redis.register_script(_SAVE_SCRIPT)
+        self.idle_ttl = int(idle_ttl)
+        self.max_per_tenant = max_per_tenant
+        self.max_per_terminal = max_per_terminal
+    
+    def __len__(self) -> int:
+        return 0  # Not tracked per worker
+    
+    @staticmethod
+    def _key(cart_id: str) -> str:
+        return f"cart:{cart_id}"
+    
+    @staticmethod
+    def _claim_key(cart_id: str) -> str:
+        return f"cart:{cart_id}:claim"
+    
+    @staticmethod
+    def _tenant_key(tenant_id: str) -> str:
+        return f"carts:tenant:{tenant_id}"
+    
+    @staticmethod
+    def _terminal_key(cart: Cart) -> Optional[str]:
+        if cart.terminal_id:
+            return f"carts:terminal:{cart.tenant_id}:{cart.terminal_id}"
+        return None
+    
+    async def _prune(self, index_key: str, members: list[bytes]) -> int:
+        """Drop ids whose cart key already expired; returns live count"""
+        if not members:
+            return 0
+        exists = await self._redis.mget([self._key(m.decode()) for m in members])
+        dead = [m for m, value in zip(members, exists) if value is None]
+        if dead:
+            if index_key.startswith("carts:terminal:"):
+                await self._redis.zrem(index_key, *dead)
+            else:
+                await self._redis.srem(index_key, *dead)
+        return len(members) - len(dead)
+    
+    async def create(self, cart: Cart) -> Cart:
+        tenant_key = self._tenant_key(cart.tenant_id)
+        if await self._redis.scard(tenant_key) >= self.max_per_tenant:
+            live = await self._prune(tenant_key, list(await self._redis.smembers(tenant_key)))
+            if live >= self.max_per_tenant:
+                raise CartLimitError(f"Tenant has {live} open carts (max {self.max_per_tenant})")
+        
+        terminal_key = self._terminal_key(cart)
+        if terminal_key is not None and await self._redis.zcard(terminal_key) >= self.max_per_terminal:
+            live = await self._prune(terminal_key, await self._redis.zrange(terminal_key, 0, -1))
+            if live >= self.max_per_terminal:
+                oldest = await self._redis.zrange(terminal_key, 0, 0)
+                if oldest:
+                    await self.delete(oldest[0].decode(), cart.tenant_id, terminal_key)
+                    _evicted.inc(reason="terminal_cap")
+        
+        pipe = self._redis.pipeline()
+        pipe.set(self._key(cart.id), cart.to_bytes(), ex=self.idle_ttl)
+        pipe.sadd(tenant_key, cart.id)
+        if terminal_key is not None:
+            pipe.zadd(terminal_key, {cart.id: time.time()})
+        await pipe.execute()
+        _created.inc()
+        return cart
+    
+    async def get(self, cart_id: str) -> Optional[Cart]:
+        data = await self._redis.getex(self._key(cart_id), ex=self.idle_ttl)
+        if data is None:
+            return None
+        cart = Cart.from_bytes(data)
+        terminal_key = self._terminal_key(cart)
+        if terminal_key is not None:
+            await self._redis.zadd(terminal_key, {cart.id: time.time()})
+        return cart
+    
+    async def save(self, cart: Cart) -> None:
+        """Compare-and-set on the cart revision (_SAVE_SCRIPT); bumps cart.revision"""
+        expected = cart.revision
+        cart.revision += 1
+        result = await self._save(
+            keys=[self._key(cart.id), self._claim_key(cart.id)],
+            args=[cart.to_bytes(), expected, self.idle_ttl],
+        )
+        if result != b"ok":
+            cart.revision = expected
+            raise CartConflictError(_SAVE_CONFLICTS.get(result, "Cart changed, reload and retry"))
+    
+    async def claim(self, cart_id: str) -> Optional[Cart]:
+        """
+        SET NX across workers, then read the cart as of the claim. The claim
+        outlives delete() until CLAIM_TTL, so a finalize that read the cart
+        before it was deleted still loses; after that the cart is gone (save()
+        never recreates it).
+        """
+        if not await self._redis.set(self._claim_key(cart_id), b"finalizing", nx=True, ex=CLAIM_TTL):
+            return None
+        data = await self._redis.get(self._key(cart_id))
+        if data is None:
+            await self.release(cart_id)
+            return None
+        return Cart.from_bytes(data)
+    
+    async def release(self, cart_id: str) -> None:
+        await self._redis.delete(self._claim_key(cart_id))
+    
+    async def delete(
+        self,
+        cart_id: str,
+        tenant_id: Optional[str] = None,
+        terminal_key: Optional[str] = None,
+    ) -> None:
+        if tenant_id is None:
+            cart = await self.get(cart_id)
+            if cart is None:
+                return
+            tenant_id, terminal_key = cart.tenant_id, self._terminal_key(cart)
+        
+        pipe = self._redis.pipeline()
+        pipe.delete(self._key(cart_id))
+        pipe.srem(self._tenant_key(tenant_id), cart_id)
+        if terminal_key is not None:
+            pipe.zrem(terminal_key, cart_id)
+        await pipe.execute()
+    
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Idle carts expire through Redis key TTL"""
+        return 0
+    
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_cart_store() -> CartStore | RedisCartStore:
+    """Shared Redis store when redis_url is set, in-process store otherwise"""
+    settings = get_settings()
+    options = {
+        "idle_ttl": settings.cart_idle_ttl,
+        "max_per_tenant": settings.cart_max_per_tenant,
+        "max_per_terminal": settings.cart_max_per_terminal,
+    }
+    if settings.redis_url:
+        return RedisCartStore(settings.redis_url, **options)
+    return CartStore(**options)
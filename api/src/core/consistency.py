@@ -0,0 +1,80 @@
+"""
+Read-Your-Writes - Session Consistency for Replica Reads
+
+A session (one terminal) that just wrote must not read its own change
+back from a lagging replica. For each HTTP request the middleware finds
+the session's last write and hands it to the data layer
+(set_session_last_write), which keeps the session on the primary for
+read_your_writes_window seconds.
+
+The last write is known from two places:
+- this worker remembers its sessions' writes (LRU-bounded)
+- responses to writes carry `X-Last-Write: <epoch seconds>`; clients
+  echo it on later requests so any worker honours it
+
+Sessions are keyed by the X-Terminal-Id header, or the client address
+without it. Query parameters are not used: a write (body only) and the
+read that follows it (?tenant_id=...) carry different ones, so they would
+never share a key. Terminals behind one NAT without the header share a
+session, which only sends more of their reads to the primary.
+"""
+import time
+from collections import OrderedDict
+from src.db import set_session_last_write
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+HEADER = b"x-last-write"
+
+
+def session_key(scope: dict) -> str:
+    """Same key for a terminal's writes and reads"""
+    for name, value in scope["headers"]:
+        if name == b"x-terminal-id" and value:
+            return f"terminal:{value.decode('latin-1')}"
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "unknown"
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware tracking each session's last write"""
+    
+    def __init__(self, app, max_sessions: int = 10_000):
+        self.app = app
+        self.max_sessions = max_sessions
+        self._last_write: OrderedDict[str, float] = OrderedDict()
+    
+    def _remember(self, session: str, timestamp: float) -> None:
+        self._last_write[session] = timestamp
+        self._last_write.move_to_end(session)
+        if len(self._last_write) > self.max_sessions:
+            self._last_write.popitem(last=False)
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        session = session_key(scope)
+        last_write = self._last_write.get(session, 0.0)
+        for name, value in scope["headers"]:
+            if name == HEADER:
+                try:
+                    last_write = max(last_write, float(value))
+                except ValueError:
+                    pass
+                break
+        set_session_last_write(last_write)
+        
+        if scope["method"] in READ_METHODS:
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_stamped(message) -> None:
+            if message["type"] == "http.response.start":
+                now = time.time()
+                self._remember(session, now)
+                message["headers"] = [*message.get("headers", []), (HEADER, f"{now:.3f}".encode())]
+            await send(message)
+        
+        await self.app(scope, receive, send_stamped)
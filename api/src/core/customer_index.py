@@ -0,0 +1,171 @@
+"""
+CustomerIndex - Prefix Lookup for Member Identification
+
+Per-tenant in-memory index over:
+- normalized phone (E.164 digits, Indonesia +62 default)
+- member_code
+- name tokens
+
+Each field is a sorted key list searched with bisect, so every keystroke
+at the till costs O(log n + matches) instead of a table scan.
+"""
+import re
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+from src.dto.schemas import CustomerProfile
+
+DEFAULT_COUNTRY_CODE = "62"
+
+_NON_DIGIT = re.compile(r"\D")
+_PHONE_QUERY = re.compile(r"^\+?[\d\s\-]+$")
+
+
+def normalize_phone(phone: str, country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """
+    Normalize phone number to E.164.
+    0812-3456-789 / 62812... / 812... -> +62812...
+    Must match normalize_phone_e164() in db/005_customer_lookup.sql.
+    """
+    digits = _NON_DIGIT.sub("", phone or "")
+    if not digits:
+        return None
+    if phone.strip().startswith("+") or digits.startswith(country_code):
+        return f"+{digits}"
+    if digits.startswith("0"):
+        return f"+{country_code}{digits[1:]}"
+    return f"+{country_code}{digits}"
+
+
+def phone_prefix(query: str, country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """
+    Key prefix (E.164 digits, no +) for a partially typed phone number.
+    Input that is still part of the country code ("6", "+6") is kept as
+    typed instead of getting the country code prepended ("+626"). None
+    while the input has not reached the subscriber number ("0", "62"):
+    such a prefix would match every member.
+    Must match normalize_phone_prefix() in db/005_customer_lookup.sql.
+    """
+    digits = _NON_DIGIT.sub("", query or "")
+    if not digits:
+        return None
+    if query.strip().startswith("+") or digits.startswith(country_code) or country_code.startswith(digits):
+        prefix = digits
+    elif digits.startswith("0"):
+        prefix = country_code + digits[1:]
+    else:
+        prefix = country_code + digits
+    if len(prefix) <= len(country_code) and country_code.startswith(prefix):
+        return None
+    return prefix
+
+
+def _name_tokens(name: str) -> list[str]:
+    return [token for token in name.lower().split() if token]
+
+
+class _PrefixField:
+    """Sorted (key, customer_id) pairs with prefix search"""
+    
+    def __init__(self):
+        self._entries: list[tuple[str, str]] = []
+    
+    def extend(self, entries: Iterable[tuple[str, str]]) -> None:
+        self._entries.extend(entries)
+        self._entries.sort()
+    
+    def add(self, key: str, customer_id: str) -> None:
+        insort(self._entries, (key, customer_id))
+    
+    def remove(self, key: str, customer_id: str) -> None:
+        i = bisect_left(self._entries, (key, customer_id))
+        if i < len(self._entries) and self._entries[i] == (key, customer_id):
+            del self._entries[i]
+    
+    def search(self, prefix: str, limit: int) -> list[str]:
+        found: list[str] = []
+        i = bisect_left(self._entries, (prefix, ""))
+        while i < len(self._entries) and len(found) < limit:
+            key, customer_id = self._entries[i]
+            if not key.startswith(prefix):
+                break
+            found.append(customer_id)
+            i += 1
+        return found
+
+
+class CustomerIndex:
+    """In-memory member lookup for one tenant"""
+    
+    def __init__(self, profiles: Iterable[CustomerProfile] = ()):
+        self._profiles: dict[str, CustomerProfile] = {}
+        self._phone = _PrefixField()
+        self._code = _PrefixField()
+        self._name = _PrefixField()
+        
+        # Bulk build: collect then sort each field once
+        entries: dict[_PrefixField, list[tuple[str, str]]] = {}
+        for profile in profiles:
+            self._profiles[profile.id] = profile
+            for field, key in self._keys(profile):
+                entries.setdefault(field, []).append((key, profile.id))
+        for field in (self._phone, self._code, self._name):
+            field.extend(entries.get(field, ()))
+    
+    def __len__(self) -> int:
+        return len(self._profiles)
+    
+    def _keys(self, profile: CustomerProfile) -> list[tuple[_PrefixField, str]]:
+        keys: list[tuple[_PrefixField, str]] = []
+        phone = normalize_phone(profile.phone)
+        if phone:
+            keys.append((self._phone, phone[1:]))
+        keys.append((self._code, profile.member_code.upper()))
+        keys.extend((self._name, token) for token in set(_name_tokens(profile.name)))
+        return keys
+    
+    def upsert(self, profile: CustomerProfile) -> None:
+        self.remove(profile.id)
+        self._profiles[profile.id] = profile
+        for field, key in self._keys(profile):
+            field.add(key, profile.id)
+    
+    def remove(self, customer_id: str) -> None:
+        profile = self._profiles.pop(customer_id, None)
+        if profile is not None:
+            for field, key in self._keys(profile):
+                field.remove(key, customer_id)
+    
+    def get(self, customer_id: str) -> Optional[CustomerProfile]:
+        return self._profiles.get(customer_id)
+    
+    def search(self, query: str, limit: int = 10) -> list[CustomerProfile]:
+        """Prefix search; digits match phone, otherwise member code and name"""
+        query = query.strip()
+        if not query:
+            return []
+        
+        ids: list[str] = []
+        if _PHONE_QUERY.match(query):
+            prefix = phone_prefix(query)
+            if prefix:
+                ids.extend(self._phone.search(prefix, limit))
+        else:
+            ids.extend(self._code.search(query.upper(), limit))
+            tokens = _name_tokens(query)
+            if tokens:
+                # Every query token must prefix-match one of the name tokens
+                candidates = self._name.search(tokens[-1], limit * 4)
+                for customer_id in candidates:
+                    name_tokens = _name_tokens(self._profiles[customer_id].name)
+                    if all(any(t.startswith(q) for t in name_tokens) for q in tokens):
+                        ids.append(customer_id)
+        
+        seen: set[str] = set()
+        results: list[CustomerProfile] = []
+        for customer_id in ids:
+            if customer_id not in seen:
+                seen.add(customer_id)
+                results.append(self._profiles[customer_id])
+            if len(results) >= limit:
+                break
+        return results
@@ -0,0 +1,98 @@
+"""
+Demand Forecast - Weekly-Seasonal Model per SKU (NumPy)
+
+All SKUs of a tenant are fitted at once on an (n_sku, n_days) matrix of
+daily units sold, oldest day first. No external API, no per-SKU loop.
+
+Model:
+1. Weekday index: each SKU's mean per weekday relative to its overall
+   mean, shrunk toward 1 so a single busy Saturday does not dominate
+2. Level: exponentially weighted mean of the de-seasonalized series
+3. Forecast: level x weekday index for each future day
+4. Safety stock: residual spread scaled to the lead time
+
+Reorder point = lead-time demand + safety stock. At or below it, suggest
+enough to cover the lead time plus cover_days, plus safety stock.
+"""
+import numpy as np
+
+
+class DemandModel:
+    """Fitted level / weekday index / residual spread for a batch of SKUs"""
+    
+    def __init__(self, level: np.ndarray, weekday_index: np.ndarray, sigma: np.ndarray, next_weekday: int):
+        self.level = level  # (n,) de-seasonalized units per day
+        self.weekday_index = weekday_index  # (n, 7), Monday = 0
+        self.sigma = sigma  # (n,) std of daily residuals
+        self.next_weekday = next_weekday  # weekday of the first forecast day
+    
+    @classmethod
+    def fit(
+        cls,
+        sales: np.ndarray,
+        first_weekday: int,
+        alpha: float = 0.1,
+        shrink: float = 2.0,
+    ) -> "DemandModel":
+        """
+        sales: (n_sku, n_days) units per day, oldest first
+        first_weekday: weekday of sales[:, 0] (Monday = 0)
+        alpha: smoothing weight of the most recent day
+        shrink: pseudo-observations pulling each weekday toward the mean
+        """
+        sales = np.asarray(sales, dtype=np.float64)
+        n_days = sales.shape[1]
+        weekdays = (first_weekday + np.arange(n_days)) % 7
+        
+        # Weekday means, shrunk toward the SKU's overall mean
+        onehot = (weekdays[:, None] == np.arange(7)).astype(np.float64)  # (d, 7)
+        mean = sales.mean(axis=1, keepdims=True)  # (n, 1)
+        weekday_mean = (sales @ onehot + shrink * mean) / (onehot.sum(axis=0) + shrink)
+        
+        index = np.ones_like(weekday_mean)
+        selling = mean[:, 0] > 0
+        index[selling] = weekday_mean[selling] / mean[selling]
+        index /= index.mean(axis=1, keepdims=True)
+        
+        # Exponentially weighted level of the de-seasonalized series
+        season = index[:, weekdays]  # (n, d)
+        weights = (1 - alpha) ** np.arange(n_days - 1, -1, -1)
+        level = (sales / season) @ (weights / weights.sum())
+        
+        sigma = (sales - level[:, None] * season).std(axis=1)
+        return cls(level, index, sigma, (first_weekday + n_days) % 7)
+    
+    def forecast(self, horizon: int) -> np.ndarray:
+        """(n_sku, horizon) expected units per future day"""
+        weekdays = (self.next_weekday + np.arange(horizon)) % 7
+        return self.level[:, None] * self.weekday_index[:, weekdays]
+    
+    def reorder(
+        self,
+        stock: np.ndarray,
+        lead_time_days: int,
+        cover_days: int,
+        service_z: float = 1.65,
+    ) -> dict[str, np.ndarray]:
+        """Reorder point and suggested order quantity per SKU"""
+        stock = np.asarray(stock, dtype=np.float64)
+        daily = self.forecast(lead_time_days + cover_days)
+        
+        avg_daily = daily.mean(axis=1)
+        lead_time_demand = daily[:, :lead_time_days].sum(axis=1)
+        safety_stock = service_z * self.sigma * np.sqrt(lead_time_days)
+        reorder_point = lead_time_demand + safety_stock
+        target = daily.sum(axis=1) + safety_stock
+        
+        suggested = np.where(stock <= reorder_point, np.ceil(np.maximum(target - stock, 0)), 0)
+        with np.errstate(divide="ignore"):
+            days_of_cover = np.where(avg_daily > 0, np.maximum(stock, 0) / avg_daily, np.inf)
+        
+        return {
+            "avg_daily_demand": avg_daily,
+            "lead_time_demand": lead_time_demand,
+            "safety_stock": safety_stock,
+            "reorder_point": reorder_point,
+            "days_of_cover": days_of_cover,
+            "suggested_quantity": suggested.astype(np.int64),
+        }
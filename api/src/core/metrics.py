@@ -0,0 +1,88 @@
+"""
+Metrics - Minimal Prometheus-Style Registry
+
+Counters and gauges with optional labels, rendered in the Prometheus
+text exposition format by GET /metrics. Gauges may be backed by a
+callback so values are read at scrape time.
+"""
+from collections import defaultdict
+from typing import Callable, Optional
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.type = "counter"
+        self._values: dict[LabelKey, float] = defaultdict(float)
+    
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self._values[_label_key(labels)] += amount
+    
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0)
+    
+    def samples(self) -> list[tuple[LabelKey, float]]:
+        return list(self._values.items())
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, callback: Optional[Callable[[], dict[LabelKey, float] | float]] = None):
+        self.name = name
+        self.help = help
+        self.type = "gauge"
+        self._callback = callback
+        self._values: dict[LabelKey, float] = {}
+    
+    def set(self, value: float, **labels: str) -> None:
+        self._values[_label_key(labels)] = value
+    
+    def value(self, **labels: str) -> float:
+        return dict(self.samples()).get(_label_key(labels), 0)
+    
+    def samples(self) -> list[tuple[LabelKey, float]]:
+        if self._callback is None:
+            return list(self._values.items())
+        result = self._callback()
+        if isinstance(result, dict):
+            return list(result.items())
+        return [((), result)]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Gauge] = {}
+    
+    def counter(self, name: str, help: str) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help)
+        return self._metrics[name]
+    
+    def gauge(self, name: str, help: str, callback=None) -> Gauge:
+        if name not in self._metrics:
+            self._metrics[name] = Gauge(name, help, callback)
+        return self._metrics[name]
+    
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for key, value in metric.samples():
+                lines.append(f"{metric.name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,107 @@
+"""
+Outbox Sinks - Destinations for the Change-Event Stream
+
+Each sink is one downstream consumer with its own cursor in
+outbox_consumers (keyed by `name`). The relay (src/jobs/outbox.py) hands
+every sink ordered batches; a batch is only acknowledged once publish()
+returns, so delivery is at-least-once and consumers dedupe on event id.
+
+- ListenerSink: in-process async callbacks (add_event_listener)
+- NdjsonSink: one append-only file per day, one event per line
+- RedisStreamSink: XADD to a Redis stream (optional `redis` package)
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+EventListener = Callable[[dict], Awaitable[None]]
+
+_listeners: list[EventListener] = []
+
+
+def add_event_listener(listener: EventListener) -> None:
+    _listeners.append(listener)
+
+
+def _event_json(event: dict) -> str:
+    return json.dumps(event, default=str, separators=(",", ":"))
+
+
+class ListenerSink:
+    """In-process subscribers; run in whichever worker holds the relay lease"""
+    
+    name = "listeners"
+    
+    async def publish(self, events: list[dict]) -> None:
+        for event in events:
+            for listener in _listeners:
+                try:
+                    await listener(event)
+                except Exception:
+                    logger.exception("Event listener failed for event %s", event["id"])
+    
+    async def close(self) -> None:
+        pass
+
+
+class NdjsonSink:
+    """Appends events to <directory>/events-YYYY-MM-DD.ndjson (UTC day of the event)"""
+    
+    name = "ndjson"
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def _write(self, events: list[dict]) -> None:
+        by_day: dict[str, list[str]] = {}
+        for event in events:
+            by_day.setdefault(str(event["created_at"])[:10], []).append(_event_json(event))
+        
+        for day, lines in by_day.items():
+            with open(os.path.join(self.directory, f"events-{day}.ndjson"), "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+    
+    async def publish(self, events: list[dict]) -> None:
+        await asyncio.to_thread(self._write, events)
+    
+    async def close(self) -> None:
+        pass
+
+
+class RedisStreamSink:
+    """XADD per event, trimmed to roughly `maxlen` entries"""
+    
+    name = "redis"
+    
+    def __init__(self, url: str, stream: str, maxlen: int):
+        from redis import asyncio as aioredis  # Optional dependency
+        
+        self._redis = aioredis.from_url(url)
+        self.stream = stream
+        self.maxlen = maxlen
+    
+    async def publish(self, events: list[dict]) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(
+                self.stream,
+                {
+                    "id": event["id"],
+                    "type": event["event_type"],
+                    "tenant_id": event["tenant_id"],
+                    "data": _event_json(event),
+                },
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+        await pipe.execute()
+    
+    async def close(self) -> None:
+        await self._redis.aclose()
@@ -0,0 +1,237 @@
+"""
+Request Profiling - Spans, Slow-Request Sampler & Call Profiles
+
+Opt-in (profiling_enabled). While a request runs, span() records named,
+timed sections at the places a checkout spends its time:
+- db.<pool> <METHOD> <table or rpc>: PostgREST round trips (src/db.py)
+- calc.<step>: CalculationEngine steps
+- encode.json: response serialization (FastJSONResponse)
+Outside a profiled request span() costs one ContextVar lookup.
+
+A request is kept when it took at least profiling_slow_threshold seconds
+or was sampled (profiling_sample_rate). Sampled requests also get a call
+profile: pyinstrument (optional dependency, async aware) when installed,
+otherwise cProfile, which also sees coroutines of other requests
+interleaved on the loop. One call profile runs at a time per worker.
+
+Kept profiles go into a per-worker ring buffer (profiling_buffer_size),
+listed and downloaded through GET /health/profiles.
+"""
+import cProfile
+import io
+import pstats
+import random
+import time
+import uuid
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from src.cfg import get_settings
+from src.core.metrics import registry
+
+_kept = registry.counter("kasirai_profiles_kept_total", "Request profiles kept by reason")
+
+# Never profiled: health, metrics and the profile download itself
+SKIP_PATHS = ("/health", "/metrics")
+
+_NOOP = nullcontext()
+
+
+class Profile:
+    """Timings of one request"""
+    
+    __slots__ = (
+        "id", "method", "path", "route", "started_at", "status", "duration_ms",
+        "reason", "spans", "call_profile", "_t0", "_depth",
+    )
+    
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.started_at = datetime.now(timezone.utc)
+        self.status: Optional[int] = None
+        self.duration_ms = 0.0
+        self.reason: Optional[str] = None
+        self.spans: list[tuple[str, float, float, int]] = []  # name, start ms, duration ms, depth
+        self.call_profile: Optional[str] = None
+        self._t0 = time.perf_counter()
+        self._depth = 0
+    
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "reason": self.reason,
+            "has_call_profile": self.call_profile is not None,
+        }
+    
+    def to_dict(self) -> dict:
+        totals: dict[str, float] = {}
+        for name, _, duration, depth in self.spans:
+            if depth == 0:
+                group = name.split(" ", 1)[0].split(".", 1)[0]
+                totals[group] = round(totals.get(group, 0.0) + duration, 2)
+        return {
+            **self.summary(),
+            "totals_ms": totals,  # top-level spans by kind (db, calc, encode)
+            "spans": [
+                {"name": name, "start_ms": start, "duration_ms": duration, "depth": depth}
+                for name, start, duration, depth in self.spans
+            ],
+            "call_profile": self.call_profile,
+        }
+
+
+_current: ContextVar[Optional[Profile]] = ContextVar("profiling_current", default=None)
+
+
+class _Span:
+    __slots__ = ("profile", "name", "start", "depth")
+    
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+    
+    def __enter__(self) -> None:
+        self.depth = self.profile._depth
+        self.profile._depth += 1
+        self.start = time.perf_counter()
+    
+    def __exit__(self, *exc) -> bool:
+        end = time.perf_counter()
+        profile = self.profile
+        profile._depth -= 1
+        profile.spans.append((
+            self.name,
+            round((self.start - profile._t0) * 1000, 2),
+            round((end - self.start) * 1000, 2),
+            self.depth,
+        ))
+        return False
+
+
+def span(name: str):
+    """Time a section of the current request (no-op when it is not profiled)"""
+    profile = _current.get()
+    if profile is None:
+        return _NOOP
+    return _Span(profile, name)
+
+
+class CallProfiler:
+    """pyinstrument when installed, cProfile otherwise"""
+    
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler  # Optional dependency
+        except ImportError:
+            self._pyinstrument = None
+            self._cprofile = cProfile.Profile()
+        else:
+            self._pyinstrument = Profiler(async_mode="enabled")
+            self._cprofile = None
+    
+    def start(self) -> None:
+        if self._pyinstrument is not None:
+            self._pyinstrument.start()
+        else:
+            self._cprofile.enable()
+    
+    def stop(self) -> str:
+        if self._pyinstrument is not None:
+            self._pyinstrument.stop()
+            return self._pyinstrument.output_text(unicode=False, color=False)
+        
+        self._cprofile.disable()
+        out = io.StringIO()
+        pstats.Stats(self._cprofile, stream=out).sort_stats("cumulative").print_stats(40)
+        return out.getvalue()
+
+
+class ProfileBuffer:
+    """Most recent kept profiles of this worker"""
+    
+    def __init__(self, size: int = 200):
+        self._profiles: deque[Profile] = deque(maxlen=size)
+    
+    def __len__(self) -> int:
+        return len(self._profiles)
+    
+    def add(self, profile: Profile) -> None:
+        self._profiles.append(profile)
+    
+    def summaries(self) -> list[dict]:
+        return [profile.summary() for profile in reversed(self._profiles)]
+    
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+
+_buffer: Optional[ProfileBuffer] = None
+
+
+def get_profile_buffer() -> ProfileBuffer:
+    global _buffer
+    if _buffer is None:
+        _buffer = ProfileBuffer(get_settings().profiling_buffer_size)
+    return _buffer
+
+
+class ProfilingMiddleware:
+    """ASGI middleware collecting spans per request and keeping slow or sampled ones"""
+    
+    def __init__(self, app, slow_threshold: Optional[float] = None, sample_rate: Optional[float] = None):
+        settings = get_settings()
+        self.app = app
+        self.slow_threshold = settings.profiling_slow_threshold if slow_threshold is None else slow_threshold
+        self.sample_rate = settings.profiling_sample_rate if sample_rate is None else sample_rate
+        self.buffer = get_profile_buffer()
+        self._call_profiling = False
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PATHS):
+            await self.app(scope, receive, send)
+            return
+        
+        profile = Profile(scope["method"], scope["path"])
+        token = _current.set(profile)
+        
+        profiler = None
+        if not self._call_profiling and self.sample_rate and random.random() < self.sample_rate:
+            self._call_profiling = True
+            profiler = CallProfiler()
+            profiler.start()
+        
+        async def send_status(message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                profile.call_profile = profiler.stop()
+                self._call_profiling = False
+            
+            profile.duration_ms = round((time.perf_counter() - profile._t0) * 1000, 2)
+            route = scope.get("route")
+            profile.route = getattr(route, "path", None)
+            if profiler is not None:
+                profile.reason = "sampled"
+            elif profile.duration_ms >= self.slow_threshold * 1000:
+                profile.reason = "slow"
+            
+            if profile.reason:
+                _kept.inc(reason=profile.reason)
+                self.buffer.add(profile)
@@ -0,0 +1,206 @@
+"""
+PromotionIndex - Automatic Item-Level Promotions
+
+Promotions are compiled once per tenant into an index keyed by product_id
+and category. Evaluating a cart only looks at rules that can match one of
+its lines, so cost scales with matching rules instead of rules × items.
+
+Evaluation order:
+1. Candidate rules sorted by priority (highest first)
+2. Each rule consumes the units it discounts
+3. A unit is discounted by at most one promotion
+
+All monetary calculations use Decimal for precision.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, Optional
+from src.dto.schemas import (
+    AppliedPromotion,
+    CartItem,
+    DiscountType,
+    PromotionResponse,
+    PromotionType,
+)
+
+
+def _round(amount: Decimal) -> Decimal:
+    return amount.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+
+
+def _unit_discount(price: Decimal, discount_type: DiscountType, value: Decimal) -> Decimal:
+    """Discount for a single unit, never more than its price"""
+    if discount_type == DiscountType.PERCENTAGE:
+        amount = price * value / Decimal("100")
+    else:  # FIXED per unit
+        amount = value
+    return min(amount, price)
+
+
+class PromotionIndex:
+    """
+    Precompiled promotion rules for one tenant.
+    Build once from active promotions, reuse for every cart evaluation.
+    """
+    
+    def __init__(self, promotions: Iterable[PromotionResponse]):
+        self._by_product: dict[str, list[PromotionResponse]] = defaultdict(list)
+        self._by_category: dict[str, list[PromotionResponse]] = defaultdict(list)
+        self._order: dict[str, int] = {}
+        
+        ordered = sorted(promotions, key=lambda p: -p.priority)
+        for position, promo in enumerate(ordered):
+            self._order[promo.id] = position
+            for product_id in promo.product_ids:
+                self._by_product[product_id].append(promo)
+            for category in promo.categories:
+                self._by_category[category].append(promo)
+    
+    def __len__(self) -> int:
+        return len(self._order)
+    
+    def candidates(self, items: list[CartItem]) -> list[PromotionResponse]:
+        """Rules that can match at least one cart line, in priority order"""
+        found: dict[str, PromotionResponse] = {}
+        for item in items:
+            for promo in self._by_product.get(item.product_id, ()):
+                found[promo.id] = promo
+            if item.category:
+                for promo in self._by_category.get(item.category, ()):
+                    found[promo.id] = promo
+        return sorted(found.values(), key=lambda p: self._order[p.id])
+    
+    def evaluate(
+        self,
+        items: list[CartItem],
+        now: Optional[datetime] = None,
+    ) -> list[AppliedPromotion]:
+        """Apply matching promotions to the cart, returns non-zero discounts"""
+        if not self._order or not items:
+            return []
+        
+        now = now or datetime.now(timezone.utc)
+        remaining = {item.product_id: item.quantity for item in items}
+        applied: list[AppliedPromotion] = []
+        
+        for promo in self.candidates(items):
+            if not self._is_valid(promo, now):
+                continue
+            
+            lines = [
+                item for item in items
+                if remaining[item.product_id] > 0 and self._matches(promo, item)
+            ]
+            if not lines:
+                continue
+            
+            if promo.type == PromotionType.ITEM:
+                amount = self._apply_item(promo, lines, remaining)
+            elif promo.type == PromotionType.BUY_X_GET_Y:
+                amount = self._apply_buy_x_get_y(promo, lines, remaining)
+            elif promo.type == PromotionType.BUNDLE:
+                amount = self._apply_bundle(promo, lines, remaining)
+            else:  # TIERED
+                amount = self._apply_tiered(promo, lines, remaining)
+            
+            amount = _round(amount)
+            if amount > 0:
+                applied.append(AppliedPromotion(
+                    promotion_id=promo.id,
+                    name=promo.name,
+                    amount=amount,
+                ))
+        
+        return applied
+    
+    @staticmethod
+    def _is_valid(promo: PromotionResponse, now: datetime) -> bool:
+        if promo.valid_from and promo.valid_from > now:
+            return False
+        if promo.valid_until and promo.valid_until < now:
+            return False
+        return True
+    
+    @staticmethod
+    def _matches(promo: PromotionResponse, item: CartItem) -> bool:
+        return item.product_id in promo.product_ids or (
+            item.category is not None and item.category in promo.categories
+        )
+    
+    @staticmethod
+    def _apply_item(promo, lines, remaining) -> Decimal:
+        if promo.discount_type is None or promo.value is None:
+            return Decimal("0")
+        
+        total = Decimal("0")
+        for item in lines:
+            qty = remaining[item.product_id]
+            total += _unit_discount(item.unit_price, promo.discount_type, promo.value) * qty
+            remaining[item.product_id] = 0
+        return total
+    
+    @staticmethod
+    def _apply_buy_x_get_y(promo, lines, remaining) -> Decimal:
+        buy = promo.buy_quantity or 1
+        get = promo.get_quantity or 1
+        group = buy + get
+        
+        # Most expensive units pay, cheapest units in each group are discounted
+        units: list[tuple[Decimal, str]] = []
+        for item in sorted(lines, key=lambda i: i.unit_price, reverse=True):
+            units.extend([(item.unit_price, item.product_id)] * remaining[item.product_id])
+        
+        groups = len(units) // group
+        if groups == 0:
+            return Decimal("0")
+        
+        discount_type = promo.discount_type or DiscountType.PERCENTAGE
+        value = promo.value if promo.value is not None else Decimal("100")
+        
+        total = Decimal("0")
+        for g in range(groups):
+            chunk = units[g * group:(g + 1) * group]
+            for price, _ in chunk[buy:]:
+                total += _unit_discount(price, discount_type, value)
+            for _, product_id in chunk:
+                remaining[product_id] -= 1
+        return total
+    
+    @staticmethod
+    def _apply_bundle(promo, lines, remaining) -> Decimal:
+        if promo.bundle_price is None or not promo.product_ids:
+            return Decimal("0")
+        
+        by_product = {item.product_id: item for item in lines}
+        if any(pid not in by_product for pid in promo.product_ids):
+            return Decimal("0")
+        
+        bundles = min(remaining[pid] for pid in promo.product_ids)
+        regular_price = sum(by_product[pid].unit_price for pid in promo.product_ids)
+        per_bundle = regular_price - promo.bundle_price
+        if bundles == 0 or per_bundle <= 0:
+            return Decimal("0")
+        
+        for pid in promo.product_ids:
+            remaining[pid] -= bundles
+        return per_bundle * bundles
+    
+    @staticmethod
+    def _apply_tiered(promo, lines, remaining) -> Decimal:
+        quantity = sum(remaining[item.product_id] for item in lines)
+        tier = None
+        for candidate in promo.tiers:
+            if candidate.min_quantity <= quantity and (
+                tier is None or candidate.min_quantity > tier.min_quantity
+            ):
+                tier = candidate
+        if tier is None:
+            return Decimal("0")
+        
+        total = Decimal("0")
+        for item in lines:
+            qty = remaining[item.product_id]
+            total += _unit_discount(item.unit_price, tier.discount_type, tier.value) * qty
+            remaining[item.product_id] = 0
+        return total
@@ -0,0 +1,121 @@
+"""
+Pub/Sub Broker - Real-Time Fan-Out
+
+LocalBroker fans out inside one worker process.
+RedisBroker fans out across workers/nodes (requires redis_url and the
+optional `redis` package).
+
+Messages are JSON-serializable dicts. Slow subscribers drop messages
+rather than block publishers: every cart event carries the full state,
+so the next one supersedes anything missed.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from src.cfg import get_settings
+
+
+class Subscription:
+    """Receives messages for a set of channels"""
+    
+    def __init__(self, queue: asyncio.Queue):
+        self._queue = queue
+    
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next message, or None on timeout"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """In-process broker (single worker)"""
+    
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+    
+    async def publish(self, channel: str, message: dict) -> None:
+        for queue in list(self._subscribers.get(channel, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                pass
+    
+    @asynccontextmanager
+    async def subscribe(self, *channels: str) -> AsyncIterator[Subscription]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        for channel in channels:
+            self._subscribers[channel].add(queue)
+        try:
+            yield Subscription(queue)
+        finally:
+            for channel in channels:
+                self._subscribers[channel].discard(queue)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+    
+    async def close(self) -> None:
+        self._subscribers.clear()
+
+
+class _RedisSubscription(Subscription):
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+    
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message["data"])
+
+
+class RedisBroker:
+    """Cross-worker broker over Redis PUBLISH/SUBSCRIBE"""
+    
+    def __init__(self, url: str):
+        from redis import asyncio as aioredis  # Optional dependency
+        
+        self._redis = aioredis.from_url(url)
+    
+    async def publish(self, channel: str, message: dict) -> None:
+        await self._redis.publish(channel, json.dumps(message, default=str))
+    
+    @asynccontextmanager
+    async def subscribe(self, *channels: str) -> AsyncIterator[Subscription]:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(*channels)
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            await pubsub.unsubscribe(*channels)
+            await pubsub.aclose()
+    
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+_broker: Optional[LocalBroker | RedisBroker] = None
+
+
+def get_broker() -> LocalBroker | RedisBroker:
+    global _broker
+    if _broker is None:
+        settings = get_settings()
+        _broker = RedisBroker(settings.redis_url) if settings.redis_url else LocalBroker()
+    return _broker
+
+
+def cart_channel(cart_id: str) -> str:
+    return f"cart:{cart_id}"
+
+
+def terminal_channel(tenant_id: str, terminal_id: str) -> str:
+    return f"terminal:{tenant_id}:{terminal_id}"
+
+
+def invoice_channel(invoice_no: str) -> str:
+    return f"invoice:{invoice_no}"
@@ -0,0 +1,41 @@
+"""
+Token Bucket Rate Limiting
+
+A bucket holds up to `capacity` tokens and refills at `rate` tokens per
+second. Each action takes a token; when the bucket is empty the caller
+either waits (acquire) or is refused (try_acquire).
+
+A `reserve` keeps that many tokens back for other callers: low-priority
+work may only take a token while more than `reserve` would remain.
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def try_acquire(self, tokens: float = 1, reserve: float = 0) -> bool:
+        self._refill()
+        if self._tokens - tokens >= reserve:
+            self._tokens -= tokens
+            return True
+        return False
+    
+    def delay(self, tokens: float = 1, reserve: float = 0) -> float:
+        """Seconds until `tokens` are available (on top of `reserve`)"""
+        self._refill()
+        return max(0.0, (tokens + reserve - self._tokens) / self.rate)
+    
+    async def acquire(self, tokens: float = 1) -> None:
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
@@ -0,0 +1,316 @@
+"""
+Receipt Rendering - Plain Text, ESC/POS & PDF
+
+A tenant's receipt layout is compiled once into a ReceiptTemplate:
+centered header/footer lines, rule, column width, printer init bytes and
+PDF page width. A Receipt is a slotted snapshot of one sale (whole
+rupiah), built either from the finalized cart or from a transactions row.
+Voided, refunded and failed sales print with a BATAL / RETUR / GAGAL mark.
+
+Rendering lays a receipt out as fixed-width lines (text, bold) and then
+encodes them:
+- text: UTF-8, one receipt per block
+- escpos: raw printer bytes (ESC @, bold on/off, feed and partial cut)
+- pdf: one page per receipt, built-in Courier fonts, no dependencies
+"""
+import textwrap
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from src.core.cart import to_rupiah
+from src.dto.schemas import PaymentStatus, PaymentType, ReceiptFormat
+
+# (text, bold)
+Line = tuple[str, bool]
+
+_WIB = timezone(timedelta(hours=7), "WIB")
+
+_ESC_INIT = b"\x1b@"
+_ESC_BOLD_ON = b"\x1bE\x01"
+_ESC_BOLD_OFF = b"\x1bE\x00"
+_ESC_CUT = b"\x1bd\x04\x1dV\x01"  # feed 4 lines, partial cut
+
+_PDF_FONT_SIZE = 8
+_PDF_LEADING = 10
+_PDF_CHAR_WIDTH = 4.8  # Courier advance width at 8pt
+_PDF_MARGIN = 8
+
+_PAYMENT_LABELS = {
+    PaymentType.CASH: "TUNAI",
+    PaymentType.QRIS: "QRIS",
+    PaymentType.CARD: "KARTU",
+    PaymentType.EWALLET: "E-WALLET",
+}
+
+# Sales that no longer stand as printed
+_STATUS_MARKS = {
+    PaymentStatus.VOIDED: "BATAL",
+    PaymentStatus.REFUNDED: "RETUR",
+    PaymentStatus.PARTIALLY_REFUNDED: "RETUR SEBAGIAN",
+    PaymentStatus.FAILED: "GAGAL",
+}
+
+
+def format_rupiah(amount: int) -> str:
+    """12500 -> '12.500'"""
+    return f"{amount:,}".replace(",", ".")
+
+
+class ReceiptLine:
+    """One printed item line; amounts in whole rupiah"""
+    
+    __slots__ = ("name", "quantity", "unit_price", "subtotal")
+    
+    def __init__(self, name: str, quantity: int, unit_price: int, subtotal: int):
+        self.name = name
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.subtotal = subtotal
+
+
+class Receipt:
+    """Printable snapshot of one sale; amounts in whole rupiah"""
+    
+    __slots__ = (
+        "tenant_id", "invoice_no", "created_at", "items", "gross_sales", "discount_amount",
+        "points_value", "dpp", "tax_rate", "tax_amount", "net_sales", "payment_type",
+        "points_earned", "amount_received", "terminal_id", "payment_status",
+    )
+    
+    def __init__(
+        self,
+        tenant_id: str,
+        invoice_no: str,
+        created_at: datetime,
+        items: list[ReceiptLine],
+        gross_sales: int,
+        discount_amount: int,
+        points_value: int,
+        dpp: int,
+        tax_rate: Decimal,
+        tax_amount: int,
+        net_sales: int,
+        payment_type: PaymentType,
+        points_earned: int = 0,
+        amount_received: Optional[int] = None,
+        terminal_id: Optional[str] = None,
+        payment_status: Optional[PaymentStatus] = None,
+    ):
+        self.tenant_id = tenant_id
+        self.invoice_no = invoice_no
+        self.created_at = created_at
+        self.items = items
+        self.gross_sales = gross_sales
+        self.discount_amount = discount_amount
+        self.points_value = points_value
+        self.dpp = dpp
+        self.tax_rate = tax_rate
+        self.tax_amount = tax_amount
+        self.net_sales = net_sales
+        self.payment_type = payment_type
+        self.points_earned = points_earned
+        self.amount_received = amount_received
+        self.terminal_id = terminal_id
+        self.payment_status = payment_status
+    
+    @property
+    def change_amount(self) -> int:
+        if self.amount_received is None:
+            return 0
+        return self.amount_received - self.net_sales
+    
+    @classmethod
+    def from_sale(cls, sale: dict) -> "Receipt":
+        """transactions row with embedded transaction_items"""
+        return cls(
+            tenant_id=sale["tenant_id"],
+            invoice_no=sale["invoice_no"],
+            created_at=datetime.fromisoformat(sale["created_at"]),
+            items=[
+                ReceiptLine(
+                    item["product_name"],
+                    item["quantity"],
+                    to_rupiah(item["unit_price"]),
+                    to_rupiah(item["subtotal"]),
+                )
+                for item in sorted(sale["transaction_items"], key=lambda item: item["id"])
+            ],
+            gross_sales=to_rupiah(sale["gross_sales"]),
+            discount_amount=to_rupiah(sale["discount_amount"] or 0),
+            points_value=to_rupiah(sale["points_value"] or 0),
+            dpp=to_rupiah(sale["dpp"]),
+            tax_rate=Decimal(str(sale["tax_rate"])),
+            tax_amount=to_rupiah(sale["tax_amount"]),
+            net_sales=to_rupiah(sale["net_sales"]),
+            payment_type=PaymentType(sale["payment_type"]),
+            points_earned=sale["points_earned"] or 0,
+            amount_received=to_rupiah(sale["amount_received"]) if sale.get("amount_received") is not None else None,
+            terminal_id=sale.get("terminal_id"),
+            payment_status=PaymentStatus(sale["payment_status"]),
+        )
+
+
+class ReceiptTemplate:
+    """Tenant receipt layout, compiled once and shared by every render"""
+    
+    __slots__ = ("width", "tz", "rule", "head", "foot", "escpos_head", "pdf_width")
+    
+    def __init__(
+        self,
+        name: str,
+        npwp: Optional[str] = None,
+        header: Optional[str] = None,
+        footer: Optional[str] = None,
+        width: int = 32,
+        tz: str = "Asia/Jakarta",
+    ):
+        self.width = width
+        try:
+            self.tz = ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            self.tz = _WIB
+        self.rule = "-" * width
+        
+        self.head: list[Line] = [(line, True) for line in self._center(name)]
+        self.head += [(line, False) for line in self._center(header)]
+        if npwp:
+            self.head += [(line, False) for line in self._center(f"NPWP: {npwp}")]
+        self.foot: list[Line] = [(line, False) for line in self._center(footer or "Terima kasih")]
+        
+        self.escpos_head = _ESC_INIT + _encode_escpos(self.head)
+        self.pdf_width = width * _PDF_CHAR_WIDTH + 2 * _PDF_MARGIN
+    
+    @classmethod
+    def from_tenant(cls, tenant: dict) -> "ReceiptTemplate":
+        return cls(
+            name=tenant["name"],
+            npwp=tenant.get("npwp"),
+            header=tenant.get("receipt_header"),
+            footer=tenant.get("receipt_footer"),
+            width=tenant.get("receipt_width") or 32,
+            tz=tenant.get("timezone") or "Asia/Jakarta",
+        )
+    
+    def _center(self, text: Optional[str]) -> list[str]:
+        if not text:
+            return []
+        return [
+            line.center(self.width).rstrip()
+            for paragraph in text.splitlines()
+            for line in textwrap.wrap(paragraph, self.width) or [""]
+        ]
+    
+    def pair(self, left: str, right: str) -> str:
+        """Left label, right-aligned amount, truncating the label if needed"""
+        room = self.width - len(right) - 1
+        return f"{left[:room]:<{room}} {right}"
+    
+    def body(self, receipt: Receipt, copy: bool = False) -> list[Line]:
+        """Receipt lines between the compiled header and footer"""
+        lines: list[Line] = []
+        if copy:
+            lines.append(("SALINAN".center(self.width).rstrip(), True))
+        mark = _STATUS_MARKS.get(receipt.payment_status)
+        if mark:
+            lines.append((f"*** {mark} ***".center(self.width).rstrip(), True))
+        lines.append((self.rule, False))
+        lines.append((f"No  : {receipt.invoice_no}", False))
+        lines.append((f"Tgl : {receipt.created_at.astimezone(self.tz):%d/%m/%Y %H:%M}", False))
+        if receipt.terminal_id:
+            lines.append((f"Kasa: {receipt.terminal_id}", False))
+        lines.append((self.rule, False))
+        
+        for item in receipt.items:
+            lines.extend((name, False) for name in textwrap.wrap(item.name, self.width) or [""])
+            lines.append((self.pair(
+                f"  {item.quantity} x {format_rupiah(item.unit_price)}", format_rupiah(item.subtotal)
+            ), False))
+        lines.append((self.rule, False))
+        
+        lines.append((self.pair("Subtotal", format_rupiah(receipt.gross_sales)), False))
+        if receipt.discount_amount:
+            lines.append((self.pair("Diskon", format_rupiah(-receipt.discount_amount)), False))
+        if receipt.points_value:
+            lines.append((self.pair("Tukar poin", format_rupiah(-receipt.points_value)), False))
+        if receipt.tax_amount:
+            lines.append((self.pair("DPP", format_rupiah(receipt.dpp)), False))
+            lines.append((self.pair(f"PPN {receipt.tax_rate.normalize():f}%", format_rupiah(receipt.tax_amount)), False))
+        lines.append((self.pair("TOTAL", f"Rp {format_rupiah(receipt.net_sales)}"), True))
+        
+        label = _PAYMENT_LABELS.get(receipt.payment_type, receipt.payment_type.value)
+        lines.append((self.pair(label, format_rupiah(
+            receipt.amount_received if receipt.amount_received is not None else receipt.net_sales
+        )), False))
+        if receipt.change_amount:
+            lines.append((self.pair("Kembali", format_rupiah(receipt.change_amount)), False))
+        if receipt.points_earned:
+            lines.append((self.pair("Poin didapat", str(receipt.points_earned)), False))
+        lines.append((self.rule, False))
+        return lines
+
+
+def _encode_escpos(lines: Iterable[Line]) -> bytes:
+    out = bytearray()
+    for text, bold in lines:
+        encoded = text.encode("cp437", errors="replace") + b"\n"
+        out += _ESC_BOLD_ON + encoded + _ESC_BOLD_OFF if bold else encoded
+    return bytes(out)
+
+
+def _pdf_escape(text: str) -> bytes:
+    encoded = text.encode("latin-1", errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _render_pdf(pages: list[list[Line]], page_width: float) -> bytes:
+    """Minimal PDF 1.4: one page per receipt, Courier / Courier-Bold"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for lines in pages:
+        height = len(lines) * _PDF_LEADING + 2 * _PDF_MARGIN
+        stream = bytearray(
+            b"BT %d TL %d %.1f Td\n" % (_PDF_LEADING, _PDF_MARGIN, height - _PDF_MARGIN - _PDF_FONT_SIZE)
+        )
+        for text, bold in lines:
+            stream += b"/F%d %d Tf (%s) Tj T*\n" % (2 if bold else 1, _PDF_FONT_SIZE, _pdf_escape(text))
+        stream += b"ET"
+        
+        page_id = len(objects) + 1
+        kids.append(b"%d 0 R" % page_id)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.1f %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (page_width, height, page_id + 1)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), bytes(stream)))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render(receipts: list[Receipt], template: ReceiptTemplate, fmt: ReceiptFormat, copy: bool = False) -> bytes:
+    """Render one or more receipts of the same tenant into a single document"""
+    if fmt == ReceiptFormat.ESCPOS:
+        return b"".join(
+            template.escpos_head + _encode_escpos(template.body(receipt, copy)) + _encode_escpos(template.foot) + _ESC_CUT
+            for receipt in receipts
+        )
+    
+    pages = [template.head + template.body(receipt, copy) + template.foot for receipt in receipts]
+    if fmt == ReceiptFormat.PDF:
+        return _render_pdf(pages, template.pdf_width)
+    return "\n\n".join("\n".join(text for text, _ in lines) for lines in pages).encode() + b"\n"
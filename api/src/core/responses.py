@@ -0,0 +1,23 @@
+"""
+FastJSONResponse - JSON Rendering via pydantic-core
+
+pydantic-core serializes models, Decimal, datetime, UUID and enums
+natively (in Rust), so no jsonable_encoder pass is needed.
+
+Installed as the app's default_response_class. Hot routes return
+FastJSONResponse(...) directly, which also skips FastAPI's
+response_model re-validation of models we just built ourselves.
+
+Decimal is rendered as a string, as FastAPI's response_model
+serialization already does for FinancialBreakdown.
+"""
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+from src.core.profiling import span
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with span("encode.json"):
+            return to_json(content)
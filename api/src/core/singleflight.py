@@ -0,0 +1,49 @@
+"""
+SingleFlight - Coalesce Concurrent Identical Reads
+
+When many terminals ask for the same thing at once (store opening), only
+the first caller for a key runs the query; everyone else awaiting the
+same key gets its result (or exception). Nothing is cached: once the
+call completes the next caller starts a fresh one.
+
+Sync functions (the supabase client) run in a worker thread so callers
+actually overlap; coroutine functions are awaited directly. Results are
+shared between callers and must be treated as read-only.
+"""
+import asyncio
+import inspect
+from typing import Any, Callable, Hashable
+from src.core.metrics import registry
+
+_calls = registry.counter("kasirai_singleflight_calls_total", "Coalesced reads by group and role")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+    
+    def __len__(self) -> int:
+        return len(self._inflight)
+    
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            _calls.inc(group=self.name, role="leader")
+            if inspect.iscoroutinefunction(fn):
+                task = asyncio.ensure_future(fn(*args))
+            else:
+                task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            _calls.inc(group=self.name, role="shared")
+        
+        # One caller disconnecting must not cancel the shared call
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller went away
@@ -1,10 +1,149 @@
 """
 Supabase Client Instance
+
+PostgREST traffic goes through one shared, tuned httpx pool: bounded
+connections kept alive (and multiplexed over HTTP/2), explicit timeouts,
+and retry with jittered backoff for idempotent reads only. Writes and
+RPCs (e.g. finalize_sale) are never retried here.
+
+Reads that tolerate staleness (listings, exports, reports, history) go
+through get_supabase_read(), which targets the read replica when one is
+configured (supabase_read_url). It falls back to the primary when:
+- the current session wrote within read_your_writes_window
+  (read-your-writes; see src/core/consistency.py), or
+- the replica failed recently (replica_cooldown)
+Writes and checkout-critical reads always use get_supabase().
 """
-from supabase import create_client, Client
+import random
+import time
+from contextvars import ContextVar
+import httpx
+from supabase import create_client, Client, ClientOptions
 from src.cfg import get_settings
+from src.core.metrics import registry
+from src.core.profiling import span
 
 _supabase_client: Client | None = None
+_read_client: Client | None = None
+_replica_down_until = 0.0
+
+# Wall-clock time of the current session's last write (set per request)
+_session_last_write: ContextVar[float] = ContextVar("db_session_last_write", default=0.0)
+
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_RETRY_STATUS = frozenset({502, 503, 504})
+
+_requests = registry.counter("kasirai_db_requests_total", "PostgREST requests by pool, method and outcome")
+_retries = registry.counter("kasirai_db_retries_total", "PostgREST read retries by pool")
+_routed = registry.counter("kasirai_db_reads_routed_total", "Replica-eligible reads by target and reason")
+
+# Pool name -> transport, for the connection gauge
+_transports: dict[str, httpx.HTTPTransport] = {}
+
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    Retries idempotent requests on transport errors / 502-504 with full jitter.
+    The client is synchronous, so the backoff is a blocking time.sleep: it stalls
+    the calling thread, which is the event loop for handlers that query directly.
+    Each sleep is capped at max_backoff, so a read blocks at most
+    retries * max_backoff on top of its round trips.
+    """
+    
+    def __init__(
+        self,
+        transport: httpx.HTTPTransport,
+        retries: int,
+        backoff: float,
+        pool: str = "primary",
+        max_backoff: float = 0.5,
+    ):
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool = pool
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        target = request.url.path.removeprefix("/rest/v1/")
+        with span(f"db.{self.pool} {request.method} {target}"):
+            return self._send(request)
+    
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        retries = self.retries if request.method in _IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                _requests.inc(pool=self.pool, method=request.method, outcome="error")
+                if attempt >= retries:
+                    raise
+            else:
+                _requests.inc(pool=self.pool, method=request.method, outcome=f"{response.status_code // 100}xx")
+                if response.status_code not in _RETRY_STATUS or attempt >= retries:
+                    return response
+                response.close()
+            
+            _retries.inc(pool=self.pool)
+            time.sleep(random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff)))
+            attempt += 1
+    
+    def close(self) -> None:
+        self.transport.close()
+
+
+class ReplicaTransport(RetryTransport):
+    """Takes the replica out of rotation for replica_cooldown after it fails"""
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        global _replica_down_until
+        try:
+            response = super().handle_request(request)
+        except httpx.TransportError:
+            _replica_down_until = time.monotonic() + get_settings().replica_cooldown
+            raise
+        if response.status_code in _RETRY_STATUS:
+            _replica_down_until = time.monotonic() + get_settings().replica_cooldown
+        return response
+
+
+def _pool_stats() -> dict:
+    """Open / idle connections in each httpcore pool"""
+    stats = {}
+    for pool, transport in _transports.items():
+        connections = list(getattr(getattr(transport, "_pool", None), "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        stats[(("pool", pool), ("state", "active"))] = float(len(connections) - idle)
+        stats[(("pool", pool), ("state", "idle"))] = float(idle)
+    return stats
+
+
+def create_http_client(pool: str = "primary") -> httpx.Client:
+    settings = get_settings()
+    transport = httpx.HTTPTransport(
+        http2=settings.db_http2,
+        limits=httpx.Limits(
+            max_connections=settings.db_pool_max_connections,
+            max_keepalive_connections=settings.db_pool_max_keepalive,
+            keepalive_expiry=settings.db_keepalive_expiry,
+        ),
+        retries=1,  # Connect failures only (safe for any method)
+    )
+    _transports[pool] = transport
+    registry.gauge("kasirai_db_pool_connections", "PostgREST pool connections by pool and state", _pool_stats)
+    transport_class = ReplicaTransport if pool == "replica" else RetryTransport
+    return httpx.Client(
+        transport=transport_class(
+            transport, settings.db_read_retries, settings.db_retry_backoff, pool, settings.db_retry_max_backoff
+        ),
+        timeout=httpx.Timeout(
+            settings.db_read_timeout,
+            connect=settings.db_connect_timeout,
+            pool=settings.db_connect_timeout,
+        ),
+        follow_redirects=True,
+    )
 
 
 def get_supabase() -> Client:
@@ -13,6 +152,43 @@ def get_supabase() -> Client:
         settings = get_settings()
         _supabase_client = create_client(
             settings.supabase_url,
-            settings.supabase_anon_key
+            settings.supabase_anon_key,
+            options=ClientOptions(httpx_client=create_http_client()),
         )
     return _supabase_client
+
+
+def set_session_last_write(timestamp: float) -> None:
+    """Record when the current request's session last wrote (epoch seconds)"""
+    _session_last_write.set(timestamp)
+
+
+def get_supabase_read() -> Client:
+    """Client for staleness-tolerant reads: the replica when configured and safe"""
+    global _read_client
+    settings = get_settings()
+    if not settings.supabase_read_url:
+        return get_supabase()
+    
+    if time.time() - _session_last_write.get() < settings.read_your_writes_window:
+        _routed.inc(target="primary", reason="read_your_writes")
+        return get_supabase()
+    if time.monotonic() < _replica_down_until:
+        _routed.inc(target="primary", reason="replica_down")
+        return get_supabase()
+    
+    if _read_client is None:
+        _read_client = create_client(
+            settings.supabase_read_url,
+            settings.supabase_read_key or settings.supabase_anon_key,
+            options=ClientOptions(httpx_client=create_http_client("replica")),
+        )
+    _routed.inc(target="replica", reason="ok")
+    return _read_client
+
+
+def warm_up() -> None:
+    """Build the clients and open pooled connections before traffic arrives"""
+    get_supabase().table("tenants").select("id").limit(1).execute()
+    if get_settings().supabase_read_url:
+        get_supabase_read().table("tenants").select("id").limit(1).execute()
@@ -5,48 +5,86 @@ from src.dto.schemas import (
     PaymentType,
     PaymentStatus,
     DiscountType,
+    CreditNoteKind,
     MemberType,
     UserRole,
+    PromotionType,
     CartItem,
     CartRequest,
     AddItemRequest,
     ApplyDiscountRequest,
     ApplyLoyaltyRequest,
+    AppliedPromotion,
     FinancialBreakdown,
     FinalizeTransactionRequest,
     TransactionResponse,
+    ReceiptFormat,
+    RefundItem,
+    RefundRequest,
+    VoidRequest,
+    RefundBreakdown,
+    CreditNoteResponse,
+    ShiftStatus,
+    ShiftOpenRequest,
+    ShiftCloseRequest,
+    ShiftPaymentTotals,
+    ShiftReport,
     ProductBase,
     ProductCreate,
     ProductResponse,
     CustomerBase,
     CustomerCreate,
     CustomerResponse,
+    CustomerProfile,
     DiscountBase,
     DiscountCreate,
     DiscountResponse,
+    PromotionTier,
+    PromotionBase,
+    PromotionCreate,
+    PromotionResponse,
 )
 
 __all__ = [
     "PaymentType",
     "PaymentStatus",
     "DiscountType",
+    "CreditNoteKind",
     "MemberType",
     "UserRole",
+    "PromotionType",
     "CartItem",
     "CartRequest",
     "AddItemRequest",
     "ApplyDiscountRequest",
     "ApplyLoyaltyRequest",
+    "AppliedPromotion",
     "FinancialBreakdown",
     "FinalizeTransactionRequest",
     "TransactionResponse",
+    "ReceiptFormat",
+    "RefundItem",
+    "RefundRequest",
+    "VoidRequest",
+    "RefundBreakdown",
+    "CreditNoteResponse",
+    "ShiftStatus",
+    "ShiftOpenRequest",
+    "ShiftCloseRequest",
+    "ShiftPaymentTotals",
+    "ShiftReport",
     "ProductBase",
     "ProductCreate",
     "ProductResponse",
     "CustomerBase",
     "CustomerCreate",
     "CustomerResponse",
+    "CustomerProfile",
     "DiscountBase",
     "DiscountCreate",
     "DiscountResponse",
+    "PromotionTier",
+    "PromotionBase",
+    "PromotionCreate",
+    "PromotionResponse",
 ]
@@ -19,7 +19,9 @@ class PaymentStatus(str, Enum):
     PENDING = "PENDING"
     PAID = "PAID"
     FAILED = "FAILED"
+    PARTIALLY_REFUNDED = "PARTIALLY_REFUNDED"
     REFUNDED = "REFUNDED"
+    VOIDED = "VOIDED"
 
 
 class DiscountType(str, Enum):
@@ -27,6 +29,11 @@ class DiscountType(str, Enum):
     FIXED = "FIXED"
 
 
+class CreditNoteKind(str, Enum):
+    REFUND = "REFUND"  # Goods returned after payment (full or partial)
+    VOID = "VOID"  # Whole sale cancelled
+
+
 class MemberType(str, Enum):
     REGULAR = "REGULAR"
     SILVER = "SILVER"
@@ -40,6 +47,13 @@ class UserRole(str, Enum):
     ADMIN = "ADMIN"
 
 
+class PromotionType(str, Enum):
+    ITEM = "ITEM"  # Percentage/fixed off matching items
+    BUNDLE = "BUNDLE"  # Set of products sold together at a fixed price
+    BUY_X_GET_Y = "BUY_X_GET_Y"  # Buy X, get Y discounted (BOGO when X=Y=1)
+    TIERED = "TIERED"  # Discount grows with matching quantity
+
+
 # ============ Cart & Transaction Models ============
 
 class CartItem(BaseModel):
@@ -49,12 +63,14 @@ class CartItem(BaseModel):
     quantity: int = Field(ge=1)
     unit_price: Decimal
     unit_cost: Optional[Decimal] = None
+    category: Optional[str] = None
     subtotal: Decimal
 
 
 class CartRequest(BaseModel):
     tenant_id: str
     user_id: str
+    terminal_id: Optional[str] = None
 
 
 class AddItemRequest(BaseModel):
@@ -71,6 +87,12 @@ class ApplyLoyaltyRequest(BaseModel):
     points_to_redeem: int = Field(ge=0)
 
 
+class AppliedPromotion(BaseModel):
+    promotion_id: str
+    name: str
+    amount: Decimal
+
+
 class FinancialBreakdown(BaseModel):
     """Immutable financial breakdown - all values stored explicitly"""
     gross_sales: Decimal = Field(description="Subtotal sebelum diskon")
@@ -84,6 +106,7 @@ class FinancialBreakdown(BaseModel):
     tax_amount: Decimal = Field(description="Jumlah pajak")
     grand_total: Decimal = Field(description="Total akhir yang harus dibayar")
     points_earned: int = Field(default=0, description="Poin yang didapat dari transaksi ini")
+    applied_promotions: list[AppliedPromotion] = Field(default_factory=list, description="Promo otomatis yang berlaku")
 
 
 class FinalizeTransactionRequest(BaseModel):
@@ -101,6 +124,114 @@ class TransactionResponse(BaseModel):
     created_at: datetime
 
 
+class ReceiptFormat(str, Enum):
+    TEXT = "text"
+    ESCPOS = "escpos"  # Raw bytes for thermal printers
+    PDF = "pdf"
+
+
+# ============ Refund Models ============
+
+class RefundItem(BaseModel):
+    item_id: str  # transaction_items.id
+    quantity: int = Field(ge=1)
+
+
+class RefundRequest(BaseModel):
+    user_id: str
+    items: Optional[list[RefundItem]] = None  # None = everything not yet refunded
+    reason: Optional[str] = None
+    restock: bool = True  # False for damaged / unsellable returns
+
+
+class VoidRequest(BaseModel):
+    user_id: str
+    reason: Optional[str] = None
+
+
+class RefundBreakdown(BaseModel):
+    """Amounts given back, in CalculationEngine order"""
+    gross_sales: Decimal = Field(description="Subtotal barang yang diretur")
+    total_discount: Decimal = Field(default=Decimal("0"), description="Diskon yang dibatalkan")
+    loyalty_redemption: Decimal = Field(default=Decimal("0"), description="Nilai poin yang dikembalikan")
+    dpp: Decimal = Field(description="Dasar Pengenaan Pajak retur")
+    tax_rate: Decimal = Field(description="Rate pajak (%)")
+    tax_amount: Decimal = Field(description="PPN retur")
+    grand_total: Decimal = Field(description="Total uang dikembalikan")
+    points_restored: int = Field(default=0, description="Poin redeem yang dikembalikan")
+    points_reversed: int = Field(default=0, description="Poin didapat yang ditarik")
+
+
+class CreditNoteResponse(BaseModel):
+    id: str
+    credit_note_no: str
+    transaction_id: str
+    invoice_no: str
+    kind: CreditNoteKind
+    breakdown: RefundBreakdown
+    payment_status: PaymentStatus
+    created_at: datetime
+
+
+# ============ Shift Models ============
+
+class ShiftStatus(str, Enum):
+    OPEN = "OPEN"
+    CLOSED = "CLOSED"
+
+
+class ShiftOpenRequest(BaseModel):
+    tenant_id: str
+    user_id: str
+    terminal_id: Optional[str] = None
+    opening_cash: Decimal = Field(default=Decimal("0"), ge=0, description="Modal awal laci")
+
+
+class ShiftCloseRequest(BaseModel):
+    counted_cash: Decimal = Field(ge=0, description="Uang tunai hasil hitung di laci")
+    notes: Optional[str] = None
+
+
+class ShiftPaymentTotals(BaseModel):
+    """Running totals of one payment type within a shift"""
+    payment_type: PaymentType
+    sales_count: int = 0
+    gross_sales: Decimal = Decimal("0")
+    discount_amount: Decimal = Decimal("0")
+    points_redeemed: int = 0
+    points_value: Decimal = Decimal("0")
+    tax_amount: Decimal = Decimal("0")
+    net_sales: Decimal = Decimal("0")
+    refund_count: int = 0
+    refund_amount: Decimal = Decimal("0")
+
+
+class ShiftReport(BaseModel):
+    """X-report while the shift is open, Z-report once closed"""
+    id: str
+    tenant_id: str
+    user_id: str
+    terminal_id: Optional[str] = None
+    status: ShiftStatus
+    opened_at: datetime
+    closed_at: Optional[datetime] = None
+    payments: list[ShiftPaymentTotals]
+    # All payment types combined
+    sales_count: int
+    gross_sales: Decimal
+    discount_amount: Decimal = Field(description="Total diskon diberikan")
+    points_redeemed: int = Field(description="Total poin ditukar")
+    points_value: Decimal
+    tax_amount: Decimal
+    net_sales: Decimal
+    refund_amount: Decimal
+    opening_cash: Decimal
+    expected_cash: Decimal = Field(description="Modal awal + penjualan tunai - retur tunai")
+    counted_cash: Optional[Decimal] = None
+    cash_difference: Optional[Decimal] = Field(default=None, description="Selisih (hitung - seharusnya)")
+    notes: Optional[str] = None
+
+
 # ============ Product Models ============
 
 class ProductBase(BaseModel):
@@ -147,6 +278,17 @@ class CustomerResponse(CustomerBase):
     joined_at: datetime
 
 
+class CustomerProfile(BaseModel):
+    """Minimal customer view for the till (cached)"""
+    id: str
+    tenant_id: str
+    name: str
+    phone: str
+    member_code: str
+    member_type: MemberType = MemberType.REGULAR
+    points: int = 0
+
+
 # ============ Discount Models ============
 
 class DiscountBase(BaseModel):
@@ -170,3 +312,37 @@ class DiscountResponse(DiscountBase):
     tenant_id: str
     usage_count: int
     is_active: bool
+
+
+# ============ Promotion Models ============
+
+class PromotionTier(BaseModel):
+    min_quantity: int = Field(ge=1)
+    discount_type: DiscountType
+    value: Decimal
+
+
+class PromotionBase(BaseModel):
+    name: str
+    type: PromotionType
+    discount_type: Optional[DiscountType] = None  # ITEM / BUY_X_GET_Y
+    value: Optional[Decimal] = None  # ITEM value, or % off the "get" units (default 100)
+    product_ids: list[str] = Field(default_factory=list)
+    categories: list[str] = Field(default_factory=list)
+    buy_quantity: Optional[int] = Field(default=None, ge=1)
+    get_quantity: Optional[int] = Field(default=None, ge=1)
+    bundle_price: Optional[Decimal] = None
+    tiers: list[PromotionTier] = Field(default_factory=list)
+    priority: int = 0
+    valid_from: Optional[datetime] = None
+    valid_until: Optional[datetime] = None
+
+
+class PromotionCreate(PromotionBase):
+    tenant_id: str
+
+
+class PromotionResponse(PromotionBase):
+    id: str
+    tenant_id: str
+    is_active: bool
@@ -0,0 +1,137 @@
+"""
+Midtrans Core API Client (QRIS / e-wallet charges)
+
+Talks to Midtrans over plain HTTPS with httpx. Point midtrans_base_url at a
+local stand-in to exercise the payment pipeline without the real gateway.
+"""
+import hashlib
+import hmac
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+from zoneinfo import ZoneInfo
+import httpx
+from src.cfg import get_settings
+from src.dto.schemas import PaymentStatus, PaymentType
+
+SANDBOX_URL = "https://api.sandbox.midtrans.com"
+PRODUCTION_URL = "https://api.midtrans.com"
+
+# Payment types charged through Midtrans (CARD goes through the EDC terminal)
+CHARGE_TYPES = {
+    PaymentType.QRIS: "qris",
+    PaymentType.EWALLET: "gopay",
+}
+
+# Midtrans timestamps ("YYYY-MM-DD HH:MM:SS") are GMT+7 without an offset
+GATEWAY_TZ = ZoneInfo("Asia/Jakarta")
+
+
+class MidtransError(Exception):
+    """Raised when Midtrans rejects a request or is unreachable"""
+    pass
+
+
+def map_status(transaction_status: str, fraud_status: Optional[str] = None) -> PaymentStatus:
+    """Map Midtrans transaction_status to our PaymentStatus"""
+    if transaction_status == "settlement":
+        return PaymentStatus.PAID
+    if transaction_status == "capture":
+        return PaymentStatus.PAID if fraud_status in (None, "accept") else PaymentStatus.PENDING
+    if transaction_status in ("deny", "cancel", "expire", "failure"):
+        return PaymentStatus.FAILED
+    if transaction_status in ("refund", "partial_refund"):
+        return PaymentStatus.REFUNDED
+    return PaymentStatus.PENDING
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Midtrans timestamp (e.g. settlement_time) as an aware datetime; None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=GATEWAY_TZ)
+
+
+def verify_signature(
+    order_id: str,
+    status_code: str,
+    gross_amount: str,
+    signature_key: str,
+    server_key: Optional[str] = None,
+) -> bool:
+    """Verify notification signature: SHA512(order_id + status_code + gross_amount + server_key)"""
+    server_key = server_key if server_key is not None else get_settings().midtrans_server_key
+    if not server_key:
+        return False
+    
+    expected = hashlib.sha512(
+        f"{order_id}{status_code}{gross_amount}{server_key}".encode()
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature_key or "")
+
+
+class MidtransClient:
+    """Async Midtrans Core API client"""
+    
+    def __init__(
+        self,
+        server_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: float = 10.0,
+    ):
+        settings = get_settings()
+        self.server_key = server_key if server_key is not None else settings.midtrans_server_key
+        self.base_url = base_url or settings.midtrans_base_url or (
+            PRODUCTION_URL if settings.midtrans_is_production else SANDBOX_URL
+        )
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            auth=(self.server_key, ""),
+            timeout=timeout,
+            headers={"Accept": "application/json"},
+        )
+    
+    async def aclose(self) -> None:
+        await self._client.aclose()
+    
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        try:
+            response = await self._client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            raise MidtransError(f"Midtrans unreachable: {e}") from e
+        
+        data = response.json() if response.content else {}
+        if response.status_code >= 500:
+            raise MidtransError(f"Midtrans error {response.status_code}: {data}")
+        return data
+    
+    async def charge(
+        self,
+        order_id: str,
+        gross_amount: Decimal,
+        payment_type: PaymentType,
+    ) -> dict:
+        """Create QRIS / e-wallet charge; returns Midtrans response (actions hold the QR)"""
+        body = {
+            "payment_type": CHARGE_TYPES[payment_type],
+            "transaction_details": {
+                "order_id": order_id,
+                "gross_amount": int(gross_amount),
+            },
+        }
+        data = await self._request("POST", "/v2/charge", json=body)
+        if str(data.get("status_code", "")).startswith(("4", "5")):
+            raise MidtransError(f"Charge rejected: {data.get('status_message')}")
+        return data
+    
+    async def get_status(self, order_id: str) -> dict:
+        """Get transaction status (status_code '404' when the order is unknown)"""
+        return await self._request("GET", f"/v2/{order_id}/status")
+    
+    async def cancel(self, order_id: str) -> dict:
+        """Cancel an unpaid charge (status_code '200'; '412' once it can no longer be cancelled)"""
+        return await self._request("POST", f"/v2/{order_id}/cancel")
@@ -0,0 +1,65 @@
+"""
+Telegram Bot API Client (sendMessage only)
+
+Plain HTTPS with httpx. Point telegram_api_url at a local stand-in to
+exercise the notification dispatcher without the real Bot API.
+"""
+from typing import Optional
+import httpx
+from src.cfg import get_settings
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramError(Exception):
+    """Raised when Telegram rejects a message or is unreachable"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after  # Set on 429 (flood control)
+        self.permanent = permanent  # Bad chat / blocked bot: retrying will not help
+
+
+class TelegramClient:
+    """Async Telegram Bot API client"""
+    
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: float = 10.0,
+    ):
+        settings = get_settings()
+        token = token if token is not None else settings.telegram_bot_token
+        self._client = httpx.AsyncClient(
+            base_url=f"{(base_url or settings.telegram_api_url).rstrip('/')}/bot{token}",
+            timeout=timeout,
+        )
+    
+    async def aclose(self) -> None:
+        await self._client.aclose()
+    
+    async def send_message(self, chat_id: str, text: str) -> dict:
+        try:
+            response = await self._client.post("/sendMessage", json={
+                "chat_id": chat_id,
+                "text": text,
+                "disable_web_page_preview": True,
+            })
+        except httpx.HTTPError as e:
+            raise TelegramError(f"Telegram unreachable: {e}") from e
+        
+        try:
+            data = response.json() if response.content else {}
+        except ValueError:
+            # Not JSON (e.g. a proxy's HTML error page): fails below like any other error
+            data = {"description": response.text[:200]}
+        if response.status_code == 429:
+            retry_after = data.get("parameters", {}).get("retry_after", 1)
+            raise TelegramError("Telegram flood control", retry_after=float(retry_after))
+        if not data.get("ok"):
+            raise TelegramError(
+                f"Telegram error {response.status_code}: {data.get('description')}",
+                permanent=response.status_code in (400, 403),
+            )
+        return data["result"]
@@ -0,0 +1,3 @@
+"""
+Jobs package - Scheduled batch jobs
+"""
@@ -0,0 +1,45 @@
+"""
+Cart Sweeper - Evicts Abandoned Carts
+
+Started from the FastAPI lifespan; runs every cart_sweep_interval seconds.
+A sweep runs without awaiting, so stopping never cuts one short and there
+is nothing to drain on shutdown.
+"""
+import asyncio
+import logging
+from typing import Optional
+from src.cfg import get_settings
+from src.core.cart_store import CartStore, RedisCartStore
+
+logger = logging.getLogger(__name__)
+
+_task: Optional[asyncio.Task] = None
+
+
+async def _sweep_forever(store: CartStore | RedisCartStore, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            evicted = store.sweep()
+            if evicted:
+                logger.info("Evicted %d idle cart(s), %d live", evicted, len(store))
+        except Exception:
+            logger.exception("Cart sweep failed")
+
+
+def start_cart_sweeper(store: CartStore | RedisCartStore) -> None:
+    global _task
+    # Redis expires idle carts itself
+    if _task is None and isinstance(store, CartStore):
+        _task = asyncio.create_task(
+            _sweep_forever(store, get_settings().cart_sweep_interval),
+            name="cart-sweeper",
+        )
+
+
+async def stop_cart_sweeper() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,134 @@
+"""
+Demand Forecast Job - Nightly Reorder Suggestions
+
+Reads daily units sold per product (one dense array per SKU from the
+daily_product_sales RPC), fits every SKU of a tenant in one vectorized
+pass (src/core/forecast.py) and writes reorder_suggestions.
+
+Run from a scheduler after the store closes:
+    python -m src.jobs.forecast [--tenant TENANT_ID]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+import numpy as np
+from src.cfg import get_settings
+from src.core.forecast import DemandModel
+from src.db import get_supabase, get_supabase_read
+
+_PAGE_SIZE = 1000
+_WRITE_CHUNK = 500
+
+
+def _paged(build_query) -> list[dict]:
+    rows: list[dict] = []
+    offset = 0
+    while True:
+        page = build_query().range(offset, offset + _PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        offset += _PAGE_SIZE
+
+
+def _suggestion_rows(
+    tenant_id: str,
+    history: list[dict],
+    stock: dict[str, int],
+    first_day: date,
+    generated_at: str,
+) -> list[dict]:
+    settings = get_settings()
+    product_ids = [row["product_id"] for row in history]
+    sales = np.array([row["quantities"] for row in history], dtype=np.float64)
+    on_hand = np.array([stock[product_id] for product_id in product_ids], dtype=np.float64)
+    
+    model = DemandModel.fit(sales, first_day.weekday(), alpha=settings.forecast_alpha)
+    plan = model.reorder(
+        on_hand,
+        lead_time_days=settings.forecast_lead_time_days,
+        cover_days=settings.forecast_cover_days,
+        service_z=settings.forecast_service_z,
+    )
+    
+    return [
+        {
+            "tenant_id": tenant_id,
+            "product_id": product_id,
+            "avg_daily_demand": round(float(plan["avg_daily_demand"][i]), 3),
+            "lead_time_demand": round(float(plan["lead_time_demand"][i]), 3),
+            "safety_stock": round(float(plan["safety_stock"][i]), 3),
+            "reorder_point": round(float(plan["reorder_point"][i]), 3),
+            "stock": int(on_hand[i]),
+            "days_of_cover": round(float(plan["days_of_cover"][i]), 1) if np.isfinite(plan["days_of_cover"][i]) else None,
+            "suggested_quantity": int(plan["suggested_quantity"][i]),
+            "generated_at": generated_at,
+        }
+        for i, product_id in enumerate(product_ids)
+    ]
+
+
+def forecast_tenant(tenant_id: str) -> int:
+    """Refresh reorder suggestions for one tenant; returns SKUs needing reorder"""
+    settings = get_settings()
+    supabase = get_supabase()
+    reader = get_supabase_read()  # History and stock may lag; suggestions are nightly
+    
+    # History ends yesterday (store-local), so today's partial day is excluded
+    generated_at = datetime.now(ZoneInfo(settings.store_timezone))
+    today = generated_at.date()
+    start = today - timedelta(days=settings.forecast_history_days)
+    
+    stock = {
+        row["id"]: row["stock"] or 0
+        for row in _paged(lambda: reader.table("products").select("id, stock").eq(
+            "tenant_id", tenant_id
+        ).eq("is_active", True).order("id"))
+    }
+    history = [
+        row
+        for row in _paged(lambda: reader.rpc("daily_product_sales", {
+            "p_tenant_id": tenant_id,
+            "p_start": start.isoformat(),
+            "p_days": settings.forecast_history_days,
+            "p_timezone": settings.store_timezone,
+        }))
+        if row["product_id"] in stock
+    ]
+    
+    rows = _suggestion_rows(tenant_id, history, stock, start, generated_at.isoformat()) if history else []
+    
+    # Upsert, then drop products that no longer sell: readers never see an empty table
+    for i in range(0, len(rows), _WRITE_CHUNK):
+        supabase.table("reorder_suggestions").upsert(
+            rows[i:i + _WRITE_CHUNK], on_conflict="tenant_id,product_id"
+        ).execute()
+    supabase.table("reorder_suggestions").delete().eq(
+        "tenant_id", tenant_id
+    ).lt("generated_at", generated_at.isoformat()).execute()
+    
+    return sum(1 for row in rows if row["suggested_quantity"] > 0)
+
+
+def run_forecast(tenant_id: Optional[str] = None) -> dict[str, int]:
+    """Refresh suggestions for one or all tenants; returns SKUs to reorder per tenant"""
+    supabase = get_supabase()
+    query = supabase.table("tenants").select("id")
+    if tenant_id:
+        query = query.eq("id", tenant_id)
+    
+    return {tenant["id"]: forecast_tenant(tenant["id"]) for tenant in query.execute().data or []}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="KasirAI demand forecast")
+    parser.add_argument("--tenant", default=None)
+    args = parser.parse_args()
+    
+    for tenant, count in run_forecast(args.tenant).items():
+        print(f"{tenant}: {count} product(s) to reorder")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Loyalty Batch Jobs
+
+Run from a scheduler (cron, Supabase pg_cron trigger, etc.):
+    python -m src.jobs.loyalty reconcile [--tenant TENANT_ID] [--dry-run]
+    python -m src.jobs.loyalty tiers [--tenant TENANT_ID]
+    python -m src.jobs.loyalty expire [--tenant TENANT_ID]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from src.cfg import get_settings
+from src.db import get_supabase
+
+
+def reconcile_points(tenant_id: Optional[str] = None, apply: bool = True) -> list[dict]:
+    """
+    Rebuild customer point balances from the point ledger.
+    Returns customers whose stored balance drifted from the ledger.
+    """
+    supabase = get_supabase()
+    result = supabase.rpc("reconcile_customer_points", {
+        "p_tenant_id": tenant_id,
+        "p_apply": apply,
+    }).execute()
+    return result.data or []
+
+
+def recompute_tiers(tenant_id: Optional[str] = None) -> dict[str, int]:
+    """
+    Reclassify member tiers from lifetime_spent in one set-based pass.
+    Tenant thresholds win; Settings thresholds are the fallback.
+    Returns number of customers moved into each tier.
+    """
+    settings = get_settings()
+    supabase = get_supabase()
+    result = supabase.rpc("recompute_member_tiers", {
+        "p_tenant_id": tenant_id,
+        "p_silver_threshold": settings.tier_silver_threshold,
+        "p_gold_threshold": settings.tier_gold_threshold,
+        "p_platinum_threshold": settings.tier_platinum_threshold,
+    }).execute()
+    return {row["member_type"]: row["changed"] for row in result.data or []}
+
+
+def expire_points(
+    tenant_id: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    pause: float = 0.05,
+) -> dict[str, dict]:
+    """
+    Expire unused points older than each tenant's window (FIFO).
+    
+    Runs in chunks of batch_size customers, one short DB transaction per
+    chunk, pausing between chunks so live checkouts are never starved.
+    The cutoff is truncated to the day, so re-running the same day resumes
+    the same run; expiry itself is idempotent.
+    """
+    settings = get_settings()
+    supabase = get_supabase()
+    batch_size = batch_size or settings.point_expiry_batch_size
+    
+    query = supabase.table("tenants").select("id, point_expiry_days")
+    if tenant_id:
+        query = query.eq("id", tenant_id)
+    tenants = query.execute().data or []
+    
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    summary: dict[str, dict] = {}
+    
+    for tenant in tenants:
+        days = tenant.get("point_expiry_days")
+        if days is None:
+            days = settings.point_expiry_days
+        if not days:
+            continue
+        
+        cutoff = (today - timedelta(days=days)).isoformat()
+        totals = {"cutoff": cutoff, "customers": 0, "points": 0}
+        
+        while True:
+            result = supabase.rpc("expire_points_batch", {
+                "p_tenant_id": tenant["id"],
+                "p_cutoff": cutoff,
+                "p_batch_size": batch_size,
+            }).execute()
+            chunk = result.data[0]
+            totals["customers"] += chunk["expired_customers"]
+            totals["points"] += chunk["expired_points"]
+            if chunk["done"]:
+                break
+            time.sleep(pause)
+        
+        summary[tenant["id"]] = totals
+    
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="KasirAI loyalty jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    reconcile = sub.add_parser("reconcile", help="Rebuild balances from the ledger")
+    reconcile.add_argument("--tenant", default=None)
+    reconcile.add_argument("--dry-run", action="store_true")
+    
+    tiers = sub.add_parser("tiers", help="Recompute member tiers from lifetime spend")
+    tiers.add_argument("--tenant", default=None)
+    
+    expire = sub.add_parser("expire", help="Expire points older than the tenant window")
+    expire.add_argument("--tenant", default=None)
+    expire.add_argument("--batch-size", type=int, default=None)
+    
+    args = parser.parse_args()
+    
+    if args.command == "reconcile":
+        drift = reconcile_points(args.tenant, apply=not args.dry_run)
+        for row in drift:
+            print(f"{row['customer_id']}: {row['stored_points']} -> {row['ledger_points']}")
+        print(f"{len(drift)} customer(s) {'would be ' if args.dry_run else ''}reconciled")
+    elif args.command == "tiers":
+        changed = recompute_tiers(args.tenant)
+        for member_type, count in changed.items():
+            print(f"{member_type}: {count}")
+        print(f"{sum(changed.values())} customer(s) reclassified")
+    elif args.command == "expire":
+        summary = expire_points(args.tenant, args.batch_size)
+        for tenant, totals in summary.items():
+            print(f"{tenant}: {totals['points']} point(s) from {totals['customers']} customer(s), cutoff {totals['cutoff']}")
+
+
+if __name__ == "__main__":
+    main()
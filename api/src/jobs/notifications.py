@@ -0,0 +1,257 @@
+"""
+Notification Dispatcher - Telegram Owner Alerts
+
+finalize_sale writes large-sale and low-stock alerts to notification_outbox
+in the sale's own DB transaction, so checkout never waits on Telegram.
+This worker, started from the FastAPI lifespan:
+1. Leases due rows (claim_notifications, SKIP LOCKED)
+2. Coalesces them into as few messages as possible per chat
+3. Sends within Telegram limits (global + per-chat token buckets)
+4. Marks rows SENT, or schedules a retry with jittered backoff
+
+End-of-day summaries are enqueued from a scheduler:
+    python -m src.jobs.notifications summary [--day YYYY-MM-DD]
+"""
+import argparse
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+from src.cfg import get_settings
+from src.core.ratelimit import TokenBucket
+from src.db import get_supabase
+from src.ext.telegram import MAX_MESSAGE_LENGTH, TelegramClient, TelegramError
+
+logger = logging.getLogger(__name__)
+
+
+def format_rupiah(amount) -> str:
+    return "Rp " + f"{round(float(amount)):,}".replace(",", ".")
+
+
+def format_notification(row: dict) -> str:
+    payload = row["payload"]
+    if row["kind"] == "LARGE_SALE":
+        return (
+            f"Large sale {payload['invoice_no']}: "
+            f"{format_rupiah(payload['net_sales'])} ({payload['payment_type']})"
+        )
+    if row["kind"] == "LOW_STOCK":
+        return f"- {payload['name']}: {payload['stock']} left"
+    return "\n".join([
+        f"Daily summary {payload['day']}",
+        f"Transactions: {payload['transactions']}",
+        f"Gross sales: {format_rupiah(payload['gross_sales'])}",
+        f"Discounts: {format_rupiah(payload['discount_amount'])}",
+        f"PPN: {format_rupiah(payload['tax_amount'])}",
+        f"Net sales: {format_rupiah(payload['net_sales'])}",
+        f"Refunds: {format_rupiah(payload.get('refunds', 0))}",
+    ])
+
+
+# Message text and the outbox rows it delivers
+Message = tuple[str, list[dict]]
+
+
+def _pack(parts: list[Message], separator: str) -> list[Message]:
+    """Join parts into as few messages as fit Telegram's length limit"""
+    messages: list[Message] = []
+    current, carried = "", []
+    for part, rows in parts:
+        part = part[:MAX_MESSAGE_LENGTH]
+        if current and len(current) + len(separator) + len(part) > MAX_MESSAGE_LENGTH:
+            messages.append((current, carried))
+            current, carried = part, list(rows)
+        else:
+            current = f"{current}{separator}{part}" if current else part
+            carried = carried + rows
+    if current:
+        messages.append((current, carried))
+    return messages
+
+
+def compose_messages(rows: list[dict]) -> list[Message]:
+    """Coalesce one chat's pending rows; low-stock alerts become one list"""
+    parts = [(format_notification(row), [row]) for row in rows if row["kind"] != "LOW_STOCK"]
+    low_stock = [(format_notification(row), [row]) for row in rows if row["kind"] == "LOW_STOCK"]
+    if low_stock:
+        parts.extend(_pack([("Low stock:", []), *low_stock], "\n"))
+    return _pack(parts, "\n\n")
+
+
+class NotificationDispatcher:
+    """Outbox poller delivering coalesced, rate-limited Telegram messages"""
+    
+    def __init__(self, client: Optional[TelegramClient] = None):
+        settings = get_settings()
+        self.settings = settings
+        self.client = client or TelegramClient()
+        self._global_bucket = TokenBucket(settings.telegram_rate_per_second, settings.telegram_rate_per_second)
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._busy = False
+        self._stopping = False
+    
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._dispatch_loop(), name="notification-dispatcher")
+    
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """Stop polling; a batch already leased gets up to drain_timeout to be sent and marked"""
+        if self._task is not None:
+            self._stopping = True
+            if self._busy and drain_timeout:
+                done, _ = await asyncio.wait({self._task}, timeout=drain_timeout)
+                if not done:
+                    logger.warning("Notification batch still in flight, its lease will expire and be retried")
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.client.aclose()
+    
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Short bursts allowed (a summary plus alerts), sustained rate per minute
+            bucket = TokenBucket(self.settings.telegram_chat_rate_per_minute / 60, 3)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+    
+    def _claim(self) -> list[dict]:
+        supabase = get_supabase()
+        result = supabase.rpc("claim_notifications", {
+            "p_limit": self.settings.notify_batch_size,
+            "p_lease_seconds": self.settings.notify_lease_seconds,
+        }).execute()
+        return result.data or []
+    
+    @staticmethod
+    def _mark_sent(ids: list[int]) -> None:
+        supabase = get_supabase()
+        supabase.table("notification_outbox").update({
+            "status": "SENT",
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+            "last_error": None,
+        }).in_("id", ids).execute()
+    
+    def _mark_failed(self, rows: list[dict], error: TelegramError) -> None:
+        """Schedule a retry, or give up after notify_max_attempts / permanent errors"""
+        supabase = get_supabase()
+        attempts = max(row["attempts"] for row in rows)
+        ids = [row["id"] for row in rows]
+        
+        if error.permanent or attempts >= self.settings.notify_max_attempts:
+            logger.warning("Giving up on %d notification(s) for chat %s: %s", len(ids), rows[0]["chat_id"], error)
+            supabase.table("notification_outbox").update({
+                "status": "FAILED",
+                "last_error": str(error),
+            }).in_("id", ids).execute()
+            return
+        
+        delay = error.retry_after
+        if delay is None:
+            delay = self.settings.notify_retry_backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+        supabase.table("notification_outbox").update({
+            "next_attempt_at": (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat(),
+            "last_error": str(error),
+        }).in_("id", ids).execute()
+    
+    async def _send_chat(self, chat_id: str, rows: list[dict]) -> int:
+        """Send one chat's messages in order; a failure retries only the rows not yet delivered"""
+        bucket = self._chat_bucket(chat_id)
+        delivered: list[dict] = []
+        error: Optional[TelegramError] = None
+        for text, message_rows in compose_messages(rows):
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                await self.client.send_message(chat_id, text)
+            except TelegramError as e:
+                error = e
+                break
+            delivered.extend(message_rows)
+        
+        if delivered:
+            await asyncio.to_thread(self._mark_sent, [row["id"] for row in delivered])
+        delivered_ids = {row["id"] for row in delivered}
+        pending = [row for row in rows if row["id"] not in delivered_ids]
+        if error is not None and pending:
+            await asyncio.to_thread(self._mark_failed, pending, error)
+        return len(delivered)
+    
+    async def dispatch_once(self) -> tuple[int, int]:
+        """Deliver one leased batch; returns (claimed, sent)"""
+        rows = await asyncio.to_thread(self._claim)
+        by_chat: dict[str, list[dict]] = defaultdict(list)
+        for row in rows:
+            by_chat[row["chat_id"]].append(row)
+        
+        sent = await asyncio.gather(*(self._send_chat(chat_id, chat_rows) for chat_id, chat_rows in by_chat.items()))
+        return len(rows), sum(sent)
+    
+    async def _dispatch_loop(self) -> None:
+        while not self._stopping:
+            self._busy = True
+            try:
+                claimed, _ = await self.dispatch_once()
+            except Exception:
+                logger.exception("Notification dispatch failed")
+                claimed = 0
+            finally:
+                self._busy = False
+            if self._stopping:
+                return
+            # Full batch: more is probably waiting, go again right away
+            if claimed < self.settings.notify_batch_size:
+                await asyncio.sleep(self.settings.notify_poll_interval)
+
+
+_dispatcher: Optional[NotificationDispatcher] = None
+
+
+async def start_notification_dispatcher() -> Optional[NotificationDispatcher]:
+    global _dispatcher
+    if _dispatcher is None and get_settings().telegram_bot_token:
+        _dispatcher = NotificationDispatcher()
+        await _dispatcher.start()
+    return _dispatcher
+
+
+async def stop_notification_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.stop(get_settings().shutdown_drain_timeout)
+        _dispatcher = None
+
+
+def enqueue_daily_summaries(day: Optional[date] = None) -> int:
+    """Queue end-of-day summaries (default: yesterday, store-local); idempotent per day"""
+    settings = get_settings()
+    if day is None:
+        day = datetime.now(ZoneInfo(settings.store_timezone)).date() - timedelta(days=1)
+    
+    supabase = get_supabase()
+    result = supabase.rpc("enqueue_daily_summaries", {
+        "p_day": day.isoformat(),
+        "p_timezone": settings.store_timezone,
+    }).execute()
+    return result.data or 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="KasirAI notification jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    summary = sub.add_parser("summary", help="Queue end-of-day summaries")
+    summary.add_argument("--day", type=date.fromisoformat, default=None)
+    
+    args = parser.parse_args()
+    
+    if args.command == "summary":
+        print(f"{enqueue_daily_summaries(args.day)} summary(ies) queued")
+
+
+if __name__ == "__main__":
+    main()
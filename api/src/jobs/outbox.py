@@ -0,0 +1,240 @@
+"""
+Outbox Relay - Change-Event Stream
+
+finalize_sale and the products trigger append to outbox_events in the
+same DB transaction as the change (db/012_outbox_events.sql). The relay
+tails that table once and fans each ordered batch out to the configured
+sinks (src/core/outbox.py), replacing per-consumer table polling:
+1. Lease every sink's consumer row (one relay per sink across workers)
+2. Read the next batch after the sink's (txid, id) cursor; sinks sharing
+   a cursor share the read
+3. Publish, then advance the cursor; a failing sink retries its batch
+   without holding back the others
+4. Hourly, prune events older than outbox_retention_days that every
+   consumer has passed; a consumer not leased for
+   outbox_consumer_inactive_days (a removed sink) no longer holds them back
+
+Started from the FastAPI lifespan, or standalone:
+    python -m src.jobs.outbox run
+    python -m src.jobs.outbox prune
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from src.cfg import get_settings
+from src.core.metrics import registry
+from src.core.outbox import ListenerSink, NdjsonSink, RedisStreamSink
+from src.db import get_supabase
+
+logger = logging.getLogger(__name__)
+
+_relayed = registry.counter("kasirai_outbox_events_total", "Change events delivered by sink")
+_failures = registry.counter("kasirai_outbox_failures_total", "Failed outbox batches by sink")
+
+Cursor = tuple[int, int]  # (txid, event id)
+
+PRUNE_INTERVAL = 3600  # seconds
+
+
+def create_sinks() -> list:
+    settings = get_settings()
+    sinks = []
+    for name in filter(None, (part.strip() for part in settings.outbox_sinks.split(","))):
+        if name == "listeners":
+            sinks.append(ListenerSink())
+        elif name == "ndjson":
+            sinks.append(NdjsonSink(settings.outbox_ndjson_dir))
+        elif name == "redis":
+            if not settings.redis_url:
+                logger.warning("Outbox sink 'redis' needs redis_url; skipped")
+                continue
+            sinks.append(RedisStreamSink(settings.redis_url, settings.outbox_redis_stream, settings.outbox_stream_maxlen))
+        else:
+            logger.warning("Unknown outbox sink %r; skipped", name)
+    return sinks
+
+
+def prune_events(retention_days: Optional[int] = None) -> int:
+    """Delete delivered events older than the retention window"""
+    settings = get_settings()
+    days = settings.outbox_retention_days if retention_days is None else retention_days
+    now = datetime.now(timezone.utc)
+    before = now - timedelta(days=days)
+    active_since = now - timedelta(days=settings.outbox_consumer_inactive_days)
+    
+    supabase = get_supabase()
+    result = supabase.rpc("prune_outbox_events", {
+        "p_before": before.isoformat(),
+        "p_active_since": active_since.isoformat(),
+    }).execute()
+    return result.data or 0
+
+
+class OutboxRelay:
+    """Tails outbox_events and delivers ordered batches to each sink"""
+    
+    def __init__(self, sinks: list):
+        self.settings = get_settings()
+        self.sinks = sinks
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._last_prune = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._busy = False
+        self._stopping = False
+    
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._relay_loop(), name="outbox-relay")
+    
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """Stop tailing; a batch in flight gets up to drain_timeout to be delivered and committed"""
+        if self._task is not None:
+            self._stopping = True
+            if self._busy and drain_timeout:
+                done, _ = await asyncio.wait({self._task}, timeout=drain_timeout)
+                if not done:
+                    logger.warning("Outbox batch still in flight, it is redelivered once the lease expires")
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for sink in self.sinks:
+            await sink.close()
+    
+    def _lease(self) -> dict[str, Cursor]:
+        """Cursors of the sinks this relay may advance right now"""
+        supabase = get_supabase()
+        cursors = {}
+        for sink in self.sinks:
+            rows = supabase.rpc("lease_outbox_consumer", {
+                "p_name": sink.name,
+                "p_owner": self.owner,
+                "p_lease_seconds": self.settings.outbox_lease_seconds,
+            }).execute().data
+            if rows:
+                cursors[sink.name] = (rows[0]["last_txid"], rows[0]["last_event_id"])
+        return cursors
+    
+    def _read(self, cursor: Cursor) -> list[dict]:
+        supabase = get_supabase()
+        result = supabase.rpc("read_outbox_events", {
+            "p_after_txid": cursor[0],
+            "p_after_id": cursor[1],
+            "p_limit": self.settings.outbox_batch_size,
+        }).execute()
+        return result.data or []
+    
+    def _commit(self, name: str, cursor: Cursor) -> bool:
+        supabase = get_supabase()
+        result = supabase.rpc("commit_outbox_offset", {
+            "p_name": name,
+            "p_owner": self.owner,
+            "p_txid": cursor[0],
+            "p_event_id": cursor[1],
+        }).execute()
+        return bool(result.data)
+    
+    async def relay_once(self) -> bool:
+        """Deliver one batch per sink; True if any sink may have more waiting"""
+        cursors = await asyncio.to_thread(self._lease)
+        
+        by_cursor: dict[Cursor, list] = {}
+        for sink in self.sinks:
+            if sink.name in cursors:
+                by_cursor.setdefault(cursors[sink.name], []).append(sink)
+        
+        backlog = False
+        for cursor, sinks in by_cursor.items():
+            events = await asyncio.to_thread(self._read, cursor)
+            if not events:
+                continue
+            backlog = backlog or len(events) >= self.settings.outbox_batch_size
+            last = (events[-1]["txid"], events[-1]["id"])
+            
+            for sink in sinks:
+                try:
+                    await sink.publish(events)
+                except Exception:
+                    logger.exception("Outbox sink %s failed; batch will be retried", sink.name)
+                    _failures.inc(sink=sink.name)
+                    continue
+                _relayed.inc(len(events), sink=sink.name)
+                if not await asyncio.to_thread(self._commit, sink.name, last):
+                    logger.warning("Outbox sink %s lost its lease; events may be delivered twice", sink.name)
+        
+        if cursors and time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            await asyncio.to_thread(prune_events)
+        return backlog
+    
+    async def _relay_loop(self) -> None:
+        while not self._stopping:
+            self._busy = True
+            try:
+                backlog = await self.relay_once()
+            except Exception:
+                logger.exception("Outbox relay failed")
+                backlog = False
+            finally:
+                self._busy = False
+            if self._stopping:
+                return
+            if not backlog:
+                await asyncio.sleep(self.settings.outbox_poll_interval)
+
+
+_relay: Optional[OutboxRelay] = None
+
+
+async def start_outbox_relay() -> Optional[OutboxRelay]:
+    global _relay
+    if _relay is None and get_settings().outbox_relay_enabled:
+        sinks = create_sinks()
+        if sinks:
+            _relay = OutboxRelay(sinks)
+            await _relay.start()
+    return _relay
+
+
+async def stop_outbox_relay() -> None:
+    global _relay
+    if _relay is not None:
+        await _relay.stop(get_settings().shutdown_drain_timeout)
+        _relay = None
+
+
+async def _run_forever() -> None:
+    relay = OutboxRelay(create_sinks())
+    await relay.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await relay.stop(get_settings().shutdown_drain_timeout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="KasirAI outbox relay")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    sub.add_parser("run", help="Relay events until interrupted")
+    prune = sub.add_parser("prune", help="Delete delivered events past retention")
+    prune.add_argument("--days", type=int, default=None)
+    
+    args = parser.parse_args()
+    
+    if args.command == "run":
+        logging.basicConfig(level=logging.INFO)
+        try:
+            asyncio.run(_run_forever())
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "prune":
+        print(f"{prune_events(args.days)} event(s) pruned")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Transaction Partitions - Creation, Archival & Columnar Export
+
+transactions / transaction_items are partitioned by month
+(db/015_partitioning.sql). This job keeps them healthy:
+1. ensure: create the current month plus partition_months_ahead (run
+   daily; an insert into a month without a partition fails)
+2. archive: months older than partition_retention_months are detached
+   into the `archive` schema and exported to Parquet, one file per table:
+       <archive_dir>/<table>/month=YYYY-MM/<table>-YYYY-MM.parquet
+   Row counts are checked against the archived tables; with --drop the
+   archived month is then dropped from the database.
+    
+    python -m src.jobs.partitions ensure [--months N]
+    python -m src.jobs.partitions list
+    python -m src.jobs.partitions archive [--retention-months N] [--month YYYY-MM] [--drop]
+
+Parquet export needs the optional `pyarrow` package.
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Optional
+from src.cfg import get_settings
+from src.db import get_supabase
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_TABLES = ("transactions", "transaction_items")
+
+_PAGE_SIZE = 5000
+
+
+def ensure_partitions(months_ahead: Optional[int] = None) -> int:
+    """Create missing partitions; returns how many months were added"""
+    months = get_settings().partition_months_ahead if months_ahead is None else months_ahead
+    supabase = get_supabase()
+    result = supabase.rpc("ensure_transaction_partitions", {"p_months_ahead": months}).execute()
+    return result.data or 0
+
+
+def list_partitions() -> list[dict]:
+    supabase = get_supabase()
+    return supabase.rpc("list_transaction_partitions", {}).execute().data or []
+
+
+def _arrow_type(column: dict):
+    import pyarrow as pa  # Optional dependency
+    
+    kind = column["type"]
+    if kind == "numeric":
+        return pa.decimal128(column["precision"] or 38, column["scale"] or 9)
+    if kind == "integer":
+        return pa.int32()
+    if kind == "bigint":
+        return pa.int64()
+    if kind == "boolean":
+        return pa.bool_()
+    if kind == "timestamp with time zone":
+        return pa.timestamp("us", tz="UTC")
+    if kind == "date":
+        return pa.date32()
+    return pa.string()  # uuid, varchar, text, jsonb
+
+
+def _convert(value, kind: str):
+    """JSON value from to_jsonb() -> Python value pyarrow accepts for the column"""
+    if value is None:
+        return None
+    if kind == "numeric":
+        return Decimal(str(value))
+    if kind == "timestamp with time zone":
+        return datetime.fromisoformat(value).astimezone(timezone.utc)
+    if kind == "date":
+        return date.fromisoformat(value)
+    if kind in ("json", "jsonb"):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def export_archived_table(table: str, month: date, columns: list[dict], directory: str) -> tuple[str, int]:
+    """Page through an archived month into one Parquet file; returns (path, rows)"""
+    import pyarrow as pa  # Optional dependency
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([(column["name"], _arrow_type(column)) for column in columns])
+    label = month.strftime("%Y-%m")
+    path = os.path.join(directory, table, f"month={label}", f"{table}-{label}.parquet")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    supabase = get_supabase()
+    rows = 0
+    after_id = None
+    # Written to a temp name first: a crash never leaves a truncated file in place
+    with pq.ParquetWriter(path + ".tmp", schema, compression="zstd") as writer:
+        while True:
+            page = supabase.rpc("read_archived_rows", {
+                "p_table": table,
+                "p_month": month.isoformat(),
+                "p_after_id": after_id,
+                "p_limit": _PAGE_SIZE,
+            }).execute().data or []
+            if not page:
+                break
+            writer.write_table(pa.Table.from_pydict(
+                {
+                    column["name"]: [_convert(row.get(column["name"]), column["type"]) for row in page]
+                    for column in columns
+                },
+                schema=schema,
+            ))
+            rows += len(page)
+            after_id = page[-1]["id"]
+    os.replace(path + ".tmp", path)
+    return path, rows
+
+
+def archive_month(month: date, directory: Optional[str] = None, drop: bool = False) -> dict[str, int]:
+    """Detach (if still attached), export and optionally drop one month"""
+    directory = directory or get_settings().archive_dir
+    supabase = get_supabase()
+    
+    if supabase.rpc("detach_transaction_partition", {"p_month": month.isoformat()}).execute().data:
+        logger.info("Detached %s", month.strftime("%Y-%m"))
+    
+    manifest = supabase.rpc("archived_partition_manifest", {"p_month": month.isoformat()}).execute().data
+    exported = {}
+    for table in ARCHIVED_TABLES:
+        path, rows = export_archived_table(table, month, manifest[table]["columns"], directory)
+        if rows != manifest[table]["rows"]:
+            raise RuntimeError(f"{path}: exported {rows} rows, archive holds {manifest[table]['rows']}")
+        logger.info("Exported %d %s row(s) to %s", rows, table, path)
+        exported[table] = rows
+    
+    if drop:
+        supabase.rpc("drop_archived_partition", {"p_month": month.isoformat()}).execute()
+        logger.info("Dropped archived %s", month.strftime("%Y-%m"))
+    return exported
+
+
+def archive_cold_partitions(
+    retention_months: Optional[int] = None,
+    directory: Optional[str] = None,
+    drop: bool = False,
+) -> dict[str, dict[str, int]]:
+    """Archive every month older than the retention window (archived ones are re-exported)"""
+    retention = get_settings().partition_retention_months if retention_months is None else retention_months
+    today = datetime.now(timezone.utc).date()
+    index = today.year * 12 + today.month - 1 - retention
+    cutoff = date(index // 12, index % 12 + 1, 1)
+    
+    return {
+        partition["month"][:7]: archive_month(date.fromisoformat(partition["month"]), directory, drop)
+        for partition in list_partitions()
+        if date.fromisoformat(partition["month"]) < cutoff
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="KasirAI transaction partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    ensure = sub.add_parser("ensure", help="Create upcoming monthly partitions")
+    ensure.add_argument("--months", type=int, default=None)
+    sub.add_parser("list", help="Show attached and archived months")
+    archive = sub.add_parser("archive", help="Detach and export cold months to Parquet")
+    archive.add_argument("--retention-months", type=int, default=None)
+    archive.add_argument("--month", type=lambda value: date.fromisoformat(f"{value}-01"), default=None)
+    archive.add_argument("--dir", default=None)
+    archive.add_argument("--drop", action="store_true", help="Drop each month after a verified export")
+    
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    
+    if args.command == "ensure":
+        print(f"{ensure_partitions(args.months)} partition month(s) created")
+    elif args.command == "list":
+        for partition in list_partitions():
+            print(
+                f"{partition['month'][:7]}  {partition['status']:<8}  "
+                f"~{partition['transactions_rows']} sales  ~{partition['items_rows']} items"
+            )
+    elif args.command == "archive":
+        if args.month:
+            archived = {args.month.strftime("%Y-%m"): archive_month(args.month, args.dir, args.drop)}
+        else:
+            archived = archive_cold_partitions(args.retention_months, args.dir, args.drop)
+        for month, counts in archived.items():
+            print(f"{month}: {counts['transactions']} sales, {counts['transaction_items']} items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Payment Pipeline - QRIS / E-Wallet Settlement
+
+Three parts, none of them on the checkout request path:
+1. Charge workers: finalize enqueues, workers create the Midtrans charge
+2. Webhook: Midtrans notification settles the sale (src/api/payments.py)
+3. Reconciler: periodically polls only stale PENDING sales, bounded per tick
+
+Status updates are idempotent: a sale only moves out of PENDING once.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Awaitable, Callable, Optional
+from src.cfg import get_settings
+from src.db import get_supabase
+from src.dto.schemas import PaymentStatus, PaymentType
+from src.ext.midtrans import CHARGE_TYPES, MidtransClient, MidtransError, map_status, parse_time
+
+logger = logging.getLogger(__name__)
+
+# Called after a sale leaves PENDING: (transaction_row, new_status)
+SettlementListener = Callable[[dict, PaymentStatus], Awaitable[None]]
+
+_listeners: list[SettlementListener] = []
+
+
+def add_settlement_listener(listener: SettlementListener) -> None:
+    _listeners.append(listener)
+
+
+def settle_payment(
+    invoice_no: str,
+    status: PaymentStatus,
+    payment_ref: Optional[str] = None,
+    paid_at: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Move a PENDING sale to its final status.
+    A failed payment also reverses points, stock and discount usage (fail_sale RPC).
+    Returns the updated row, or None if it was already settled (idempotent).
+    """
+    if status == PaymentStatus.PENDING:
+        return None
+    
+    supabase = get_supabase()
+    if status == PaymentStatus.FAILED:
+        result = supabase.rpc("fail_sale", {
+            "p_invoice_no": invoice_no,
+            "p_payment_ref": payment_ref,
+        }).execute()
+        return result.data or None
+    
+    data = {"payment_status": status.value}
+    if status == PaymentStatus.PAID:
+        data["paid_at"] = paid_at or datetime.now(timezone.utc).isoformat()
+    if payment_ref:
+        data["qris_ref"] = payment_ref
+    
+    result = supabase.table("transactions").update(data).eq(
+        "invoice_no", invoice_no
+    ).eq("payment_status", PaymentStatus.PENDING.value).execute()
+    
+    return result.data[0] if result.data else None
+
+
+async def apply_gateway_status(invoice_no: str, gateway: dict) -> Optional[PaymentStatus]:
+    """Apply a Midtrans status payload (webhook or poll); None if nothing changed"""
+    status = map_status(gateway.get("transaction_status", ""), gateway.get("fraud_status"))
+    settled_at = parse_time(gateway.get("settlement_time"))
+    row = await asyncio.to_thread(
+        settle_payment,
+        invoice_no,
+        status,
+        gateway.get("transaction_id"),
+        settled_at.isoformat() if settled_at else None,
+    )
+    if row is None:
+        return None
+    
+    for listener in _listeners:
+        try:
+            await listener(row, status)
+        except Exception:
+            logger.exception("Settlement listener failed for %s", invoice_no)
+    return status
+
+
+class PaymentPipeline:
+    """Background charge workers + stale-payment reconciler"""
+    
+    def __init__(self, client: Optional[MidtransClient] = None):
+        settings = get_settings()
+        self.settings = settings
+        self.client = client or MidtransClient()
+        self.queue: asyncio.Queue[tuple[str, Decimal, PaymentType, int]] = asyncio.Queue(
+            maxsize=settings.payment_queue_size
+        )
+        self._tasks: list[asyncio.Task] = []
+    
+    def enqueue_charge(self, invoice_no: str, amount: Decimal, payment_type: PaymentType) -> bool:
+        """Non-blocking; if the queue is full the reconciler picks the sale up later"""
+        if payment_type not in CHARGE_TYPES:
+            return False
+        try:
+            self.queue.put_nowait((invoice_no, amount, payment_type, 0))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Payment queue full, deferring charge for %s", invoice_no)
+            return False
+    
+    async def start(self) -> None:
+        for i in range(self.settings.payment_charge_workers):
+            self._tasks.append(asyncio.create_task(self._charge_worker(), name=f"payment-charge-{i}"))
+        self._tasks.append(asyncio.create_task(self._reconcile_loop(), name="payment-reconciler"))
+    
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """Stop workers; first wait up to drain_timeout for queued charges"""
+        if drain_timeout and self._tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("%d charge(s) left queued, reconciler will retry", self.queue.qsize())
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self.client.aclose()
+    
+    async def _charge_worker(self) -> None:
+        while True:
+            invoice_no, amount, payment_type, attempt = await self.queue.get()
+            try:
+                charge = await self.client.charge(invoice_no, amount, payment_type)
+                await asyncio.to_thread(self._store_charge, invoice_no, charge)
+            except MidtransError as e:
+                if attempt + 1 < self.settings.payment_charge_retries:
+                    # Backoff off the worker: during an outage the others keep draining the queue
+                    asyncio.get_running_loop().call_later(
+                        2 ** attempt, self.enqueue_retry, invoice_no, amount, payment_type, attempt + 1
+                    )
+                else:
+                    logger.warning("Charge for %s failed, leaving to reconciler: %s", invoice_no, e)
+            except Exception:
+                logger.exception("Charge worker error for %s", invoice_no)
+            finally:
+                self.queue.task_done()
+    
+    def enqueue_retry(self, invoice_no: str, amount: Decimal, payment_type: PaymentType, attempt: int) -> None:
+        """Requeue a failed charge; dropped when full or stopped (the reconciler picks it up)"""
+        if not self._tasks:
+            return
+        try:
+            self.queue.put_nowait((invoice_no, amount, payment_type, attempt))
+        except asyncio.QueueFull:
+            pass
+    
+    @staticmethod
+    def _store_charge(invoice_no: str, charge: dict) -> None:
+        """Store gateway reference and QR payload for the terminal"""
+        qr_url = next(
+            (a.get("url") for a in charge.get("actions", []) if a.get("name") == "generate-qr-code"),
+            None,
+        )
+        supabase = get_supabase()
+        supabase.table("transactions").update({
+            "qris_ref": charge.get("transaction_id"),
+            "qris_string": charge.get("qr_string"),
+            "qris_url": qr_url,
+        }).eq("invoice_no", invoice_no).execute()
+    
+    def _stale_pending(self) -> list[dict]:
+        now = datetime.now(timezone.utc)
+        supabase = get_supabase()
+        result = supabase.table("transactions").select(
+            "invoice_no, net_sales, payment_type, qris_ref"
+        ).eq("payment_status", PaymentStatus.PENDING.value).in_(
+            "payment_type", [t.value for t in CHARGE_TYPES]
+        ).lt(
+            "created_at", (now - timedelta(seconds=self.settings.payment_stale_after)).isoformat()
+        ).gt(
+            "created_at", (now - timedelta(hours=self.settings.payment_max_age_hours)).isoformat()
+        ).order("created_at").limit(self.settings.payment_reconcile_batch).execute()
+        return result.data or []
+    
+    async def reconcile_once(self) -> int:
+        """Poll gateway status for one bounded batch of stale PENDING sales"""
+        rows = await asyncio.to_thread(self._stale_pending)
+        semaphore = asyncio.Semaphore(self.settings.payment_reconcile_concurrency)
+        settled = 0
+        
+        async def check(row: dict) -> None:
+            nonlocal settled
+            async with semaphore:
+                try:
+                    gateway = await self.client.get_status(row["invoice_no"])
+                except MidtransError as e:
+                    logger.warning("Status check failed for %s: %s", row["invoice_no"], e)
+                    return
+            
+            if str(gateway.get("status_code")) == "404":
+                # Charge never reached Midtrans: create it now
+                self.enqueue_charge(
+                    row["invoice_no"], Decimal(str(row["net_sales"])), PaymentType(row["payment_type"])
+                )
+            elif await apply_gateway_status(row["invoice_no"], gateway):
+                settled += 1
+        
+        await asyncio.gather(*(check(row) for row in rows))
+        return settled
+    
+    async def _reconcile_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.payment_reconcile_interval)
+            try:
+                await self.reconcile_once()
+            except Exception:
+                logger.exception("Payment reconciliation failed")
+
+
+_pipeline: Optional[PaymentPipeline] = None
+
+
+def get_payment_pipeline() -> Optional[PaymentPipeline]:
+    """Running pipeline, or None when Midtrans is not configured"""
+    return _pipeline
+
+
+async def start_payment_pipeline() -> Optional[PaymentPipeline]:
+    global _pipeline
+    if _pipeline is None and get_settings().midtrans_server_key:
+        _pipeline = PaymentPipeline()
+        await _pipeline.start()
+    return _pipeline
+
+
+async def stop_payment_pipeline() -> None:
+    global _pipeline
+    if _pipeline is not None:
+        await _pipeline.stop(get_settings().shutdown_drain_timeout)
+        _pipeline = None
@@ -0,0 +1,43 @@
+"""
+Startup Profile - Cold Start Timing
+
+Records how long each boot phase took (router imports, warmup), in
+milliseconds since this module was first imported (the top of main.py).
+Exposed by GET /health/startup.
+
+For a per-module import breakdown:
+    python -X importtime -c "import main" 2> importtime.log
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_t0 = time.perf_counter()
+_phases: list[tuple[str, float]] = []
+_ready_at: Optional[float] = None
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, _elapsed_ms(start)))
+
+
+def mark_ready() -> None:
+    global _ready_at
+    _ready_at = _elapsed_ms(_t0)
+
+
+def report() -> dict:
+    return {
+        "ready": _ready_at is not None,
+        "ready_after_ms": _ready_at,
+        "phases": [{"name": name, "ms": ms} for name, ms in _phases],
+    }
@@ -0,0 +1,88 @@
+"""
+CalculationEngine refund allocation: partial refunds never drift from the
+recorded sale totals, and a full refund gives back exactly those totals.
+"""
+from decimal import Decimal
+import pytest
+from src.core import CalculationEngine
+from src.dto.schemas import CartItem, DiscountType
+
+UNIT_PRICE = Decimal("9000")
+POINTS_REDEEMED = 7
+
+
+@pytest.fixture
+def engine() -> CalculationEngine:
+    return CalculationEngine(tax_rate=Decimal("11"))
+
+
+@pytest.fixture
+def sale(engine):
+    """3 x Rp 9.000, Rp 301 code discount, 7 points (Rp 700), PPN 11% exclusive: Rp 28.859"""
+    item = CartItem(
+        product_id="p1",
+        product_name="Kopi Susu",
+        product_sku="KS-01",
+        quantity=3,
+        unit_price=UNIT_PRICE,
+        subtotal=UNIT_PRICE * 3,
+    )
+    return engine.calculate_breakdown(
+        items=[item],
+        discount_type=DiscountType.FIXED,
+        discount_value=Decimal("301"),
+        points_redeemed=POINTS_REDEEMED,
+        validate_margin=False,
+    )
+
+
+def test_sale_total(sale):
+    assert sale.gross_sales == Decimal("27000")
+    assert sale.dpp == Decimal("25999")
+    assert sale.grand_total == Decimal("28859")
+
+
+def test_three_one_third_refunds_sum_to_sale(engine, sale):
+    refunds = [
+        engine.calculate_refund(sale, UNIT_PRICE * part, UNIT_PRICE, points_redeemed=POINTS_REDEEMED)
+        for part in range(3)
+    ]
+    
+    # Rounded separately each third would be Rp 9.620 (Rp 28.860 in total)
+    assert [refund.grand_total for refund in refunds] == [Decimal("9620"), Decimal("9619"), Decimal("9620")]
+    assert sum(refund.grand_total for refund in refunds) == Decimal("28859")
+    assert sum(refund.gross_sales for refund in refunds) == sale.gross_sales
+    assert sum(refund.total_discount for refund in refunds) == sale.total_discount
+    assert sum(refund.loyalty_redemption for refund in refunds) == sale.loyalty_redemption
+    assert sum(refund.dpp for refund in refunds) == sale.dpp
+    assert sum(refund.tax_amount for refund in refunds) == sale.tax_amount
+    assert sum(refund.points_restored for refund in refunds) == POINTS_REDEEMED
+    assert sum(refund.points_reversed for refund in refunds) == sale.points_earned
+
+
+def test_full_refund_returns_recorded_totals(engine, sale):
+    refund = engine.calculate_refund(sale, Decimal("0"), sale.gross_sales, points_redeemed=POINTS_REDEEMED)
+    
+    assert refund.gross_sales == sale.gross_sales
+    assert refund.total_discount == sale.total_discount
+    assert refund.loyalty_redemption == sale.loyalty_redemption
+    assert refund.dpp == sale.dpp
+    assert refund.tax_amount == sale.tax_amount
+    assert refund.grand_total == Decimal("28859")
+    assert refund.points_restored == POINTS_REDEEMED
+    assert refund.points_reversed == sale.points_earned
+
+
+def test_allocate_refund_caps_at_sale(engine, sale):
+    allocated = engine.allocate_refund(sale, sale.gross_sales + UNIT_PRICE, points_redeemed=POINTS_REDEEMED)
+    
+    assert allocated.grand_total == sale.grand_total
+    assert allocated.tax_amount == sale.tax_amount
+
+
+def test_nothing_refunded_allocates_nothing(engine, sale):
+    allocated = engine.allocate_refund(sale, Decimal("0"), points_redeemed=POINTS_REDEEMED)
+    
+    assert allocated.grand_total == Decimal("0")
+    assert allocated.points_restored == 0
+    assert allocated.points_reversed == 0
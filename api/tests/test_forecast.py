@@ -0,0 +1,56 @@
+"""
+DemandModel: weekday index and level on simple series, and the reorder
+suggestion on either side of the reorder point.
+"""
+import numpy as np
+import pytest
+from src.core.forecast import DemandModel
+
+DAYS = 28  # Four full weeks, starting on a Monday
+
+
+def test_flat_series_has_no_seasonality():
+    sales = np.array([np.full(DAYS, 5.0), np.zeros(DAYS)])
+    model = DemandModel.fit(sales, first_weekday=0)
+    
+    np.testing.assert_allclose(model.weekday_index, np.ones((2, 7)))
+    np.testing.assert_allclose(model.level, [5.0, 0.0])
+    np.testing.assert_allclose(model.sigma, [0.0, 0.0], atol=1e-9)
+    np.testing.assert_allclose(model.forecast(7), [[5.0] * 7, [0.0] * 7])
+
+
+def test_single_weekday_spike_is_shrunk_toward_one():
+    sales = np.full((1, DAYS), 2.0)
+    sales[0, 5] = 30.0  # One busy Saturday
+    
+    raw = DemandModel.fit(sales, first_weekday=0, shrink=0).weekday_index[0, 5]
+    shrunk = DemandModel.fit(sales, first_weekday=0).weekday_index[0, 5]
+    
+    assert 1 < shrunk < raw
+
+
+def test_forecast_starts_after_the_last_day():
+    model = DemandModel.fit(np.full((1, 10), 1.0), first_weekday=2)
+    
+    assert model.next_weekday == (2 + 10) % 7
+
+
+@pytest.fixture
+def steady() -> DemandModel:
+    """2.5 units every day: lead time demand over 3 days is 7.5, no safety stock"""
+    return DemandModel.fit(np.full((1, DAYS), 2.5), first_weekday=0)
+
+
+def test_no_suggestion_above_reorder_point(steady):
+    plan = steady.reorder(np.array([8.0]), lead_time_days=3, cover_days=4)
+    
+    assert plan["reorder_point"][0] == pytest.approx(7.5)
+    assert plan["suggested_quantity"][0] == 0
+
+
+def test_suggestion_below_reorder_point_is_rounded_up(steady):
+    plan = steady.reorder(np.array([5.0]), lead_time_days=3, cover_days=4)
+    
+    # Cover 7 days (17.5 units) from 5 in stock: 12.5, ordered as 13
+    assert plan["suggested_quantity"][0] == 13
+    assert plan["days_of_cover"][0] == pytest.approx(2.0)
@@ -0,0 +1,81 @@
+"""
+Receipt rendering: text layout and status marks, ESC/POS framing, and a
+PDF whose page count and cross-reference offsets are valid.
+"""
+import re
+from datetime import datetime, timezone
+from decimal import Decimal
+import pytest
+from src.core.receipt import Receipt, ReceiptLine, ReceiptTemplate, render
+from src.dto.schemas import PaymentStatus, PaymentType, ReceiptFormat
+
+
+@pytest.fixture
+def template() -> ReceiptTemplate:
+    return ReceiptTemplate(name="Warung Kopi", npwp="01.234.567.8-901.000", footer="Terima kasih")
+
+
+def make_receipt(invoice_no: str = "INV-1", payment_status: PaymentStatus = PaymentStatus.PAID) -> Receipt:
+    """2 x Rp 9.000 paid in cash with Rp 20.000, PPN 11% exclusive"""
+    return Receipt(
+        tenant_id="t1",
+        invoice_no=invoice_no,
+        created_at=datetime(2026, 10, 19, 3, 5, tzinfo=timezone.utc),
+        items=[ReceiptLine("Kopi Susu Gula Aren Ukuran Besar Sekali", 2, 9000, 18000)],
+        gross_sales=18000,
+        discount_amount=0,
+        points_value=0,
+        dpp=16216,
+        tax_rate=Decimal("11"),
+        tax_amount=1784,
+        net_sales=19784,
+        payment_type=PaymentType.CASH,
+        amount_received=20000,
+        payment_status=payment_status,
+    )
+
+
+def test_text_layout(template):
+    text = render([make_receipt()], template, ReceiptFormat.TEXT).decode()
+    lines = text.splitlines()
+    
+    assert all(len(line) <= template.width for line in lines)
+    assert "Tgl : 19/10/2026 10:05" in lines  # Printed in store time (WIB)
+    assert template.pair("TOTAL", "Rp 19.784") in lines
+    assert template.pair("Kembali", "216") in lines
+    assert "***" not in text
+
+
+@pytest.mark.parametrize("status, mark", [
+    (PaymentStatus.VOIDED, "*** BATAL ***"),
+    (PaymentStatus.PARTIALLY_REFUNDED, "*** RETUR SEBAGIAN ***"),
+])
+def test_reversed_sale_is_marked(template, status, mark):
+    text = render([make_receipt(payment_status=status)], template, ReceiptFormat.TEXT, copy=True).decode()
+    
+    assert "SALINAN" in text
+    assert mark in text
+
+
+def test_escpos_framing(template):
+    data = render([make_receipt("INV-1"), make_receipt("INV-2")], template, ReceiptFormat.ESCPOS)
+    
+    assert data.startswith(b"\x1b@\x1bE\x01")  # Init, then the bold store name
+    assert data.count(b"\x1b@") == 2
+    assert data.count(b"\x1dV\x01") == 2  # One partial cut per receipt
+    assert data.endswith(b"\x1bd\x04\x1dV\x01")
+
+
+def test_pdf_pages_and_xref(template):
+    data = render([make_receipt("INV-1"), make_receipt("INV-(2)")], template, ReceiptFormat.PDF)
+    
+    assert data.startswith(b"%PDF-1.4\n")
+    assert data.endswith(b"%%EOF\n")
+    assert b"/Count 2" in data
+    assert b"(No  : INV-\\(2\\))" in data
+    
+    xref = int(re.search(rb"startxref\n(\d+)\n", data).group(1))
+    assert data[xref:].startswith(b"xref\n")
+    offsets = re.findall(rb"(\d{10}) 00000 n ", data)
+    for number, offset in enumerate(offsets, start=1):
+        assert data[int(offset):].startswith(b"%d 0 obj\n" % number)
@@ -0,0 +1,84 @@
+"""
+SingleFlight: concurrent callers of one key share a single call, its
+exception included, and nothing outlives the call.
+"""
+import asyncio
+import threading
+import time
+import pytest
+from src.core.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+    
+    def fetch(key):
+        calls.append(key)
+        time.sleep(0.05)
+        return {"key": key}
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("t1", fetch, "t1") for _ in range(5)))
+        return flight, results
+    
+    flight, results = asyncio.run(scenario())
+    
+    assert calls == ["t1"]
+    assert all(result is results[0] for result in results)
+    assert len(flight) == 0
+
+
+def test_different_keys_do_not_share():
+    async def fetch(key):
+        await asyncio.sleep(0.01)
+        return key
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        return await asyncio.gather(flight.do("a", fetch, "a"), flight.do("b", fetch, "b"))
+    
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+def test_exception_reaches_every_caller_and_is_not_kept():
+    attempts = []
+    
+    async def fetch():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("database down")
+        return "ok"
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        failed = await asyncio.gather(flight.do("k", fetch), flight.do("k", fetch), return_exceptions=True)
+        return failed, await flight.do("k", fetch)
+    
+    failed, retried = asyncio.run(scenario())
+    
+    assert [type(error) for error in failed] == [RuntimeError, RuntimeError]
+    assert retried == "ok"
+    assert len(attempts) == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    release = threading.Event()
+    
+    def fetch():
+        release.wait(1)
+        return "done"
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        leader = asyncio.ensure_future(flight.do("k", fetch))
+        follower = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+    
+    assert asyncio.run(scenario()) == "done"
@@ -0,0 +1,41 @@
+-- KasirAI Database Schema
+-- Migration: 002_promotions
+
+-- ============ PROMOTIONS ============
+-- Automatic promotions evaluated by CalculationEngine (no code required)
+CREATE TABLE IF NOT EXISTS promotions (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL,
+    type VARCHAR(20) NOT NULL CHECK (type IN ('ITEM', 'BUNDLE', 'BUY_X_GET_Y', 'TIERED')),
+    
+    -- ITEM / BUY_X_GET_Y value
+    discount_type VARCHAR(20) CHECK (discount_type IN ('PERCENTAGE', 'FIXED')),
+    value DECIMAL(15,2),
+    
+    -- Matching (product OR category)
+    product_ids UUID[] DEFAULT '{}',
+    categories TEXT[] DEFAULT '{}',
+    
+    -- BUY_X_GET_Y
+    buy_quantity INTEGER,
+    get_quantity INTEGER,
+    
+    -- BUNDLE
+    bundle_price DECIMAL(15,2),
+    
+    -- TIERED: [{"min_quantity": 3, "discount_type": "PERCENTAGE", "value": 10}, ...]
+    tiers JSONB DEFAULT '[]',
+    
+    priority INTEGER DEFAULT 0,
+    valid_from TIMESTAMPTZ,
+    valid_until TIMESTAMPTZ,
+    is_active BOOLEAN DEFAULT TRUE,
+    
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_promotions_tenant_active ON promotions(tenant_id) WHERE is_active;
+
+ALTER TABLE promotions ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for service role" ON promotions FOR ALL USING (true);
@@ -0,0 +1,161 @@
+-- KasirAI Database Schema
+-- Migration: 003_loyalty_ledger
+
+-- ============ POINT LEDGER ============
+-- The ledger is append-only and the source of truth for point balances.
+-- customers.points is a maintained projection that can be rebuilt from it.
+
+CREATE INDEX IF NOT EXISTS idx_point_ledger_customer_date ON point_ledger(customer_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_point_ledger_transaction ON point_ledger(transaction_id);
+
+-- A sale can earn/redeem at most once (safe retries of finalize_sale)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_point_ledger_sale
+    ON point_ledger(transaction_id, type)
+    WHERE transaction_id IS NOT NULL AND type IN ('EARNED', 'REDEEMED');
+
+-- Ledger rows are never updated or deleted directly. The one exception is
+-- the ON DELETE CASCADE from customers: that delete runs inside the FK
+-- trigger (pg_trigger_depth() > 1), so removing a customer takes their
+-- ledger with it.
+CREATE OR REPLACE FUNCTION point_ledger_append_only()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND pg_trigger_depth() > 1 THEN
+        RETURN OLD;
+    END IF;
+    RAISE EXCEPTION 'point_ledger is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_point_ledger_append_only ON point_ledger;
+CREATE TRIGGER trg_point_ledger_append_only
+    BEFORE UPDATE OR DELETE ON point_ledger
+    FOR EACH ROW EXECUTE FUNCTION point_ledger_append_only();
+
+-- Backfill: make the ledger match existing balances before it becomes the source of truth
+INSERT INTO point_ledger (customer_id, type, points, balance, description)
+SELECT c.id, 'ADJUSTED', c.points - COALESCE(l.points, 0), c.points, 'Opening balance (ledger migration)'
+FROM customers c
+LEFT JOIN (
+    SELECT customer_id, SUM(points) AS points FROM point_ledger GROUP BY customer_id
+) l ON l.customer_id = c.id
+WHERE c.points <> COALESCE(l.points, 0);
+
+-- ============ FUNCTIONS ============
+
+-- Replaces 001 version: SELECT without lock + up to 3 statements per sale
+DROP FUNCTION IF EXISTS update_customer_points(UUID, INTEGER, INTEGER, DECIMAL);
+
+-- Apply a sale to the customer balance and append its ledger rows.
+-- The single UPDATE ... RETURNING takes the row lock and applies the net
+-- change atomically, so concurrent checkouts for one member serialize on it.
+CREATE OR REPLACE FUNCTION update_customer_points(
+    p_customer_id UUID,
+    p_points_redeemed INTEGER,
+    p_points_earned INTEGER,
+    p_amount_spent DECIMAL,
+    p_transaction_id UUID DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_new_balance INTEGER;
+BEGIN
+    UPDATE customers SET
+        points = points - p_points_redeemed + p_points_earned,
+        lifetime_spent = lifetime_spent + p_amount_spent,
+        lifetime_points = lifetime_points + p_points_earned,
+        updated_at = NOW()
+    WHERE id = p_customer_id
+      AND points >= p_points_redeemed
+    RETURNING points INTO v_new_balance;
+    
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Insufficient points or customer not found: %', p_customer_id;
+    END IF;
+    
+    INSERT INTO point_ledger (customer_id, transaction_id, type, points, balance, description)
+    SELECT p_customer_id, p_transaction_id, e.type, e.points, e.balance, e.description
+    FROM (VALUES
+        ('REDEEMED', -p_points_redeemed, v_new_balance - p_points_earned, 'Point redemption'),
+        ('EARNED', p_points_earned, v_new_balance, 'Points from transaction')
+    ) AS e(type, points, balance, description)
+    WHERE e.points <> 0;
+    
+    RETURN v_new_balance;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Persist a finalized sale in one DB transaction:
+-- transaction row, items, point ledger and customer balance.
+CREATE OR REPLACE FUNCTION finalize_sale(
+    p_transaction JSONB,
+    p_items JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tx transactions%ROWTYPE;
+    v_balance INTEGER;
+BEGIN
+    INSERT INTO transactions
+    SELECT * FROM jsonb_populate_record(
+        NULL::transactions,
+        p_transaction || jsonb_build_object('created_at', COALESCE(p_transaction->>'created_at', NOW()::TEXT))
+    )
+    RETURNING * INTO v_tx;
+    
+    INSERT INTO transaction_items
+    SELECT * FROM jsonb_populate_recordset(NULL::transaction_items, p_items);
+    
+    IF v_tx.customer_id IS NOT NULL THEN
+        v_balance := update_customer_points(
+            v_tx.customer_id,
+            COALESCE(v_tx.points_redeemed, 0),
+            COALESCE(v_tx.points_earned, 0),
+            v_tx.net_sales,
+            v_tx.id
+        );
+    END IF;
+    
+    RETURN jsonb_build_object(
+        'id', v_tx.id,
+        'created_at', v_tx.created_at,
+        'points_balance', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rebuild customers.points from the ledger in one set-based pass.
+-- Returns customers whose stored balance drifted; p_apply = FALSE is a dry run.
+CREATE OR REPLACE FUNCTION reconcile_customer_points(
+    p_tenant_id UUID DEFAULT NULL,
+    p_apply BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (customer_id UUID, stored_points INTEGER, ledger_points INTEGER) AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH ledger AS (
+        SELECT l.customer_id, SUM(l.points)::INTEGER AS points
+        FROM point_ledger l
+        JOIN customers c ON c.id = l.customer_id
+        WHERE p_tenant_id IS NULL OR c.tenant_id = p_tenant_id
+        GROUP BY l.customer_id
+    ),
+    drift AS (
+        SELECT c.id, c.points AS stored, COALESCE(l.points, 0) AS computed
+        FROM customers c
+        LEFT JOIN ledger l ON l.customer_id = c.id
+        WHERE (p_tenant_id IS NULL OR c.tenant_id = p_tenant_id)
+          AND c.points IS DISTINCT FROM COALESCE(l.points, 0)
+    ),
+    fixed AS (
+        UPDATE customers c SET
+            points = d.computed,
+            updated_at = NOW()
+        FROM drift d
+        WHERE p_apply AND c.id = d.id
+        RETURNING c.id
+    )
+    SELECT d.id, d.stored, d.computed FROM drift d;
+END;
+$$ LANGUAGE plpgsql;
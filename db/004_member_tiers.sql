@@ -0,0 +1,53 @@
+-- KasirAI Database Schema
+-- Migration: 004_member_tiers
+
+-- ============ TENANT TIER CONFIG ============
+-- lifetime_spent thresholds; NULL falls back to the API defaults
+ALTER TABLE tenants
+    ADD COLUMN IF NOT EXISTS tier_silver_threshold DECIMAL(15,2),
+    ADD COLUMN IF NOT EXISTS tier_gold_threshold DECIMAL(15,2),
+    ADD COLUMN IF NOT EXISTS tier_platinum_threshold DECIMAL(15,2);
+
+CREATE INDEX IF NOT EXISTS idx_customers_lifetime_spent ON customers(tenant_id, lifetime_spent);
+
+-- ============ FUNCTIONS ============
+
+-- Reclassify all customers of a tenant (or every tenant when NULL) in one
+-- set-based UPDATE. Only rows whose tier actually changes are written.
+CREATE OR REPLACE FUNCTION recompute_member_tiers(
+    p_tenant_id UUID DEFAULT NULL,
+    p_silver_threshold DECIMAL DEFAULT 1000000,
+    p_gold_threshold DECIMAL DEFAULT 5000000,
+    p_platinum_threshold DECIMAL DEFAULT 20000000
+)
+RETURNS TABLE (member_type VARCHAR, changed INTEGER) AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH target AS (
+        SELECT
+            c.id,
+            CASE
+                WHEN c.lifetime_spent >= COALESCE(t.tier_platinum_threshold, p_platinum_threshold) THEN 'PLATINUM'
+                WHEN c.lifetime_spent >= COALESCE(t.tier_gold_threshold, p_gold_threshold) THEN 'GOLD'
+                WHEN c.lifetime_spent >= COALESCE(t.tier_silver_threshold, p_silver_threshold) THEN 'SILVER'
+                ELSE 'REGULAR'
+            END AS new_type
+        FROM customers c
+        JOIN tenants t ON t.id = c.tenant_id
+        WHERE p_tenant_id IS NULL OR c.tenant_id = p_tenant_id
+    ),
+    updated AS (
+        UPDATE customers c SET
+            member_type = target.new_type,
+            updated_at = NOW()
+        FROM target
+        WHERE c.id = target.id
+          AND c.member_type IS DISTINCT FROM target.new_type
+        RETURNING c.member_type
+    )
+    SELECT updated.member_type, COUNT(*)::INTEGER
+    FROM updated
+    GROUP BY updated.member_type;
+END;
+$$ LANGUAGE plpgsql;
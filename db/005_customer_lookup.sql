@@ -0,0 +1,98 @@
+-- KasirAI Database Schema
+-- Migration: 005_customer_lookup
+
+-- ============ PHONE NORMALIZATION ============
+-- Must match normalize_phone() in api/src/core/customer_index.py
+CREATE OR REPLACE FUNCTION normalize_phone_e164(p_phone TEXT, p_country_code TEXT DEFAULT '62')
+RETURNS TEXT AS $$
+DECLARE
+    v_digits TEXT := regexp_replace(COALESCE(p_phone, ''), '\D', '', 'g');
+BEGIN
+    IF v_digits = '' THEN
+        RETURN NULL;
+    ELSIF btrim(p_phone) LIKE '+%' OR v_digits LIKE p_country_code || '%' THEN
+        RETURN '+' || v_digits;
+    ELSIF v_digits LIKE '0%' THEN
+        RETURN '+' || p_country_code || substr(v_digits, 2);
+    END IF;
+    RETURN '+' || p_country_code || v_digits;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Prefix for a partially typed phone; must match phone_prefix() in
+-- api/src/core/customer_index.py. Digits still inside the country code are
+-- kept as typed; NULL until the input reaches the subscriber number.
+CREATE OR REPLACE FUNCTION normalize_phone_prefix(p_query TEXT, p_country_code TEXT DEFAULT '62')
+RETURNS TEXT AS $$
+DECLARE
+    v_digits TEXT := regexp_replace(COALESCE(p_query, ''), '\D', '', 'g');
+    v_prefix TEXT;
+BEGIN
+    IF v_digits = '' THEN
+        RETURN NULL;
+    ELSIF btrim(p_query) LIKE '+%' OR v_digits LIKE p_country_code || '%' OR p_country_code LIKE v_digits || '%' THEN
+        v_prefix := v_digits;
+    ELSIF v_digits LIKE '0%' THEN
+        v_prefix := p_country_code || substr(v_digits, 2);
+    ELSE
+        v_prefix := p_country_code || v_digits;
+    END IF;
+    IF length(v_prefix) <= length(p_country_code) AND p_country_code LIKE v_prefix || '%' THEN
+        RETURN NULL;
+    END IF;
+    RETURN v_prefix;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Escape LIKE wildcards in user input (default escape character is \)
+CREATE OR REPLACE FUNCTION like_escape(p_text TEXT)
+RETURNS TEXT AS $$
+    SELECT replace(replace(replace(p_text, '\', '\\'), '%', '\%'), '_', '\_');
+$$ LANGUAGE sql IMMUTABLE;
+
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS phone_e164 VARCHAR(20);
+
+CREATE OR REPLACE FUNCTION customers_set_phone_e164()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.phone_e164 := normalize_phone_e164(NEW.phone);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_customers_phone_e164 ON customers;
+CREATE TRIGGER trg_customers_phone_e164
+    BEFORE INSERT OR UPDATE OF phone ON customers
+    FOR EACH ROW EXECUTE FUNCTION customers_set_phone_e164();
+
+UPDATE customers SET phone_e164 = normalize_phone_e164(phone) WHERE phone_e164 IS NULL;
+
+-- ============ PREFIX INDEXES ============
+-- text_pattern_ops lets LIKE 'prefix%' use the index regardless of collation
+CREATE INDEX IF NOT EXISTS idx_customers_phone_prefix
+    ON customers(tenant_id, phone_e164 text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_code_prefix
+    ON customers(tenant_id, member_code text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_name_prefix
+    ON customers(tenant_id, lower(name) text_pattern_ops);
+
+-- ============ FUNCTIONS ============
+
+-- DB-backed prefix search (fallback when the in-memory index is not loaded)
+CREATE OR REPLACE FUNCTION search_customers(
+    p_tenant_id UUID,
+    p_query TEXT,
+    p_limit INTEGER DEFAULT 10,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS SETOF customers AS $$
+    SELECT * FROM customers
+    WHERE tenant_id = p_tenant_id
+      AND (
+        (p_query ~ '^\+?[0-9 \-]+$' AND phone_e164 LIKE '+' || normalize_phone_prefix(p_query) || '%')
+        OR member_code LIKE like_escape(upper(p_query)) || '%'
+        OR lower(name) LIKE like_escape(lower(p_query)) || '%'
+      )
+    ORDER BY name
+    LIMIT p_limit OFFSET p_offset;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,124 @@
+-- KasirAI Database Schema
+-- Migration: 006_point_expiry
+
+-- ============ TENANT EXPIRY CONFIG ============
+-- Days after which earned points expire; NULL falls back to the API default, 0 = never
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS point_expiry_days INTEGER;
+
+-- ============ EXPIRY RUNS ============
+-- One row per (tenant, cutoff): keyset cursor so an interrupted run resumes
+CREATE TABLE IF NOT EXISTS point_expiry_runs (
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    cutoff TIMESTAMPTZ NOT NULL,
+    last_customer_id UUID,
+    customers_expired INTEGER DEFAULT 0,
+    points_expired BIGINT DEFAULT 0,
+    started_at TIMESTAMPTZ DEFAULT NOW(),
+    finished_at TIMESTAMPTZ,
+    
+    PRIMARY KEY (tenant_id, cutoff)
+);
+
+ALTER TABLE point_expiry_runs ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for service role" ON point_expiry_runs FOR ALL USING (true);
+
+-- ============ FUNCTIONS ============
+
+-- Expire one chunk of customers (keyset order by id) for a tenant.
+--
+-- FIFO semantics: debits (redemptions, expiries, negative adjustments) consume
+-- the oldest credits first, so the still-unused part of credits older than the
+-- cutoff is  max(0, credits_before_cutoff - all_debits), capped at the balance.
+-- Previous EXPIRED rows count as debits, which makes re-runs idempotent.
+--
+-- Customers locked by a live checkout are skipped (SKIP LOCKED) and picked up
+-- by the next run; each call is its own short transaction.
+CREATE OR REPLACE FUNCTION expire_points_batch(
+    p_tenant_id UUID,
+    p_cutoff TIMESTAMPTZ,
+    p_batch_size INTEGER DEFAULT 5000
+)
+RETURNS TABLE (scanned INTEGER, expired_customers INTEGER, expired_points BIGINT, done BOOLEAN) AS $$
+#variable_conflict use_column
+DECLARE
+    v_after UUID;
+    v_finished TIMESTAMPTZ;
+    v_last UUID;
+    v_scanned INTEGER;
+    v_customers INTEGER;
+    v_points BIGINT;
+BEGIN
+    INSERT INTO point_expiry_runs (tenant_id, cutoff)
+    VALUES (p_tenant_id, p_cutoff)
+    ON CONFLICT (tenant_id, cutoff) DO NOTHING;
+    
+    SELECT r.last_customer_id, r.finished_at INTO v_after, v_finished
+    FROM point_expiry_runs r
+    WHERE r.tenant_id = p_tenant_id AND r.cutoff = p_cutoff
+    FOR UPDATE;
+    
+    IF v_finished IS NOT NULL THEN
+        RETURN QUERY SELECT 0, 0, 0::BIGINT, TRUE;
+        RETURN;
+    END IF;
+    
+    WITH batch AS (
+        SELECT c.id FROM customers c
+        WHERE c.tenant_id = p_tenant_id
+          AND (v_after IS NULL OR c.id > v_after)
+        ORDER BY c.id
+        LIMIT p_batch_size
+    ),
+    locked AS (
+        SELECT c.id, c.points
+        FROM customers c
+        JOIN batch b ON b.id = c.id
+        WHERE c.points > 0
+        FOR UPDATE OF c SKIP LOCKED
+    ),
+    ledger AS (
+        SELECT
+            l.customer_id,
+            COALESCE(SUM(l.points) FILTER (WHERE l.points > 0 AND l.created_at < p_cutoff), 0) AS old_credits,
+            COALESCE(-SUM(l.points) FILTER (WHERE l.points < 0), 0) AS debits
+        FROM point_ledger l
+        JOIN locked k ON k.id = l.customer_id
+        GROUP BY l.customer_id
+    ),
+    expiring AS (
+        SELECT k.id, LEAST(k.points, g.old_credits - g.debits)::INTEGER AS amount
+        FROM locked k
+        JOIN ledger g ON g.customer_id = k.id
+        WHERE g.old_credits > g.debits
+    ),
+    updated AS (
+        UPDATE customers c SET
+            points = c.points - e.amount,
+            updated_at = NOW()
+        FROM expiring e
+        WHERE c.id = e.id
+        RETURNING c.id, e.amount, c.points AS balance
+    ),
+    ledgered AS (
+        INSERT INTO point_ledger (customer_id, type, points, balance, description)
+        SELECT u.id, 'EXPIRED', -u.amount, u.balance, 'Points expired (earned before ' || p_cutoff::DATE || ')'
+        FROM updated u
+        RETURNING points
+    )
+    SELECT
+        (SELECT COUNT(*)::INTEGER FROM batch),
+        (SELECT b.id FROM batch b ORDER BY b.id DESC LIMIT 1),
+        (SELECT COUNT(*)::INTEGER FROM ledgered),
+        (SELECT COALESCE(-SUM(points), 0)::BIGINT FROM ledgered)
+    INTO v_scanned, v_last, v_customers, v_points;
+    
+    UPDATE point_expiry_runs SET
+        last_customer_id = COALESCE(v_last, last_customer_id),
+        customers_expired = customers_expired + v_customers,
+        points_expired = points_expired + v_points,
+        finished_at = CASE WHEN v_scanned < p_batch_size THEN NOW() END
+    WHERE tenant_id = p_tenant_id AND cutoff = p_cutoff;
+    
+    RETURN QUERY SELECT v_scanned, v_customers, v_points, v_scanned < p_batch_size;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,13 @@
+-- KasirAI Database Schema
+-- Migration: 007_payments
+
+-- ============ TRANSACTIONS: GATEWAY PAYLOAD ============
+-- qris_ref holds the Midtrans transaction_id; QR payload is shown by the terminal
+ALTER TABLE transactions
+    ADD COLUMN IF NOT EXISTS qris_string TEXT,
+    ADD COLUMN IF NOT EXISTS qris_url TEXT;
+
+-- Reconciler only ever scans PENDING gateway sales
+CREATE INDEX IF NOT EXISTS idx_transactions_pending
+    ON transactions(created_at)
+    WHERE payment_status = 'PENDING' AND payment_type IN ('QRIS', 'EWALLET');
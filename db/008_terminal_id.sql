@@ -0,0 +1,5 @@
+-- KasirAI Database Schema
+-- Migration: 008_terminal_id
+
+-- Terminal (till) that rang up the sale; used to route real-time payment events
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS terminal_id VARCHAR(50);
@@ -0,0 +1,16 @@
+-- KasirAI Database Schema
+-- Migration: 009_product_categories
+
+-- ============ FUNCTIONS ============
+
+-- Distinct categories with product counts for the POS category bar
+-- (grouped over idx_products_category instead of shipping every product row)
+CREATE OR REPLACE FUNCTION product_categories(p_tenant_id UUID)
+RETURNS TABLE (category VARCHAR, product_count BIGINT) AS $$
+    SELECT p.category, COUNT(*)
+    FROM products p
+    WHERE p.tenant_id = p_tenant_id
+      AND p.category IS NOT NULL
+    GROUP BY p.category
+    ORDER BY p.category;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,58 @@
+-- KasirAI Database Schema
+-- Migration: 010_demand_forecast
+
+-- ============ REORDER SUGGESTIONS ============
+-- Written by the nightly forecast job (python -m src.jobs.forecast)
+CREATE TABLE IF NOT EXISTS reorder_suggestions (
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    
+    avg_daily_demand DECIMAL(12,3) NOT NULL,
+    lead_time_demand DECIMAL(12,3) NOT NULL,
+    safety_stock DECIMAL(12,3) NOT NULL,
+    reorder_point DECIMAL(12,3) NOT NULL,
+    stock INTEGER NOT NULL,
+    days_of_cover DECIMAL(8,1),
+    suggested_quantity INTEGER NOT NULL,
+    
+    generated_at TIMESTAMPTZ DEFAULT NOW(),
+    
+    PRIMARY KEY (tenant_id, product_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reorder_suggestions_needed
+    ON reorder_suggestions(tenant_id, days_of_cover)
+    WHERE suggested_quantity > 0;
+
+-- ============ FUNCTIONS ============
+
+-- Daily units sold per product as one dense array per product
+-- (quantities[1] = p_start), so thousands of SKUs come back in a few pages.
+-- Days are local store days (p_timezone); failed / refunded sales are excluded.
+CREATE OR REPLACE FUNCTION daily_product_sales(
+    p_tenant_id UUID,
+    p_start DATE,
+    p_days INTEGER,
+    p_timezone TEXT DEFAULT 'Asia/Jakarta'
+)
+RETURNS TABLE (product_id UUID, quantities INTEGER[]) AS $$
+    WITH daily AS (
+        SELECT ti.product_id,
+               (t.created_at AT TIME ZONE p_timezone)::date - p_start AS day,
+               SUM(ti.quantity)::INTEGER AS quantity
+        FROM transactions t
+        JOIN transaction_items ti ON ti.transaction_id = t.id
+        WHERE t.tenant_id = p_tenant_id
+          AND t.created_at >= p_start::timestamp AT TIME ZONE p_timezone
+          AND t.created_at < (p_start + p_days)::timestamp AT TIME ZONE p_timezone
+          AND t.payment_status NOT IN ('FAILED', 'REFUNDED')
+        GROUP BY 1, 2
+    )
+    SELECT p.product_id,
+           array_agg(COALESCE(d.quantity, 0) ORDER BY g.day)
+    FROM (SELECT DISTINCT daily.product_id FROM daily) p
+    CROSS JOIN generate_series(0, p_days - 1) AS g(day)
+    LEFT JOIN daily d ON d.product_id = p.product_id AND d.day = g.day
+    GROUP BY p.product_id
+    ORDER BY p.product_id;
+$$ LANGUAGE sql STABLE;
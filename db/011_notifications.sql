@@ -0,0 +1,171 @@
+-- KasirAI Database Schema
+-- Migration: 011_notifications
+
+-- Owner notifications (Telegram); NULL chat = notifications off
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS telegram_chat_id VARCHAR(50);
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS large_sale_threshold DECIMAL(15,2);  -- NULL = no large-sale alerts
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS low_stock_threshold INTEGER DEFAULT 5;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS low_stock_threshold INTEGER;  -- NULL = tenant default
+
+-- ============ NOTIFICATION OUTBOX ============
+-- Written in the same DB transaction as the sale; delivered by the
+-- dispatcher in src/jobs/notifications.py
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    chat_id VARCHAR(50) NOT NULL,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('LARGE_SALE', 'LOW_STOCK', 'DAILY_SUMMARY')),
+    payload JSONB NOT NULL,
+    dedupe_key VARCHAR(100),
+    
+    status VARCHAR(10) NOT NULL DEFAULT 'PENDING' CHECK (status IN ('PENDING', 'SENT', 'FAILED')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    sent_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+    ON notification_outbox(next_attempt_at)
+    WHERE status = 'PENDING';
+
+-- At most one daily summary per tenant and day
+CREATE UNIQUE INDEX IF NOT EXISTS uq_notification_outbox_dedupe
+    ON notification_outbox(tenant_id, kind, dedupe_key)
+    WHERE dedupe_key IS NOT NULL;
+
+-- ============ FUNCTIONS ============
+
+-- Replaces 003 version: also decrements stock and enqueues owner alerts
+-- (large sale, product crossing its low-stock threshold) atomically with the sale.
+-- Stock used to be adjusted only by product edits, so it never reflected
+-- sales and a low-stock alert had nothing to fire on. It now moves with
+-- the sale in the same transaction. A PENDING gateway sale holds its stock
+-- until the payment settles: fail_sale (017) puts it back when the payment
+-- fails, and refund_sale puts back restocked refunds and voids.
+CREATE OR REPLACE FUNCTION finalize_sale(
+    p_transaction JSONB,
+    p_items JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tx transactions%ROWTYPE;
+    v_balance INTEGER;
+BEGIN
+    INSERT INTO transactions
+    SELECT * FROM jsonb_populate_record(
+        NULL::transactions,
+        p_transaction || jsonb_build_object('created_at', COALESCE(p_transaction->>'created_at', NOW()::TEXT))
+    )
+    RETURNING * INTO v_tx;
+    
+    INSERT INTO transaction_items
+    SELECT * FROM jsonb_populate_recordset(NULL::transaction_items, p_items);
+    
+    IF v_tx.customer_id IS NOT NULL THEN
+        v_balance := update_customer_points(
+            v_tx.customer_id,
+            COALESCE(v_tx.points_redeemed, 0),
+            COALESCE(v_tx.points_earned, 0),
+            v_tx.net_sales,
+            v_tx.id
+        );
+    END IF;
+    
+    WITH sold AS (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM jsonb_populate_recordset(NULL::transaction_items, p_items)
+        GROUP BY product_id
+    ), updated AS (
+        UPDATE products p SET
+            stock = p.stock - s.quantity,
+            updated_at = NOW()
+        FROM sold s
+        WHERE p.id = s.product_id
+          AND p.tenant_id = v_tx.tenant_id
+        RETURNING p.id, p.name, p.stock, p.stock + s.quantity AS old_stock, p.low_stock_threshold
+    )
+    INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload)
+    SELECT t.id, t.telegram_chat_id, 'LOW_STOCK', jsonb_build_object(
+        'product_id', u.id,
+        'name', u.name,
+        'stock', u.stock,
+        'threshold', th.threshold
+    )
+    FROM updated u
+    JOIN tenants t ON t.id = v_tx.tenant_id
+    CROSS JOIN LATERAL (SELECT COALESCE(u.low_stock_threshold, t.low_stock_threshold) AS threshold) th
+    WHERE t.telegram_chat_id IS NOT NULL
+      AND u.stock <= th.threshold
+      AND u.old_stock > th.threshold;
+    
+    INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload)
+    SELECT t.id, t.telegram_chat_id, 'LARGE_SALE', jsonb_build_object(
+        'invoice_no', v_tx.invoice_no,
+        'net_sales', v_tx.net_sales,
+        'payment_type', v_tx.payment_type
+    )
+    FROM tenants t
+    WHERE t.id = v_tx.tenant_id
+      AND t.telegram_chat_id IS NOT NULL
+      AND v_tx.net_sales >= t.large_sale_threshold;
+    
+    RETURN jsonb_build_object(
+        'id', v_tx.id,
+        'created_at', v_tx.created_at,
+        'points_balance', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Enqueue one end-of-day summary per tenant with a chat (idempotent per day)
+CREATE OR REPLACE FUNCTION enqueue_daily_summaries(
+    p_day DATE,
+    p_timezone TEXT DEFAULT 'Asia/Jakarta'
+)
+RETURNS INTEGER AS $$
+    WITH inserted AS (
+        INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload, dedupe_key)
+        SELECT t.id, t.telegram_chat_id, 'DAILY_SUMMARY', jsonb_build_object(
+            'day', p_day,
+            'transactions', COUNT(x.id),
+            'gross_sales', COALESCE(SUM(x.gross_sales), 0),
+            'discount_amount', COALESCE(SUM(x.discount_amount), 0),
+            'tax_amount', COALESCE(SUM(x.tax_amount), 0),
+            'net_sales', COALESCE(SUM(x.net_sales), 0)
+        ), p_day::TEXT
+        FROM tenants t
+        LEFT JOIN transactions x
+               ON x.tenant_id = t.id
+              AND x.payment_status = 'PAID'
+              AND x.created_at >= p_day::timestamp AT TIME ZONE p_timezone
+              AND x.created_at < (p_day + 1)::timestamp AT TIME ZONE p_timezone
+        WHERE t.telegram_chat_id IS NOT NULL
+        GROUP BY t.id, t.telegram_chat_id
+        ON CONFLICT (tenant_id, kind, dedupe_key) WHERE dedupe_key IS NOT NULL DO NOTHING
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM inserted;
+$$ LANGUAGE sql;
+
+-- Lease a batch of due notifications (safe with several dispatchers).
+-- The lease doubles as the retry time if the dispatcher dies mid-send.
+CREATE OR REPLACE FUNCTION claim_notifications(
+    p_limit INTEGER,
+    p_lease_seconds INTEGER DEFAULT 60
+)
+RETURNS SETOF notification_outbox AS $$
+    UPDATE notification_outbox o SET
+        attempts = o.attempts + 1,
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM notification_outbox
+        WHERE status = 'PENDING' AND next_attempt_at <= NOW()
+        ORDER BY id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+$$ LANGUAGE sql;
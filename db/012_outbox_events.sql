@@ -0,0 +1,259 @@
+-- KasirAI Database Schema
+-- Migration: 012_outbox_events
+
+-- ============ OUTBOX EVENTS ============
+-- Change events written in the same DB transaction as the change itself,
+-- tailed by the relay in src/jobs/outbox.py.
+--
+-- BIGSERIAL ids are handed out before commit, so a reader going by id
+-- alone can skip an event whose transaction commits late. Readers go by
+-- (txid, id) instead and only see transactions older than every one
+-- still running, so a cursor never passes an event that is not yet visible.
+-- No tenant FK: deleting a tenant cascades into product deletes, which
+-- emit events of their own.
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id BIGSERIAL PRIMARY KEY,
+    tenant_id UUID NOT NULL,
+    event_type VARCHAR(50) NOT NULL,  -- sale.finalized, product.created/updated/deleted, discount.used
+    aggregate_id UUID,
+    payload JSONB NOT NULL,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_events_cursor ON outbox_events(txid, id);
+CREATE INDEX IF NOT EXISTS idx_outbox_events_created ON outbox_events(created_at);
+
+-- One row per downstream consumer (relay sink): its cursor and the relay
+-- instance currently allowed to advance it
+CREATE TABLE IF NOT EXISTS outbox_consumers (
+    name VARCHAR(50) PRIMARY KEY,
+    last_txid BIGINT NOT NULL DEFAULT 0,
+    last_event_id BIGINT NOT NULL DEFAULT 0,
+    lease_owner VARCHAR(100),
+    lease_until TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE outbox_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE outbox_consumers ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for service role" ON outbox_events FOR ALL USING (true);
+CREATE POLICY "Allow all for service role" ON outbox_consumers FOR ALL USING (true);
+
+-- ============ TRIGGERS ============
+
+CREATE OR REPLACE FUNCTION emit_product_event()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+        VALUES (OLD.tenant_id, 'product.deleted', OLD.id, jsonb_build_object('id', OLD.id));
+        RETURN OLD;
+    END IF;
+    
+    INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+    VALUES (
+        NEW.tenant_id,
+        CASE TG_OP WHEN 'INSERT' THEN 'product.created' ELSE 'product.updated' END,
+        NEW.id,
+        to_jsonb(NEW)
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_outbox ON products;
+CREATE TRIGGER trg_products_outbox
+    AFTER INSERT OR DELETE ON products
+    FOR EACH ROW EXECUTE FUNCTION emit_product_event();
+
+DROP TRIGGER IF EXISTS trg_products_outbox_update ON products;
+CREATE TRIGGER trg_products_outbox_update
+    AFTER UPDATE ON products
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW)
+    EXECUTE FUNCTION emit_product_event();
+
+-- ============ FUNCTIONS ============
+
+-- Replaces 011 version: also counts discount usage and appends
+-- sale.finalized / discount.used events atomically with the sale.
+CREATE OR REPLACE FUNCTION finalize_sale(
+    p_transaction JSONB,
+    p_items JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tx transactions%ROWTYPE;
+    v_balance INTEGER;
+BEGIN
+    INSERT INTO transactions
+    SELECT * FROM jsonb_populate_record(
+        NULL::transactions,
+        p_transaction || jsonb_build_object('created_at', COALESCE(p_transaction->>'created_at', NOW()::TEXT))
+    )
+    RETURNING * INTO v_tx;
+    
+    INSERT INTO transaction_items
+    SELECT * FROM jsonb_populate_recordset(NULL::transaction_items, p_items);
+    
+    IF v_tx.customer_id IS NOT NULL THEN
+        v_balance := update_customer_points(
+            v_tx.customer_id,
+            COALESCE(v_tx.points_redeemed, 0),
+            COALESCE(v_tx.points_earned, 0),
+            v_tx.net_sales,
+            v_tx.id
+        );
+    END IF;
+    
+    WITH sold AS (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM jsonb_populate_recordset(NULL::transaction_items, p_items)
+        GROUP BY product_id
+    ), updated AS (
+        UPDATE products p SET
+            stock = p.stock - s.quantity,
+            updated_at = NOW()
+        FROM sold s
+        WHERE p.id = s.product_id
+          AND p.tenant_id = v_tx.tenant_id
+        RETURNING p.id, p.name, p.stock, p.stock + s.quantity AS old_stock, p.low_stock_threshold
+    )
+    INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload)
+    SELECT t.id, t.telegram_chat_id, 'LOW_STOCK', jsonb_build_object(
+        'product_id', u.id,
+        'name', u.name,
+        'stock', u.stock,
+        'threshold', th.threshold
+    )
+    FROM updated u
+    JOIN tenants t ON t.id = v_tx.tenant_id
+    CROSS JOIN LATERAL (SELECT COALESCE(u.low_stock_threshold, t.low_stock_threshold) AS threshold) th
+    WHERE t.telegram_chat_id IS NOT NULL
+      AND u.stock <= th.threshold
+      AND u.old_stock > th.threshold;
+    
+    INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload)
+    SELECT t.id, t.telegram_chat_id, 'LARGE_SALE', jsonb_build_object(
+        'invoice_no', v_tx.invoice_no,
+        'net_sales', v_tx.net_sales,
+        'payment_type', v_tx.payment_type
+    )
+    FROM tenants t
+    WHERE t.id = v_tx.tenant_id
+      AND t.telegram_chat_id IS NOT NULL
+      AND v_tx.net_sales >= t.large_sale_threshold;
+    
+    IF v_tx.discount_code IS NOT NULL THEN
+        WITH used AS (
+            UPDATE discounts SET usage_count = COALESCE(usage_count, 0) + 1
+            WHERE tenant_id = v_tx.tenant_id AND code = v_tx.discount_code
+            RETURNING id, code, usage_count, usage_limit
+        )
+        INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+        SELECT v_tx.tenant_id, 'discount.used', u.id, jsonb_build_object(
+            'code', u.code,
+            'transaction_id', v_tx.id,
+            'invoice_no', v_tx.invoice_no,
+            'discount_amount', v_tx.discount_amount,
+            'usage_count', u.usage_count,
+            'usage_limit', u.usage_limit
+        )
+        FROM used u;
+    END IF;
+    
+    INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+    VALUES (
+        v_tx.tenant_id,
+        'sale.finalized',
+        v_tx.id,
+        to_jsonb(v_tx) || jsonb_build_object('items', p_items)
+    );
+    
+    RETURN jsonb_build_object(
+        'id', v_tx.id,
+        'created_at', v_tx.created_at,
+        'points_balance', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Next ordered batch after a consumer's cursor
+CREATE OR REPLACE FUNCTION read_outbox_events(
+    p_after_txid BIGINT,
+    p_after_id BIGINT,
+    p_limit INTEGER
+)
+RETURNS SETOF outbox_events AS $$
+    SELECT * FROM outbox_events
+    WHERE (txid, id) > (p_after_txid, p_after_id)
+      AND txid < txid_snapshot_xmin(txid_current_snapshot())
+    ORDER BY txid, id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Take (or renew) the lease on a consumer; no row = another relay holds it
+CREATE OR REPLACE FUNCTION lease_outbox_consumer(
+    p_name VARCHAR,
+    p_owner VARCHAR,
+    p_lease_seconds INTEGER DEFAULT 30
+)
+RETURNS SETOF outbox_consumers AS $$
+BEGIN
+    INSERT INTO outbox_consumers (name) VALUES (p_name) ON CONFLICT (name) DO NOTHING;
+    
+    RETURN QUERY
+    UPDATE outbox_consumers SET
+        lease_owner = p_owner,
+        lease_until = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE name = p_name
+      AND (lease_owner IS NULL OR lease_owner = p_owner OR lease_until < NOW())
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Advance a consumer's cursor; FALSE if the lease was lost meanwhile
+CREATE OR REPLACE FUNCTION commit_outbox_offset(
+    p_name VARCHAR,
+    p_owner VARCHAR,
+    p_txid BIGINT,
+    p_event_id BIGINT
+)
+RETURNS BOOLEAN AS $$
+    WITH updated AS (
+        UPDATE outbox_consumers SET
+            last_txid = p_txid,
+            last_event_id = p_event_id,
+            updated_at = NOW()
+        WHERE name = p_name AND lease_owner = p_owner
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM updated);
+$$ LANGUAGE sql;
+
+-- Drop events older than p_before that every active consumer has passed.
+-- A consumer whose lease was last taken before p_active_since (a sink
+-- removed from outbox_sinks, a relay that stopped) no longer holds events
+-- back; if it comes back it resumes from its cursor past pruned events.
+DROP FUNCTION IF EXISTS prune_outbox_events(TIMESTAMPTZ);
+
+CREATE OR REPLACE FUNCTION prune_outbox_events(
+    p_before TIMESTAMPTZ,
+    p_active_since TIMESTAMPTZ
+)
+RETURNS INTEGER AS $$
+    WITH slowest AS (
+        SELECT last_txid, last_event_id FROM outbox_consumers
+        WHERE COALESCE(lease_until, updated_at) >= p_active_since
+        ORDER BY last_txid, last_event_id
+        LIMIT 1
+    ), deleted AS (
+        DELETE FROM outbox_events e
+        WHERE e.created_at < p_before
+          AND NOT EXISTS (
+              SELECT 1 FROM slowest s WHERE (e.txid, e.id) > (s.last_txid, s.last_event_id)
+          )
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM deleted;
+$$ LANGUAGE sql;
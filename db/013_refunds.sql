@@ -0,0 +1,275 @@
+-- KasirAI Database Schema
+-- Migration: 013_refunds
+
+-- ============ STATUSES ============
+ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_payment_status_check;
+ALTER TABLE transactions ADD CONSTRAINT transactions_payment_status_check
+    CHECK (payment_status IN ('PENDING', 'PAID', 'FAILED', 'PARTIALLY_REFUNDED', 'REFUNDED', 'VOIDED'));
+
+-- RESTORED: redeemed points given back; REVERSED: earned points taken back
+ALTER TABLE point_ledger DROP CONSTRAINT IF EXISTS point_ledger_type_check;
+ALTER TABLE point_ledger ADD CONSTRAINT point_ledger_type_check
+    CHECK (type IN ('EARNED', 'REDEEMED', 'ADJUSTED', 'EXPIRED', 'RESTORED', 'REVERSED'));
+
+-- ============ REFUND TRACKING ============
+-- Nullable like the other amount columns: finalize_sale inserts through
+-- jsonb_populate_record, which leaves omitted columns NULL
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS refunded_amount DECIMAL(15,2) DEFAULT 0;
+
+ALTER TABLE transaction_items ADD COLUMN IF NOT EXISTS refunded_quantity INTEGER DEFAULT 0;
+ALTER TABLE transaction_items DROP CONSTRAINT IF EXISTS transaction_items_refunded_quantity_check;
+ALTER TABLE transaction_items ADD CONSTRAINT transaction_items_refunded_quantity_check
+    CHECK (refunded_quantity BETWEEN 0 AND quantity);
+
+-- ============ CREDIT NOTES ============
+-- One row per refund / void (nota retur for Coretax); amounts follow the
+-- CalculationEngine order and are positive (amounts given back)
+CREATE TABLE IF NOT EXISTS credit_notes (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    transaction_id UUID NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
+    credit_note_no VARCHAR(50) UNIQUE NOT NULL,
+    kind VARCHAR(10) NOT NULL CHECK (kind IN ('REFUND', 'VOID')),
+    user_id UUID NOT NULL REFERENCES users(id),
+    reason TEXT,
+    
+    gross_sales DECIMAL(15,2) NOT NULL,
+    discount_amount DECIMAL(15,2) NOT NULL DEFAULT 0,
+    points_value DECIMAL(15,2) NOT NULL DEFAULT 0,
+    dpp DECIMAL(15,2) NOT NULL,
+    tax_rate DECIMAL(5,2) NOT NULL,
+    tax_amount DECIMAL(15,2) NOT NULL,
+    total_amount DECIMAL(15,2) NOT NULL,
+    
+    points_restored INTEGER NOT NULL DEFAULT 0,
+    points_reversed INTEGER NOT NULL DEFAULT 0,
+    restocked BOOLEAN NOT NULL DEFAULT TRUE,
+    
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_credit_notes_tenant_date ON credit_notes(tenant_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_credit_notes_transaction ON credit_notes(transaction_id);
+
+CREATE TABLE IF NOT EXISTS credit_note_items (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    credit_note_id UUID NOT NULL REFERENCES credit_notes(id) ON DELETE CASCADE,
+    transaction_item_id UUID NOT NULL REFERENCES transaction_items(id) ON DELETE CASCADE,
+    product_id UUID NOT NULL REFERENCES products(id),
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    unit_price DECIMAL(15,2) NOT NULL,
+    subtotal DECIMAL(15,2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_credit_note_items_note ON credit_note_items(credit_note_id);
+
+ALTER TABLE credit_notes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE credit_note_items ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for service role" ON credit_notes FOR ALL USING (true);
+CREATE POLICY "Allow all for service role" ON credit_note_items FOR ALL USING (true);
+
+-- ============ FUNCTIONS ============
+
+-- Reverse (part of) a sale in one DB transaction: credit note + items,
+-- refunded quantities, stock, customer points / lifetime spend, discount
+-- usage and sale status. Amounts are computed by the API (CalculationEngine);
+-- p_items carries each line's refunded_quantity as the API saw it, so a
+-- concurrent refund of the same sale fails with 'Refund conflict' instead
+-- of reversing twice.
+--
+-- p_items: [{"transaction_item_id", "quantity", "expected_refunded"}, ...]
+CREATE OR REPLACE FUNCTION refund_sale(
+    p_transaction_id UUID,
+    p_credit_note JSONB,
+    p_items JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tx transactions%ROWTYPE;
+    v_note credit_notes%ROWTYPE;
+    v_points INTEGER;
+    v_reversed INTEGER := 0;
+    v_balance INTEGER;
+    v_lines INTEGER;
+    v_status VARCHAR(20);
+BEGIN
+    SELECT * INTO v_tx FROM transactions WHERE id = p_transaction_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Transaction not found: %', p_transaction_id;
+    END IF;
+    
+    IF p_credit_note->>'kind' = 'VOID' THEN
+        IF v_tx.payment_status NOT IN ('PENDING', 'PAID') OR COALESCE(v_tx.refunded_amount, 0) > 0 THEN
+            RAISE EXCEPTION 'Sale cannot be voided in status %', v_tx.payment_status;
+        END IF;
+    ELSIF v_tx.payment_status NOT IN ('PAID', 'PARTIALLY_REFUNDED') THEN
+        RAISE EXCEPTION 'Sale cannot be refunded in status %', v_tx.payment_status;
+    END IF;
+    
+    v_note := jsonb_populate_record(
+        NULL::credit_notes,
+        p_credit_note || jsonb_build_object('tenant_id', v_tx.tenant_id, 'transaction_id', v_tx.id, 'created_at', NOW())
+    );
+    
+    -- Redeemed points come back in full; earned points are taken back only
+    -- as far as the balance allows (they may already be spent)
+    IF v_tx.customer_id IS NOT NULL THEN
+        SELECT points INTO v_points FROM customers WHERE id = v_tx.customer_id FOR UPDATE;
+        v_reversed := LEAST(v_note.points_reversed, v_points + v_note.points_restored);
+        v_balance := v_points + v_note.points_restored - v_reversed;
+        
+        UPDATE customers SET
+            points = v_balance,
+            lifetime_spent = GREATEST(lifetime_spent - v_note.total_amount, 0),
+            lifetime_points = GREATEST(lifetime_points - v_reversed, 0),
+            updated_at = NOW()
+        WHERE id = v_tx.customer_id;
+        
+        INSERT INTO point_ledger (customer_id, transaction_id, type, points, balance, description)
+        SELECT v_tx.customer_id, v_tx.id, e.type, e.points, e.balance, e.description
+        FROM (VALUES
+            ('RESTORED', v_note.points_restored, v_points + v_note.points_restored, 'Redeemed points returned (' || v_note.credit_note_no || ')'),
+            ('REVERSED', -v_reversed, v_balance, 'Earned points reversed (' || v_note.credit_note_no || ')')
+        ) AS e(type, points, balance, description)
+        WHERE e.points <> 0;
+    END IF;
+    v_note.points_reversed := v_reversed;
+    
+    INSERT INTO credit_notes SELECT v_note.*;
+    
+    WITH requested AS (
+        SELECT * FROM jsonb_to_recordset(p_items)
+            AS r(transaction_item_id UUID, quantity INTEGER, expected_refunded INTEGER)
+    ), refunded AS (
+        UPDATE transaction_items ti SET
+            refunded_quantity = COALESCE(ti.refunded_quantity, 0) + r.quantity
+        FROM requested r
+        WHERE ti.id = r.transaction_item_id
+          AND ti.transaction_id = v_tx.id
+          AND COALESCE(ti.refunded_quantity, 0) = r.expected_refunded
+          AND COALESCE(ti.refunded_quantity, 0) + r.quantity <= ti.quantity
+        RETURNING ti.id, ti.product_id, r.quantity, ti.unit_price
+    ), noted AS (
+        INSERT INTO credit_note_items (credit_note_id, transaction_item_id, product_id, quantity, unit_price, subtotal)
+        SELECT v_note.id, f.id, f.product_id, f.quantity, f.unit_price, f.unit_price * f.quantity
+        FROM refunded f
+        RETURNING 1
+    ), restocked AS (
+        UPDATE products p SET
+            stock = p.stock + s.quantity,
+            updated_at = NOW()
+        FROM (SELECT product_id, SUM(quantity) AS quantity FROM refunded GROUP BY product_id) s
+        WHERE v_note.restocked AND p.id = s.product_id
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO v_lines FROM refunded;
+    
+    IF v_lines <> jsonb_array_length(p_items) THEN
+        RAISE EXCEPTION 'Refund conflict: sale % changed, reload and retry', v_tx.invoice_no;
+    END IF;
+    
+    IF EXISTS (
+        SELECT 1 FROM transaction_items
+        WHERE transaction_id = v_tx.id AND COALESCE(refunded_quantity, 0) < quantity
+    ) THEN
+        v_status := 'PARTIALLY_REFUNDED';
+    ELSE
+        v_status := CASE v_note.kind WHEN 'VOID' THEN 'VOIDED' ELSE 'REFUNDED' END;
+        
+        -- Fully reversed sale no longer counts against the code's usage limit
+        IF v_tx.discount_code IS NOT NULL THEN
+            UPDATE discounts SET usage_count = GREATEST(COALESCE(usage_count, 0) - 1, 0)
+            WHERE tenant_id = v_tx.tenant_id AND code = v_tx.discount_code;
+        END IF;
+    END IF;
+    
+    UPDATE transactions SET
+        payment_status = v_status,
+        refunded_amount = COALESCE(refunded_amount, 0) + v_note.total_amount
+    WHERE id = v_tx.id;
+    
+    INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+    VALUES (
+        v_tx.tenant_id,
+        CASE v_note.kind WHEN 'VOID' THEN 'sale.voided' ELSE 'sale.refunded' END,
+        v_tx.id,
+        to_jsonb(v_note) || jsonb_build_object('invoice_no', v_tx.invoice_no, 'payment_status', v_status, 'items', p_items)
+    );
+    
+    RETURN jsonb_build_object(
+        'id', v_note.id,
+        'created_at', v_note.created_at,
+        'payment_status', v_status,
+        'points_reversed', v_reversed,
+        'points_balance', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replaces 010 version: refunded units no longer count as demand
+CREATE OR REPLACE FUNCTION daily_product_sales(
+    p_tenant_id UUID,
+    p_start DATE,
+    p_days INTEGER,
+    p_timezone TEXT DEFAULT 'Asia/Jakarta'
+)
+RETURNS TABLE (product_id UUID, quantities INTEGER[]) AS $$
+    WITH daily AS (
+        SELECT ti.product_id,
+               (t.created_at AT TIME ZONE p_timezone)::date - p_start AS day,
+               SUM(ti.quantity - COALESCE(ti.refunded_quantity, 0))::INTEGER AS quantity
+        FROM transactions t
+        JOIN transaction_items ti ON ti.transaction_id = t.id
+        WHERE t.tenant_id = p_tenant_id
+          AND t.created_at >= p_start::timestamp AT TIME ZONE p_timezone
+          AND t.created_at < (p_start + p_days)::timestamp AT TIME ZONE p_timezone
+          AND t.payment_status NOT IN ('FAILED', 'REFUNDED', 'VOIDED')
+        GROUP BY 1, 2
+    )
+    SELECT p.product_id,
+           array_agg(COALESCE(d.quantity, 0) ORDER BY g.day)
+    FROM (SELECT DISTINCT daily.product_id FROM daily) p
+    CROSS JOIN generate_series(0, p_days - 1) AS g(day)
+    LEFT JOIN daily d ON d.product_id = p.product_id AND d.day = g.day
+    GROUP BY p.product_id
+    ORDER BY p.product_id;
+$$ LANGUAGE sql STABLE;
+
+-- Replaces 011 version: partially refunded sales still count, and the
+-- day's credit notes are reported as refunds
+CREATE OR REPLACE FUNCTION enqueue_daily_summaries(
+    p_day DATE,
+    p_timezone TEXT DEFAULT 'Asia/Jakarta'
+)
+RETURNS INTEGER AS $$
+    WITH refunds AS (
+        SELECT tenant_id, SUM(total_amount) AS amount
+        FROM credit_notes
+        WHERE created_at >= p_day::timestamp AT TIME ZONE p_timezone
+          AND created_at < (p_day + 1)::timestamp AT TIME ZONE p_timezone
+        GROUP BY tenant_id
+    ), inserted AS (
+        INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload, dedupe_key)
+        SELECT t.id, t.telegram_chat_id, 'DAILY_SUMMARY', jsonb_build_object(
+            'day', p_day,
+            'transactions', COUNT(x.id),
+            'gross_sales', COALESCE(SUM(x.gross_sales), 0),
+            'discount_amount', COALESCE(SUM(x.discount_amount), 0),
+            'tax_amount', COALESCE(SUM(x.tax_amount), 0),
+            'net_sales', COALESCE(SUM(x.net_sales), 0),
+            'refunds', COALESCE(MAX(r.amount), 0)
+        ), p_day::TEXT
+        FROM tenants t
+        LEFT JOIN transactions x
+               ON x.tenant_id = t.id
+              AND x.payment_status IN ('PAID', 'PARTIALLY_REFUNDED', 'REFUNDED')
+              AND x.created_at >= p_day::timestamp AT TIME ZONE p_timezone
+              AND x.created_at < (p_day + 1)::timestamp AT TIME ZONE p_timezone
+        LEFT JOIN refunds r ON r.tenant_id = t.id
+        WHERE t.telegram_chat_id IS NOT NULL
+        GROUP BY t.id, t.telegram_chat_id
+        ON CONFLICT (tenant_id, kind, dedupe_key) WHERE dedupe_key IS NOT NULL DO NOTHING
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM inserted;
+$$ LANGUAGE sql;
@@ -0,0 +1,277 @@
+-- KasirAI Database Schema
+-- Migration: 014_shifts
+
+-- ============ SHIFTS ============
+-- One cashier session (open -> close). Sales and refunds are attached to
+-- the user's open shift by trigger; without an open shift they stay NULL.
+CREATE TABLE IF NOT EXISTS shifts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id),
+    terminal_id VARCHAR(50),
+    status VARCHAR(10) NOT NULL DEFAULT 'OPEN' CHECK (status IN ('OPEN', 'CLOSED')),
+    
+    opening_cash DECIMAL(15,2) NOT NULL DEFAULT 0,
+    expected_cash DECIMAL(15,2),  -- set at close
+    counted_cash DECIMAL(15,2),
+    cash_difference DECIMAL(15,2),  -- counted - expected
+    notes TEXT,
+    
+    opened_at TIMESTAMPTZ DEFAULT NOW(),
+    closed_at TIMESTAMPTZ
+);
+
+-- At most one open shift per cashier; also the lookup used by the triggers
+CREATE UNIQUE INDEX IF NOT EXISTS uq_shifts_open_user
+    ON shifts(tenant_id, user_id)
+    WHERE status = 'OPEN';
+
+CREATE INDEX IF NOT EXISTS idx_shifts_tenant_opened ON shifts(tenant_id, opened_at);
+
+-- Running totals per shift and payment type, maintained at finalize /
+-- refund time so closing a shift never scans the day's transactions
+CREATE TABLE IF NOT EXISTS shift_totals (
+    shift_id UUID NOT NULL REFERENCES shifts(id) ON DELETE CASCADE,
+    payment_type VARCHAR(20) NOT NULL,
+    
+    sales_count INTEGER NOT NULL DEFAULT 0,
+    gross_sales DECIMAL(15,2) NOT NULL DEFAULT 0,
+    discount_amount DECIMAL(15,2) NOT NULL DEFAULT 0,
+    points_redeemed INTEGER NOT NULL DEFAULT 0,
+    points_value DECIMAL(15,2) NOT NULL DEFAULT 0,
+    tax_amount DECIMAL(15,2) NOT NULL DEFAULT 0,
+    net_sales DECIMAL(15,2) NOT NULL DEFAULT 0,
+    refund_count INTEGER NOT NULL DEFAULT 0,
+    refund_amount DECIMAL(15,2) NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (shift_id, payment_type)
+);
+
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS shift_id UUID REFERENCES shifts(id);
+ALTER TABLE credit_notes ADD COLUMN IF NOT EXISTS shift_id UUID REFERENCES shifts(id);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_shift ON transactions(shift_id) WHERE shift_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_credit_notes_shift ON credit_notes(shift_id) WHERE shift_id IS NOT NULL;
+
+ALTER TABLE shifts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE shift_totals ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for service role" ON shifts FOR ALL USING (true);
+CREATE POLICY "Allow all for service role" ON shift_totals FOR ALL USING (true);
+
+-- ============ TRIGGERS ============
+
+-- Attach sales / credit notes to the user's open shift.
+-- FOR SHARE holds the shift open until this sale commits: close_shift
+-- (FOR UPDATE) waits for sales in flight, and a sale arriving while the
+-- shift closes waits for the close. After that wait the row is re-read and
+-- status = 'OPEN' re-checked, so the sale stays unassigned instead of
+-- joining a shift whose expected_cash is already frozen.
+CREATE OR REPLACE FUNCTION assign_open_shift()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.shift_id IS NULL THEN
+        SELECT s.id INTO NEW.shift_id
+        FROM shifts s
+        WHERE s.tenant_id = NEW.tenant_id
+          AND s.user_id = NEW.user_id
+          AND s.status = 'OPEN'
+        FOR SHARE;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transactions_shift ON transactions;
+CREATE TRIGGER trg_transactions_shift
+    BEFORE INSERT ON transactions
+    FOR EACH ROW EXECUTE FUNCTION assign_open_shift();
+
+DROP TRIGGER IF EXISTS trg_credit_notes_shift ON credit_notes;
+CREATE TRIGGER trg_credit_notes_shift
+    BEFORE INSERT ON credit_notes
+    FOR EACH ROW EXECUTE FUNCTION assign_open_shift();
+
+-- A finalized sale adds to its shift's totals; a gateway payment that
+-- later fails (PENDING -> FAILED) takes itself back out
+CREATE OR REPLACE FUNCTION accumulate_shift_sale()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_sign INTEGER := CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END;
+BEGIN
+    IF NEW.shift_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+    
+    INSERT INTO shift_totals AS st (
+        shift_id, payment_type, sales_count, gross_sales, discount_amount,
+        points_redeemed, points_value, tax_amount, net_sales
+    )
+    VALUES (
+        NEW.shift_id,
+        NEW.payment_type,
+        v_sign,
+        v_sign * NEW.gross_sales,
+        v_sign * COALESCE(NEW.discount_amount, 0),
+        v_sign * COALESCE(NEW.points_redeemed, 0),
+        v_sign * COALESCE(NEW.points_value, 0),
+        v_sign * NEW.tax_amount,
+        v_sign * NEW.net_sales
+    )
+    ON CONFLICT (shift_id, payment_type) DO UPDATE SET
+        sales_count = st.sales_count + EXCLUDED.sales_count,
+        gross_sales = st.gross_sales + EXCLUDED.gross_sales,
+        discount_amount = st.discount_amount + EXCLUDED.discount_amount,
+        points_redeemed = st.points_redeemed + EXCLUDED.points_redeemed,
+        points_value = st.points_value + EXCLUDED.points_value,
+        tax_amount = st.tax_amount + EXCLUDED.tax_amount,
+        net_sales = st.net_sales + EXCLUDED.net_sales;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transactions_shift_totals ON transactions;
+CREATE TRIGGER trg_transactions_shift_totals
+    AFTER INSERT ON transactions
+    FOR EACH ROW EXECUTE FUNCTION accumulate_shift_sale();
+
+DROP TRIGGER IF EXISTS trg_transactions_shift_failed ON transactions;
+CREATE TRIGGER trg_transactions_shift_failed
+    AFTER UPDATE OF payment_status ON transactions
+    FOR EACH ROW
+    WHEN (OLD.payment_status = 'PENDING' AND NEW.payment_status = 'FAILED')
+    EXECUTE FUNCTION accumulate_shift_sale();
+
+-- Refunds count against the shift of the cashier who paid them out,
+-- under the payment type of the original sale
+CREATE OR REPLACE FUNCTION accumulate_shift_refund()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.shift_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+    
+    INSERT INTO shift_totals AS st (shift_id, payment_type, refund_count, refund_amount)
+    SELECT NEW.shift_id, t.payment_type, 1, NEW.total_amount
+    FROM transactions t
+    WHERE t.id = NEW.transaction_id
+    ON CONFLICT (shift_id, payment_type) DO UPDATE SET
+        refund_count = st.refund_count + 1,
+        refund_amount = st.refund_amount + EXCLUDED.refund_amount;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_credit_notes_shift_totals ON credit_notes;
+CREATE TRIGGER trg_credit_notes_shift_totals
+    AFTER INSERT ON credit_notes
+    FOR EACH ROW EXECUTE FUNCTION accumulate_shift_refund();
+
+-- ============ FUNCTIONS ============
+
+-- Close a shift: expected drawer = opening cash + cash sales - cash refunds,
+-- read from the running totals (no transaction scan)
+CREATE OR REPLACE FUNCTION close_shift(
+    p_shift_id UUID,
+    p_counted_cash DECIMAL,
+    p_notes TEXT DEFAULT NULL
+)
+RETURNS shifts AS $$
+DECLARE
+    v_shift shifts%ROWTYPE;
+    v_expected DECIMAL(15,2);
+BEGIN
+    SELECT * INTO v_shift FROM shifts WHERE id = p_shift_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Shift not found: %', p_shift_id;
+    END IF;
+    IF v_shift.status <> 'OPEN' THEN
+        RAISE EXCEPTION 'Shift already closed: %', p_shift_id;
+    END IF;
+    
+    SELECT v_shift.opening_cash + COALESCE(SUM(net_sales - refund_amount), 0) INTO v_expected
+    FROM shift_totals
+    WHERE shift_id = p_shift_id AND payment_type = 'CASH';
+    
+    UPDATE shifts SET
+        status = 'CLOSED',
+        expected_cash = v_expected,
+        counted_cash = p_counted_cash,
+        cash_difference = p_counted_cash - v_expected,
+        notes = COALESCE(p_notes, notes),
+        closed_at = NOW()
+    WHERE id = p_shift_id
+    RETURNING * INTO v_shift;
+    
+    RETURN v_shift;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute a shift's totals from transactions and credit notes.
+-- Returns payment types whose stored totals drifted; p_apply = FALSE is a dry run.
+CREATE OR REPLACE FUNCTION rebuild_shift_totals(
+    p_shift_id UUID,
+    p_apply BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (payment_type VARCHAR, stored_net_sales DECIMAL, computed_net_sales DECIMAL) AS $$
+#variable_conflict use_column
+BEGIN
+    CREATE TEMP TABLE _computed ON COMMIT DROP AS
+    WITH sales AS (
+        SELECT t.payment_type,
+               COUNT(*)::INTEGER AS sales_count,
+               SUM(t.gross_sales) AS gross_sales,
+               SUM(COALESCE(t.discount_amount, 0)) AS discount_amount,
+               SUM(COALESCE(t.points_redeemed, 0))::INTEGER AS points_redeemed,
+               SUM(COALESCE(t.points_value, 0)) AS points_value,
+               SUM(t.tax_amount) AS tax_amount,
+               SUM(t.net_sales) AS net_sales
+        FROM transactions t
+        WHERE t.shift_id = p_shift_id AND t.payment_status <> 'FAILED'
+        GROUP BY t.payment_type
+    ), refunds AS (
+        SELECT t.payment_type,
+               COUNT(*)::INTEGER AS refund_count,
+               SUM(n.total_amount) AS refund_amount
+        FROM credit_notes n
+        JOIN transactions t ON t.id = n.transaction_id
+        WHERE n.shift_id = p_shift_id
+        GROUP BY t.payment_type
+    )
+    SELECT COALESCE(s.payment_type, r.payment_type) AS payment_type,
+           COALESCE(s.sales_count, 0) AS sales_count,
+           COALESCE(s.gross_sales, 0) AS gross_sales,
+           COALESCE(s.discount_amount, 0) AS discount_amount,
+           COALESCE(s.points_redeemed, 0) AS points_redeemed,
+           COALESCE(s.points_value, 0) AS points_value,
+           COALESCE(s.tax_amount, 0) AS tax_amount,
+           COALESCE(s.net_sales, 0) AS net_sales,
+           COALESCE(r.refund_count, 0) AS refund_count,
+           COALESCE(r.refund_amount, 0) AS refund_amount
+    FROM sales s
+    FULL JOIN refunds r ON r.payment_type = s.payment_type;
+    
+    RETURN QUERY
+    SELECT COALESCE(c.payment_type, st.payment_type)::VARCHAR, st.net_sales, c.net_sales
+    FROM _computed c
+    FULL JOIN (SELECT * FROM shift_totals WHERE shift_id = p_shift_id) st
+           ON st.payment_type = c.payment_type
+    WHERE (c.sales_count, c.gross_sales, c.discount_amount, c.points_redeemed, c.points_value,
+           c.tax_amount, c.net_sales, c.refund_count, c.refund_amount)
+          IS DISTINCT FROM
+          (st.sales_count, st.gross_sales, st.discount_amount, st.points_redeemed, st.points_value,
+           st.tax_amount, st.net_sales, st.refund_count, st.refund_amount)
+      -- A fully reversed payment type leaves an all-zero row behind; not drift
+      AND NOT (c.payment_type IS NULL AND st.sales_count = 0 AND st.refund_count = 0);
+    
+    IF p_apply THEN
+        DELETE FROM shift_totals WHERE shift_id = p_shift_id;
+        INSERT INTO shift_totals (
+            shift_id, payment_type, sales_count, gross_sales, discount_amount, points_redeemed,
+            points_value, tax_amount, net_sales, refund_count, refund_amount
+        )
+        SELECT p_shift_id, c.* FROM _computed c;
+    END IF;
+    
+    DROP TABLE _computed;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,455 @@
+-- KasirAI Database Schema
+-- Migration: 015_partitioning
+
+-- transactions and transaction_items become RANGE partitioned by month
+-- (UTC) on created_at. Items carry a copy of their sale's created_at so
+-- both tables share partition bounds and date-ranged queries prune both.
+-- Cold months are detached into the `archive` schema, exported to
+-- Parquet (src/jobs/partitions.py) and then dropped.
+--
+-- Partitioned tables cannot hold single-column unique keys, so:
+-- - primary keys become (id, created_at)
+-- - invoice numbers stay globally unique through invoice_numbers
+-- - point_ledger / credit_notes / credit_note_items no longer carry a FK
+--   to the sale: they outlive its archived partition
+
+-- ============ INVOICE NUMBERS ============
+CREATE TABLE IF NOT EXISTS invoice_numbers (
+    invoice_no VARCHAR(50) PRIMARY KEY,
+    tenant_id UUID NOT NULL,
+    transaction_id UUID NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL
+);
+
+ALTER TABLE invoice_numbers ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for service role" ON invoice_numbers FOR ALL USING (true);
+
+-- Credit notes keep the original invoice number (Coretax nota retur)
+ALTER TABLE credit_notes ADD COLUMN IF NOT EXISTS invoice_no VARCHAR(50);
+
+UPDATE credit_notes n SET invoice_no = t.invoice_no
+FROM transactions t
+WHERE t.id = n.transaction_id AND n.invoice_no IS NULL;
+
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- ============ PARTITION MANAGEMENT ============
+
+-- Create the month's partitions of both tables; FALSE if they already exist
+CREATE OR REPLACE FUNCTION create_transaction_partition(p_month DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_suffix TEXT := to_char(v_start, '"y"YYYY"m"MM');
+    v_from TIMESTAMPTZ := v_start::TIMESTAMP AT TIME ZONE 'UTC';
+    v_to TIMESTAMPTZ := (v_start + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'UTC';
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('transaction_partitions'));
+    
+    IF to_regclass('public.transactions_' || v_suffix) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    IF to_regclass('archive.transactions_' || v_suffix) IS NOT NULL THEN
+        RAISE EXCEPTION 'Month % is archived', v_start;
+    END IF;
+    
+    EXECUTE format(
+        'CREATE TABLE public.%I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+        'transactions_' || v_suffix, v_from, v_to
+    );
+    EXECUTE format(
+        'CREATE TABLE public.%I PARTITION OF transaction_items FOR VALUES FROM (%L) TO (%L)',
+        'transaction_items_' || v_suffix, v_from, v_to
+    );
+    -- Reached through the parents; no policies, so no direct REST access
+    EXECUTE format('ALTER TABLE public.%I ENABLE ROW LEVEL SECURITY', 'transactions_' || v_suffix);
+    EXECUTE format('ALTER TABLE public.%I ENABLE ROW LEVEL SECURITY', 'transaction_items_' || v_suffix);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Current month plus p_months_ahead; run daily (src.jobs.partitions ensure,
+-- or pg_cron: SELECT cron.schedule('0 1 * * *', 'SELECT ensure_transaction_partitions()'))
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        IF create_transaction_partition((date_trunc('month', NOW() AT TIME ZONE 'UTC') + i * INTERVAL '1 month')::DATE) THEN
+            v_created := v_created + 1;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Attached and archived months with row counts (estimates while attached)
+CREATE OR REPLACE FUNCTION list_transaction_partitions()
+RETURNS TABLE (month DATE, status TEXT, transactions_rows BIGINT, items_rows BIGINT) AS $$
+    SELECT to_date(substring(c.relname FROM 15 FOR 4) || substring(c.relname FROM 20 FOR 2), 'YYYYMM'),
+           CASE n.nspname WHEN 'public' THEN 'attached' ELSE 'archived' END,
+           GREATEST(c.reltuples, 0)::BIGINT,
+           GREATEST(i.reltuples, 0)::BIGINT
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_class i
+           ON i.relnamespace = c.relnamespace
+          AND i.relname = 'transaction_items_' || substring(c.relname FROM 14)
+    WHERE n.nspname IN ('public', 'archive')
+      AND c.relkind = 'r'
+      AND c.relname ~ '^transactions_y[0-9]{4}m[0-9]{2}$'
+    ORDER BY 1;
+$$ LANGUAGE sql STABLE;
+
+-- Detach a closed month from both parents and move it to `archive`.
+-- Items go first: the composite FK blocks detaching a sale partition
+-- that items still reference.
+CREATE OR REPLACE FUNCTION detach_transaction_partition(p_month DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_suffix TEXT := to_char(v_start, '"y"YYYY"m"MM');
+BEGIN
+    IF v_start >= date_trunc('month', NOW() AT TIME ZONE 'UTC')::DATE THEN
+        RAISE EXCEPTION 'Month % is still open', v_start;
+    END IF;
+    IF to_regclass('public.transactions_' || v_suffix) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+    
+    EXECUTE format('ALTER TABLE transaction_items DETACH PARTITION public.%I', 'transaction_items_' || v_suffix);
+    EXECUTE format('ALTER TABLE public.%I DROP CONSTRAINT IF EXISTS transaction_items_transaction_fkey', 'transaction_items_' || v_suffix);
+    EXECUTE format('ALTER TABLE transactions DETACH PARTITION public.%I', 'transactions_' || v_suffix);
+    
+    EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', 'transaction_items_' || v_suffix);
+    EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', 'transactions_' || v_suffix);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Column types and exact row counts of an archived month (export manifest)
+CREATE OR REPLACE FUNCTION archived_partition_manifest(p_month DATE)
+RETURNS JSONB AS $$
+DECLARE
+    v_suffix TEXT := to_char(date_trunc('month', p_month), '"y"YYYY"m"MM');
+    v_table TEXT;
+    v_rows BIGINT;
+    v_manifest JSONB := '{}'::JSONB;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['transactions', 'transaction_items'] LOOP
+        IF to_regclass('archive.' || v_table || '_' || v_suffix) IS NULL THEN
+            RAISE EXCEPTION 'Month % is not archived', p_month;
+        END IF;
+        EXECUTE format('SELECT COUNT(*) FROM archive.%I', v_table || '_' || v_suffix) INTO v_rows;
+        v_manifest := v_manifest || jsonb_build_object(v_table, jsonb_build_object(
+            'rows', v_rows,
+            'columns', (
+                SELECT jsonb_agg(jsonb_build_object(
+                    'name', c.column_name,
+                    'type', c.data_type,
+                    'precision', c.numeric_precision,
+                    'scale', c.numeric_scale
+                ) ORDER BY c.ordinal_position)
+                FROM information_schema.columns c
+                WHERE c.table_schema = 'archive' AND c.table_name = v_table || '_' || v_suffix
+            )
+        ));
+    END LOOP;
+    RETURN v_manifest;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Keyset page of an archived month, ordered by id
+CREATE OR REPLACE FUNCTION read_archived_rows(
+    p_table TEXT,
+    p_month DATE,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 5000
+)
+RETURNS SETOF JSONB AS $$
+BEGIN
+    IF p_table NOT IN ('transactions', 'transaction_items') THEN
+        RAISE EXCEPTION 'Unknown archived table: %', p_table;
+    END IF;
+    RETURN QUERY EXECUTE format(
+        'SELECT to_jsonb(t) FROM archive.%I t WHERE $1 IS NULL OR t.id > $1 ORDER BY t.id LIMIT $2',
+        p_table || '_' || to_char(date_trunc('month', p_month), '"y"YYYY"m"MM')
+    ) USING p_after_id, p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Drop an archived month once its export is safely stored
+CREATE OR REPLACE FUNCTION drop_archived_partition(p_month DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_suffix TEXT := to_char(date_trunc('month', p_month), '"y"YYYY"m"MM');
+BEGIN
+    IF to_regclass('archive.transactions_' || v_suffix) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('DROP TABLE archive.%I', 'transaction_items_' || v_suffix);
+    EXECUTE format('DROP TABLE archive.%I', 'transactions_' || v_suffix);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============ MIGRATION ============
+-- One statement, so the swap is all-or-nothing; skipped once partitioned
+DO $$
+DECLARE
+    v_month DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'public.transactions'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+    
+    ALTER TABLE point_ledger DROP CONSTRAINT IF EXISTS point_ledger_transaction_id_fkey;
+    ALTER TABLE credit_notes DROP CONSTRAINT IF EXISTS credit_notes_transaction_id_fkey;
+    ALTER TABLE credit_note_items DROP CONSTRAINT IF EXISTS credit_note_items_transaction_item_id_fkey;
+    
+    -- Free the names the partitioned tables take over
+    ALTER TABLE transactions RENAME TO transactions_unpartitioned;
+    ALTER TABLE transaction_items RENAME TO transaction_items_unpartitioned;
+    ALTER TABLE transaction_items_unpartitioned DROP CONSTRAINT transaction_items_transaction_id_fkey;
+    ALTER TABLE transaction_items_unpartitioned DROP CONSTRAINT transaction_items_pkey;
+    ALTER TABLE transactions_unpartitioned DROP CONSTRAINT transactions_pkey;
+    ALTER TABLE transactions_unpartitioned DROP CONSTRAINT IF EXISTS transactions_invoice_no_key;
+    DROP INDEX IF EXISTS idx_transactions_tenant, idx_transactions_date, idx_transactions_customer,
+        idx_transactions_invoice, idx_transactions_pending, idx_transactions_shift, idx_transaction_items_tx;
+    
+    UPDATE transactions_unpartitioned SET created_at = COALESCE(paid_at, NOW()) WHERE created_at IS NULL;
+    
+    CREATE TABLE transactions (
+        LIKE transactions_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+    ) PARTITION BY RANGE (created_at);
+    ALTER TABLE transactions
+        ALTER COLUMN created_at SET NOT NULL,
+        ADD PRIMARY KEY (id, created_at),
+        ADD FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE,
+        ADD FOREIGN KEY (user_id) REFERENCES users(id),
+        ADD FOREIGN KEY (customer_id) REFERENCES customers(id),
+        ADD FOREIGN KEY (shift_id) REFERENCES shifts(id);
+    
+    CREATE TABLE transaction_items (
+        LIKE transaction_items_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+        created_at TIMESTAMPTZ NOT NULL  -- the sale's created_at
+    ) PARTITION BY RANGE (created_at);
+    ALTER TABLE transaction_items
+        ADD PRIMARY KEY (id, created_at),
+        ADD FOREIGN KEY (product_id) REFERENCES products(id),
+        ADD CONSTRAINT transaction_items_transaction_fkey FOREIGN KEY (transaction_id, created_at)
+            REFERENCES transactions(id, created_at) ON DELETE CASCADE;
+    
+    v_month := COALESCE(
+        (SELECT date_trunc('month', MIN(created_at) AT TIME ZONE 'UTC')::DATE FROM transactions_unpartitioned),
+        date_trunc('month', NOW() AT TIME ZONE 'UTC')::DATE
+    );
+    WHILE v_month < date_trunc('month', NOW() AT TIME ZONE 'UTC')::DATE LOOP
+        PERFORM create_transaction_partition(v_month);
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+    PERFORM ensure_transaction_partitions(3);
+    
+    INSERT INTO transactions SELECT * FROM transactions_unpartitioned;
+    INSERT INTO transaction_items
+    SELECT i.*, t.created_at
+    FROM transaction_items_unpartitioned i
+    JOIN transactions_unpartitioned t ON t.id = i.transaction_id;
+    INSERT INTO invoice_numbers (invoice_no, tenant_id, transaction_id, created_at)
+    SELECT invoice_no, tenant_id, id, created_at FROM transactions_unpartitioned;
+    
+    DROP TABLE transaction_items_unpartitioned;
+    DROP TABLE transactions_unpartitioned;
+END;
+$$;
+
+-- Created on the parents, cascaded to every partition
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(tenant_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_transactions_customer ON transactions(customer_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_invoice ON transactions(invoice_no);
+CREATE INDEX IF NOT EXISTS idx_transactions_pending
+    ON transactions(created_at)
+    WHERE payment_status = 'PENDING' AND payment_type IN ('QRIS', 'EWALLET');
+CREATE INDEX IF NOT EXISTS idx_transactions_shift ON transactions(shift_id) WHERE shift_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transaction_items_tx ON transaction_items(transaction_id);
+
+ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE transaction_items ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for service role" ON transactions FOR ALL USING (true);
+CREATE POLICY "Allow all for service role" ON transaction_items FOR ALL USING (true);
+
+-- ============ TRIGGERS ============
+
+-- Global invoice uniqueness (a partitioned unique key would need created_at)
+CREATE OR REPLACE FUNCTION register_invoice_number()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO invoice_numbers (invoice_no, tenant_id, transaction_id, created_at)
+    VALUES (NEW.invoice_no, NEW.tenant_id, NEW.id, NEW.created_at);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transactions_invoice_no ON transactions;
+CREATE TRIGGER trg_transactions_invoice_no
+    AFTER INSERT ON transactions
+    FOR EACH ROW EXECUTE FUNCTION register_invoice_number();
+
+-- Recreated from 014 on the partitioned table
+DROP TRIGGER IF EXISTS trg_transactions_shift ON transactions;
+CREATE TRIGGER trg_transactions_shift
+    BEFORE INSERT ON transactions
+    FOR EACH ROW EXECUTE FUNCTION assign_open_shift();
+
+DROP TRIGGER IF EXISTS trg_transactions_shift_totals ON transactions;
+CREATE TRIGGER trg_transactions_shift_totals
+    AFTER INSERT ON transactions
+    FOR EACH ROW EXECUTE FUNCTION accumulate_shift_sale();
+
+DROP TRIGGER IF EXISTS trg_transactions_shift_failed ON transactions;
+CREATE TRIGGER trg_transactions_shift_failed
+    AFTER UPDATE OF payment_status ON transactions
+    FOR EACH ROW
+    WHEN (OLD.payment_status = 'PENDING' AND NEW.payment_status = 'FAILED')
+    EXECUTE FUNCTION accumulate_shift_sale();
+
+-- ============ FUNCTIONS ============
+
+-- Replaces 012 version: items are stamped with the sale's created_at
+-- (their partition key)
+CREATE OR REPLACE FUNCTION finalize_sale(
+    p_transaction JSONB,
+    p_items JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tx transactions%ROWTYPE;
+    v_balance INTEGER;
+BEGIN
+    INSERT INTO transactions
+    SELECT * FROM jsonb_populate_record(
+        NULL::transactions,
+        p_transaction || jsonb_build_object('created_at', COALESCE(p_transaction->>'created_at', NOW()::TEXT))
+    )
+    RETURNING * INTO v_tx;
+    
+    INSERT INTO transaction_items
+    SELECT (jsonb_populate_record(NULL::transaction_items, item || jsonb_build_object('created_at', v_tx.created_at))).*
+    FROM jsonb_array_elements(p_items) AS item;
+    
+    IF v_tx.customer_id IS NOT NULL THEN
+        v_balance := update_customer_points(
+            v_tx.customer_id,
+            COALESCE(v_tx.points_redeemed, 0),
+            COALESCE(v_tx.points_earned, 0),
+            v_tx.net_sales,
+            v_tx.id
+        );
+    END IF;
+    
+    WITH sold AS (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM jsonb_populate_recordset(NULL::transaction_items, p_items)
+        GROUP BY product_id
+    ), updated AS (
+        UPDATE products p SET
+            stock = p.stock - s.quantity,
+            updated_at = NOW()
+        FROM sold s
+        WHERE p.id = s.product_id
+          AND p.tenant_id = v_tx.tenant_id
+        RETURNING p.id, p.name, p.stock, p.stock + s.quantity AS old_stock, p.low_stock_threshold
+    )
+    INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload)
+    SELECT t.id, t.telegram_chat_id, 'LOW_STOCK', jsonb_build_object(
+        'product_id', u.id,
+        'name', u.name,
+        'stock', u.stock,
+        'threshold', th.threshold
+    )
+    FROM updated u
+    JOIN tenants t ON t.id = v_tx.tenant_id
+    CROSS JOIN LATERAL (SELECT COALESCE(u.low_stock_threshold, t.low_stock_threshold) AS threshold) th
+    WHERE t.telegram_chat_id IS NOT NULL
+      AND u.stock <= th.threshold
+      AND u.old_stock > th.threshold;
+    
+    INSERT INTO notification_outbox (tenant_id, chat_id, kind, payload)
+    SELECT t.id, t.telegram_chat_id, 'LARGE_SALE', jsonb_build_object(
+        'invoice_no', v_tx.invoice_no,
+        'net_sales', v_tx.net_sales,
+        'payment_type', v_tx.payment_type
+    )
+    FROM tenants t
+    WHERE t.id = v_tx.tenant_id
+      AND t.telegram_chat_id IS NOT NULL
+      AND v_tx.net_sales >= t.large_sale_threshold;
+    
+    IF v_tx.discount_code IS NOT NULL THEN
+        WITH used AS (
+            UPDATE discounts SET usage_count = COALESCE(usage_count, 0) + 1
+            WHERE tenant_id = v_tx.tenant_id AND code = v_tx.discount_code
+            RETURNING id, code, usage_count, usage_limit
+        )
+        INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+        SELECT v_tx.tenant_id, 'discount.used', u.id, jsonb_build_object(
+            'code', u.code,
+            'transaction_id', v_tx.id,
+            'invoice_no', v_tx.invoice_no,
+            'discount_amount', v_tx.discount_amount,
+            'usage_count', u.usage_count,
+            'usage_limit', u.usage_limit
+        )
+        FROM used u;
+    END IF;
+    
+    INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+    VALUES (
+        v_tx.tenant_id,
+        'sale.finalized',
+        v_tx.id,
+        to_jsonb(v_tx) || jsonb_build_object('items', p_items)
+    );
+    
+    RETURN jsonb_build_object(
+        'id', v_tx.id,
+        'created_at', v_tx.created_at,
+        'points_balance', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replaces 013 version: the range is applied to items too, so both
+-- tables prune to the requested months
+CREATE OR REPLACE FUNCTION daily_product_sales(
+    p_tenant_id UUID,
+    p_start DATE,
+    p_days INTEGER,
+    p_timezone TEXT DEFAULT 'Asia/Jakarta'
+)
+RETURNS TABLE (product_id UUID, quantities INTEGER[]) AS $$
+    WITH daily AS (
+        SELECT ti.product_id,
+               (t.created_at AT TIME ZONE p_timezone)::date - p_start AS day,
+               SUM(ti.quantity - COALESCE(ti.refunded_quantity, 0))::INTEGER AS quantity
+        FROM transactions t
+        JOIN transaction_items ti ON ti.transaction_id = t.id AND ti.created_at = t.created_at
+        WHERE t.tenant_id = p_tenant_id
+          AND t.created_at >= p_start::timestamp AT TIME ZONE p_timezone
+          AND t.created_at < (p_start + p_days)::timestamp AT TIME ZONE p_timezone
+          AND ti.created_at >= p_start::timestamp AT TIME ZONE p_timezone
+          AND ti.created_at < (p_start + p_days)::timestamp AT TIME ZONE p_timezone
+          AND t.payment_status NOT IN ('FAILED', 'REFUNDED', 'VOIDED')
+        GROUP BY 1, 2
+    )
+    SELECT p.product_id,
+           array_agg(COALESCE(d.quantity, 0) ORDER BY g.day)
+    FROM (SELECT DISTINCT daily.product_id FROM daily) p
+    CROSS JOIN generate_series(0, p_days - 1) AS g(day)
+    LEFT JOIN daily d ON d.product_id = p.product_id AND d.day = g.day
+    GROUP BY p.product_id
+    ORDER BY p.product_id;
+$$ LANGUAGE sql STABLE;
+
+NOTIFY pgrst, 'reload schema';
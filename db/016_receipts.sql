@@ -0,0 +1,18 @@
+-- KasirAI Database Schema
+-- Migration: 016_receipts
+
+-- Per-tenant receipt template (compiled and cached by the API, see src/core/receipt.py)
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS receipt_header TEXT;  -- address, phone; one line per line
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS receipt_footer TEXT;
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS receipt_width INTEGER DEFAULT 32;  -- characters: 32 = 58mm, 48 = 80mm paper
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS timezone VARCHAR(50) DEFAULT 'Asia/Jakarta';  -- WIB / WITA (Asia/Makassar) / WIT (Asia/Jayapura)
+
+ALTER TABLE tenants DROP CONSTRAINT IF EXISTS tenants_receipt_width_check;
+ALTER TABLE tenants ADD CONSTRAINT tenants_receipt_width_check
+    CHECK (receipt_width BETWEEN 24 AND 64);
+
+-- Cash tendered, so reprints show the same change as the original receipt
+-- (added on the partitioned parent; finalize_sale fills it from p_transaction)
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS amount_received DECIMAL(15,2);
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,214 @@
+-- KasirAI Database Schema
+-- Migration: 017_fail_sale
+
+-- ============ FUNCTIONS ============
+
+-- Take a sale back out of a member's balance: redeemed points come back in
+-- full, earned points are taken back only as far as the balance allows
+-- (they may already be spent). Shared by refund_sale and fail_sale.
+-- Returns the points actually reversed and the new balance.
+CREATE OR REPLACE FUNCTION reverse_customer_sale(
+    p_customer_id UUID,
+    p_transaction_id UUID,
+    p_points_restored INTEGER,
+    p_points_reversed INTEGER,
+    p_amount DECIMAL,
+    p_reference TEXT,
+    OUT points_reversed INTEGER,
+    OUT balance INTEGER
+) AS $$
+DECLARE
+    v_points INTEGER;
+BEGIN
+    SELECT points INTO v_points FROM customers WHERE id = p_customer_id FOR UPDATE;
+    points_reversed := LEAST(p_points_reversed, v_points + p_points_restored);
+    balance := v_points + p_points_restored - points_reversed;
+    
+    UPDATE customers SET
+        points = balance,
+        lifetime_spent = GREATEST(lifetime_spent - p_amount, 0),
+        lifetime_points = GREATEST(lifetime_points - points_reversed, 0),
+        updated_at = NOW()
+    WHERE id = p_customer_id;
+    
+    INSERT INTO point_ledger (customer_id, transaction_id, type, points, balance, description)
+    SELECT p_customer_id, p_transaction_id, e.type, e.points, e.balance, e.description
+    FROM (VALUES
+        ('RESTORED', p_points_restored, v_points + p_points_restored, 'Redeemed points returned (' || p_reference || ')'),
+        ('REVERSED', -points_reversed, balance, 'Earned points reversed (' || p_reference || ')')
+    ) AS e(type, points, balance, description)
+    WHERE e.points <> 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replaces 013 version: the customer reversal moved to reverse_customer_sale
+CREATE OR REPLACE FUNCTION refund_sale(
+    p_transaction_id UUID,
+    p_credit_note JSONB,
+    p_items JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tx transactions%ROWTYPE;
+    v_note credit_notes%ROWTYPE;
+    v_reversed INTEGER := 0;
+    v_balance INTEGER;
+    v_lines INTEGER;
+    v_status VARCHAR(20);
+BEGIN
+    SELECT * INTO v_tx FROM transactions WHERE id = p_transaction_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Transaction not found: %', p_transaction_id;
+    END IF;
+    
+    IF p_credit_note->>'kind' = 'VOID' THEN
+        IF v_tx.payment_status NOT IN ('PENDING', 'PAID') OR COALESCE(v_tx.refunded_amount, 0) > 0 THEN
+            RAISE EXCEPTION 'Sale cannot be voided in status %', v_tx.payment_status;
+        END IF;
+    ELSIF v_tx.payment_status NOT IN ('PAID', 'PARTIALLY_REFUNDED') THEN
+        RAISE EXCEPTION 'Sale cannot be refunded in status %', v_tx.payment_status;
+    END IF;
+    
+    v_note := jsonb_populate_record(
+        NULL::credit_notes,
+        p_credit_note || jsonb_build_object('tenant_id', v_tx.tenant_id, 'transaction_id', v_tx.id, 'created_at', NOW())
+    );
+    
+    IF v_tx.customer_id IS NOT NULL THEN
+        SELECT r.points_reversed, r.balance INTO v_reversed, v_balance
+        FROM reverse_customer_sale(
+            v_tx.customer_id, v_tx.id, v_note.points_restored, v_note.points_reversed,
+            v_note.total_amount, v_note.credit_note_no
+        ) r;
+    END IF;
+    v_note.points_reversed := v_reversed;
+    
+    INSERT INTO credit_notes SELECT v_note.*;
+    
+    WITH requested AS (
+        SELECT * FROM jsonb_to_recordset(p_items)
+            AS r(transaction_item_id UUID, quantity INTEGER, expected_refunded INTEGER)
+    ), refunded AS (
+        UPDATE transaction_items ti SET
+            refunded_quantity = COALESCE(ti.refunded_quantity, 0) + r.quantity
+        FROM requested r
+        WHERE ti.id = r.transaction_item_id
+          AND ti.transaction_id = v_tx.id
+          AND COALESCE(ti.refunded_quantity, 0) = r.expected_refunded
+          AND COALESCE(ti.refunded_quantity, 0) + r.quantity <= ti.quantity
+        RETURNING ti.id, ti.product_id, r.quantity, ti.unit_price
+    ), noted AS (
+        INSERT INTO credit_note_items (credit_note_id, transaction_item_id, product_id, quantity, unit_price, subtotal)
+        SELECT v_note.id, f.id, f.product_id, f.quantity, f.unit_price, f.unit_price * f.quantity
+        FROM refunded f
+        RETURNING 1
+    ), restocked AS (
+        UPDATE products p SET
+            stock = p.stock + s.quantity,
+            updated_at = NOW()
+        FROM (SELECT product_id, SUM(quantity) AS quantity FROM refunded GROUP BY product_id) s
+        WHERE v_note.restocked AND p.id = s.product_id
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO v_lines FROM refunded;
+    
+    IF v_lines <> jsonb_array_length(p_items) THEN
+        RAISE EXCEPTION 'Refund conflict: sale % changed, reload and retry', v_tx.invoice_no;
+    END IF;
+    
+    IF EXISTS (
+        SELECT 1 FROM transaction_items
+        WHERE transaction_id = v_tx.id AND COALESCE(refunded_quantity, 0) < quantity
+    ) THEN
+        v_status := 'PARTIALLY_REFUNDED';
+    ELSE
+        v_status := CASE v_note.kind WHEN 'VOID' THEN 'VOIDED' ELSE 'REFUNDED' END;
+        
+        -- Fully reversed sale no longer counts against the code's usage limit
+        IF v_tx.discount_code IS NOT NULL THEN
+            UPDATE discounts SET usage_count = GREATEST(COALESCE(usage_count, 0) - 1, 0)
+            WHERE tenant_id = v_tx.tenant_id AND code = v_tx.discount_code;
+        END IF;
+    END IF;
+    
+    UPDATE transactions SET
+        payment_status = v_status,
+        refunded_amount = COALESCE(refunded_amount, 0) + v_note.total_amount
+    WHERE id = v_tx.id;
+    
+    INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+    VALUES (
+        v_tx.tenant_id,
+        CASE v_note.kind WHEN 'VOID' THEN 'sale.voided' ELSE 'sale.refunded' END,
+        v_tx.id,
+        to_jsonb(v_note) || jsonb_build_object('invoice_no', v_tx.invoice_no, 'payment_status', v_status, 'items', p_items)
+    );
+    
+    RETURN jsonb_build_object(
+        'id', v_note.id,
+        'created_at', v_note.created_at,
+        'payment_status', v_status,
+        'points_reversed', v_reversed,
+        'points_balance', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- A gateway payment that failed (PENDING -> FAILED) undoes everything
+-- finalize_sale applied, like a full void without a credit note: points
+-- and lifetime spend, stock and discount usage. Shift totals are taken
+-- back by trg_transactions_shift_failed.
+-- Returns the updated sale, or NULL if it already left PENDING (idempotent).
+CREATE OR REPLACE FUNCTION fail_sale(
+    p_invoice_no VARCHAR,
+    p_payment_ref VARCHAR DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tx transactions%ROWTYPE;
+BEGIN
+    SELECT * INTO v_tx FROM transactions
+    WHERE invoice_no = p_invoice_no AND payment_status = 'PENDING'
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    
+    IF v_tx.customer_id IS NOT NULL THEN
+        PERFORM reverse_customer_sale(
+            v_tx.customer_id, v_tx.id, COALESCE(v_tx.points_redeemed, 0), COALESCE(v_tx.points_earned, 0),
+            v_tx.net_sales, v_tx.invoice_no || ' failed'
+        );
+    END IF;
+    
+    UPDATE products p SET
+        stock = p.stock + s.quantity,
+        updated_at = NOW()
+    FROM (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM transaction_items
+        WHERE transaction_id = v_tx.id AND created_at = v_tx.created_at
+        GROUP BY product_id
+    ) s
+    WHERE p.id = s.product_id
+      AND p.tenant_id = v_tx.tenant_id;
+    
+    IF v_tx.discount_code IS NOT NULL THEN
+        UPDATE discounts SET usage_count = GREATEST(COALESCE(usage_count, 0) - 1, 0)
+        WHERE tenant_id = v_tx.tenant_id AND code = v_tx.discount_code;
+    END IF;
+    
+    UPDATE transactions SET
+        payment_status = 'FAILED',
+        qris_ref = COALESCE(p_payment_ref, qris_ref)
+    WHERE id = v_tx.id AND created_at = v_tx.created_at
+    RETURNING * INTO v_tx;
+    
+    INSERT INTO outbox_events (tenant_id, event_type, aggregate_id, payload)
+    VALUES (v_tx.tenant_id, 'sale.failed', v_tx.id, to_jsonb(v_tx));
+    
+    RETURN to_jsonb(v_tx);
+END;
+$$ LANGUAGE plpgsql;
+
+NOTIFY pgrst, 'reload schema';